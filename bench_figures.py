@@ -0,0 +1,145 @@
+"""
+Benchmark of the dashboard's figure construction.
+
+    python bench_figures.py [--repeat N] [--baseline REV]
+
+Builds the charts sky_figures took over for every rep's default dashboard window
+(sky_data.default_window) and times, per chart, what a rerun pays until the figure is
+encoded as st.plotly_chart does it (to_dict, then to_json without validation):
+
+    dict builders       the app's builders on sky_figures (plain dicts, no validation)
+    validated           the same figures pushed through Plotly's validators (go.Figure of the
+                        spec) - the validation overhead alone
+    graph objects       the builders as they were before sky_figures (go.Figure, add_trace,
+                        update_layout): sky_streamlit_app.py of the baseline commit - by
+                        default the parent of the commit that added sky_figures.py - read
+                        from git and imported as a module
+
+Every chart of a window shares one FilterContext, as in a rerun, so the slices and aggregates
+it memoizes are computed before timing and not counted. The dict builders must encode to the
+same JSON document (key order aside) as their validated figure; the run fails otherwise.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import time
+import types
+import warnings
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+warnings.filterwarnings('ignore')
+logging.disable(logging.WARNING) # Streamlit warns about every call made outside `streamlit run`
+
+import sky_data
+import sky_streamlit_app as app
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def git(*args):
+    return subprocess.run(['git', *args], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+
+
+def baseline_revision():
+    """Parent of the commit that added sky_figures.py - the dashboard's last graph-objects version"""
+    added = git('log', '--diff-filter=A', '--format=%H', '--', 'sky_figures.py').split()
+    if not added:
+        raise SystemExit("sky_figures.py has no history to find the baseline in - pass --baseline")
+    return added[-1] + '^'
+
+
+def import_revision(rev):
+    """sky_streamlit_app.py as of `rev`, imported as a module (on today's sky_data)"""
+    source = git('show', f'{rev}:sky_streamlit_app.py')
+    module = types.ModuleType('baseline_app')
+    module.__file__ = os.path.join(REPO_DIR, 'sky_streamlit_app.py')
+    exec(compile(source, f'{rev}:sky_streamlit_app.py', 'exec'), module.__dict__)
+    return module
+
+
+def chart_builders(data, baseline):
+    """(chart name, dict builder, graph objects builder) for every chart of every rep's default window"""
+    start_date, end_date = sky_data.default_window(data)
+    ctx = sky_data.FilterContext(data, start_date, end_date)
+    builders = [
+        ('revenue comparison', lambda: app.create_revenue_comparison(ctx), lambda: baseline.create_revenue_comparison(ctx)),
+        ('accounts chart', lambda: app.create_processing_by_account_chart(ctx), lambda: baseline.create_processing_by_account_chart(ctx)),
+    ]
+    for rep_id in data['sales_reps']['RepID']:
+        rep_ctx = sky_data.FilterContext(data, start_date, end_date, rep_id)
+        builders += [
+            ('amount time series',
+             lambda rep_ctx=rep_ctx: app.create_time_series_chart(rep_ctx),
+             lambda rep_ctx=rep_ctx: baseline.create_time_series_chart(rep_ctx)),
+            ('volume time series',
+             lambda rep_ctx=rep_ctx: app.create_volume_time_series_chart(rep_ctx),
+             lambda rep_ctx=rep_ctx: baseline.create_volume_time_series_chart(rep_ctx)),
+            ('discovery activity',
+             lambda rep_ctx=rep_ctx: app.create_activity_performance_chart(rep_ctx, chart_type='discovery'),
+             lambda rep_ctx=rep_ctx: baseline.create_activity_performance_chart(rep_ctx, chart_type='discovery')),
+            ('demo activity',
+             lambda rep_ctx=rep_ctx: app.create_activity_performance_chart(rep_ctx, chart_type='demo'),
+             lambda rep_ctx=rep_ctx: baseline.create_activity_performance_chart(rep_ctx, chart_type='demo')),
+            ('bonus scale',
+             lambda rep_id=rep_id: app.create_bonus_attainment_scale(data, rep_id),
+             lambda rep_id=rep_id: baseline.create_bonus_attainment_scale(data, rep_id)),
+        ]
+    return builders
+
+
+def encode(fig):
+    # What st.plotly_chart does with a figure
+    return pio.to_json(fig.to_dict(), validate=False)
+
+
+def timed(build, repeat):
+    """Seconds per build-and-encode"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        build()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the plain-dict figure builders with the graph-object builders they replaced.")
+    parser.add_argument('--repeat', type=int, default=20, help="timed rounds per chart (default 20)")
+    parser.add_argument('--baseline', help="commit whose chart builders to compare with (default: the one before sky_figures)")
+    args = parser.parse_args()
+
+    rev = args.baseline or baseline_revision()
+    baseline = import_revision(rev)
+    print(f"baseline: {git('log', '-1', '--format=%h %s', rev).strip()}")
+
+    data, _ = sky_data.load_dataset()
+    timings = {} # chart name -> [dict builders, validated, graph objects (seconds), figures]
+    for name, build, build_baseline in chart_builders(data, baseline):
+        fig = build()
+        if fig is None: # No activity recorded for the rep
+            continue
+        if json.loads(encode(fig)) != json.loads(encode(go.Figure(fig.to_dict()))):
+            raise SystemExit(f"{name}: the dict builder and graph objects encode differently")
+        build_baseline() # Fill the context's memoized slices for both, outside the timing
+
+        totals = timings.setdefault(name, [0.0, 0.0, 0.0, 0])
+        totals[0] += timed(lambda: encode(build()), args.repeat)
+        totals[1] += timed(lambda: encode(go.Figure(build().to_dict())), args.repeat)
+        totals[2] += timed(lambda: encode(build_baseline()), args.repeat)
+        totals[3] += 1
+
+    print(f"{'chart':<22}{'figures':>8}{'dict builders':>16}{'validated':>16}{'graph objects':>16}{'speed-up':>10}")
+    overall = [0.0, 0.0, 0.0]
+    for name, (fast, validated, graph_objects, count) in timings.items():
+        print(f"{name:<22}{count:>8}{fast / count * 1000:>13.2f} ms{validated / count * 1000:>13.2f} ms"
+              f"{graph_objects / count * 1000:>13.2f} ms{graph_objects / fast:>9.1f}x")
+        overall = [overall[0] + fast, overall[1] + validated, overall[2] + graph_objects]
+    fast, validated, graph_objects = overall
+    print(f"{'all charts':<30}{fast * 1000:>13.2f} ms{validated * 1000:>13.2f} ms{graph_objects * 1000:>13.2f} ms{graph_objects / fast:>9.1f}x")
+    print("speed-up = graph objects / dict builders")
+
+
+if __name__ == '__main__':
+    main()
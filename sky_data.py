@@ -0,0 +1,1718 @@
+"""
+Data engine for the Sky Systemz dashboard.
+
+Everything in here is plain pandas/numpy so it can be imported without
+Streamlit (e.g. from maintenance scripts). The Streamlit app wraps these
+helpers in its cached load_data().
+"""
+import calendar
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from types import MappingProxyType
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import yaml
+from pandas.api.types import union_categoricals
+
+try:
+    import fcntl
+except ImportError: # Windows - no cross-process snapshot lock, run one server process (or the preload) per snapshot dir
+    fcntl = None
+
+TRANSACTION_FILE = 'transaction_table.csv'
+# Optional month-partitioned Parquet store (transactions/year=YYYY/month=MM/*.parquet) - used instead of the CSV when present
+TRANSACTION_PARTITIONS = 'transactions'
+# Column of the partitioned store holding each row's position in the original export
+PARTITION_ROW_COLUMN = 'file_row'
+PERFORMANCE_FILE = 'performance_data.csv'
+USERS_FILE = 'users.yaml'
+
+# Directory holding the columnar snapshot of the derived data dict (memory-mapped by every server process on the host)
+SNAPSHOT_DIR = '.data_cache'
+# Folder of SNAPSHOT_DIR where each server process keeps its readiness marker (<token>.json) and the lock
+# it holds while it runs (<token>.lock) - what the preload's readiness probe checks
+SERVERS_DIR = 'servers'
+# Locked (flock) in SNAPSHOT_DIR by the process building, swapping in or deleting a snapshot
+LOCK_FILE = 'build.lock'
+# Bump whenever load_data() starts deriving a different data dict, so old snapshots are ignored
+SNAPSHOT_VERSION = 9
+
+CHUNK_SIZE = 1 << 20
+
+# Columns of the transaction file the dashboard reads - the others are never parsed
+TRANSACTION_COLUMNS = [
+    'TRAN_DT', 'TRAN_AM', 'LCTN_ID', 'CITY_NM', 'REP NAME', 'GRANDPARENT_CORP_DBA_NM',
+    'CHILD_LCTN_DBA_NM', 'latitude', 'longitude', 'preprocessed_address'
+]
+# Raw rows parsed per chunk by the streaming loader (bounds the raw rows held at once, not the compact table)
+STREAM_CHUNK_ROWS = 100_000
+
+# Repeated strings of the transaction file, stored as categoricals when loaded (codes + one copy of each distinct value)
+TRANSACTION_CATEGORIES = [
+    'FEE_DATA_SOURCE', 'CITY_NM', 'REP NAME', 'GRANDPARENT_CORP_DBA_NM', 'PARENT_',
+    'CHILD_LCTN_DBA_NM', 'preprocessed_address'
+]
+# Amounts are stored as whole cents (int64), so sums and merged aggregates are exact
+CENTS_PER_DOLLAR = 100
+
+# Month names sort in calendar order
+MONTH_DTYPE = pd.CategoricalDtype(list(calendar.month_name)[1:], ordered=True)
+
+# 'sqlite' also stores the transactions in an indexed SQLite file next to each snapshot, and window
+# totals, city and account aggregates are then run as SQL on it instead of pandas ('pandas' = off)
+QUERY_BACKEND = os.environ.get('SKY_QUERY_BACKEND', 'pandas')
+SQLITE_FILE = 'transactions.sqlite'
+
+# Seconds between two checks of the source files by the background DataWatcher
+WATCH_INTERVAL = 5.0
+# Longest wait (seconds) before a failed load of unchanged sources is retried - the wait doubles from WATCH_INTERVAL
+WATCH_RETRY_MAX = 300.0
+
+# Cleaned per-city aggregates kept for reuse across reruns and sessions (entries, least recently used dropped)
+CITY_CACHE_SIZE = 128
+
+# Rows per page of the dashboard's paginated tables
+TABLE_PAGE_SIZE = 25
+
+
+def _hash_prefix(f, size, digest):
+    """Feed the next `size` bytes of f into digest, returning the last chunk read (None on a short read)."""
+    last = b''
+    while size > 0:
+        chunk = f.read(min(CHUNK_SIZE, size))
+        if not chunk:
+            return None
+        digest.update(chunk)
+        size -= len(chunk)
+        last = chunk
+    return last
+
+
+def file_digest(path, size=None):
+    """Return the sha256 hex digest of a file's content (only the first `size` bytes if given)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        if size is None:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        else:
+            _hash_prefix(f, size, digest)
+    return digest.hexdigest()
+
+
+def source_signature(path):
+    """Size, mtime and content hash of a source file (None if the file does not exist)."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # Hash exactly the bytes the size covers, in case the file grows while we read it
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_digest(path, stat.st_size)}
+
+
+def source_signatures(paths):
+    """Signatures for every source file the derived data depends on."""
+    return {path: source_signature(path) for path in paths}
+
+
+def _source_unchanged(path, recorded):
+    """Check a source file against the signature recorded in a snapshot manifest"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return recorded is None
+    if recorded is None:
+        return False
+    # Cheap check first: same size and mtime means same file
+    if stat.st_size == recorded['size'] and stat.st_mtime_ns == recorded['mtime_ns']:
+        return True
+    # Touched or copied file - only the content hash can tell
+    if stat.st_size == recorded['size'] and file_digest(path) == recorded['sha256']:
+        recorded['mtime_ns'] = stat.st_mtime_ns # Remember the new mtime so the next start skips hashing
+        return True
+    return False
+
+
+def read_manifest(snapshot_dir=SNAPSHOT_DIR):
+    """Return the manifest of the stored snapshot, or None if there is no usable one."""
+    try:
+        with open(os.path.join(snapshot_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        return None
+    # A snapshot built for the other query backend is rebuilt (it lacks, or carries an unused, SQLite store)
+    return manifest if bool(manifest.get('sqlite')) == (QUERY_BACKEND == 'sqlite') else None
+
+
+def _write_json(path, obj):
+    # Write then rename, so the swap is atomic
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+def _write_manifest(snapshot_dir, manifest):
+    _write_json(os.path.join(snapshot_dir, 'manifest.json'), manifest)
+
+
+@contextmanager
+def snapshot_lock(snapshot_dir=SNAPSHOT_DIR, blocking=True):
+    """
+    Exclusive lock on the snapshot directory, shared by every process on the host (flock on
+    LOCK_FILE). Building, swapping in and deleting snapshots happen under it, so processes
+    reacting to the same source change build one after another - the later ones then find
+    the first one's snapshot. Yields whether the lock is held: False if not blocking and
+    another holder has it, or if the directory is not writable (no snapshot is stored then).
+    """
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        f = open(os.path.join(snapshot_dir, LOCK_FILE), 'a')
+    except OSError:
+        yield False
+        return
+    with f:
+        held = True
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                held = False
+        try:
+            yield held
+        finally:
+            if held and fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _stored_folder(snapshot_dir):
+    # Folder named by the stored manifest, whatever its version or backend
+    try:
+        with open(os.path.join(snapshot_dir, 'manifest.json')) as f:
+            return json.load(f).get('folder')
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def current_manifest(paths, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Return the manifest of the stored snapshot if it was built from the current
+    version of every file in paths, otherwise None.
+    """
+    manifest = read_manifest(snapshot_dir)
+    if manifest is None:
+        return None
+
+    recorded = manifest.get('sources', {})
+    if set(recorded) != set(paths):
+        return None
+    before = json.dumps(recorded, sort_keys=True)
+    if not all(_source_unchanged(path, recorded[path]) for path in paths):
+        return None
+    if json.dumps(recorded, sort_keys=True) != before:
+        # Only an optimisation (the next check skips hashing), so skip it while another process holds the lock,
+        # and never write it over a newer snapshot's manifest
+        with snapshot_lock(snapshot_dir, blocking=False) as held:
+            if held and _stored_folder(snapshot_dir) == manifest['folder']:
+                _write_manifest(snapshot_dir, manifest)
+    return manifest
+
+
+def read_snapshot(paths, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Return the data dict stored in the snapshot if it was built from the current
+    version of every file in paths, otherwise None.
+    """
+    return read_snapshot_frames(current_manifest(paths, snapshot_dir), snapshot_dir)
+
+
+def _write_arrow(frame, path):
+    """Store a frame (index included) as an uncompressed Arrow IPC file, the layout it is memory-mapped back from"""
+    table = pa.Table.from_pandas(frame, preserve_index=True)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _map_arrow(path):
+    """
+    Attach to an Arrow IPC file through a memory map. Numeric and datetime columns without
+    nulls come back zero-copy (read-only views of the mapped pages, which the OS shares
+    between every process mapping the file); categoricals and columns with nulls may be converted.
+    """
+    return pa.ipc.open_file(pa.memory_map(path)).read_all().to_pandas(split_blocks=True)
+
+
+def read_snapshot_frames(manifest, snapshot_dir=SNAPSHOT_DIR):
+    """Attach to the data dict a manifest points to (memory-mapped), without checking it against the sources."""
+    if manifest is None:
+        return None
+    try:
+        folder = os.path.join(snapshot_dir, manifest['folder'])
+        data = {
+            name: _map_arrow(os.path.join(folder, f'{name}.arrow'))
+            for name in manifest['frames']
+        }
+        for name in manifest.get('arrays', []):
+            data[name] = np.load(os.path.join(folder, f'{name}.npy'), mmap_mode='r')
+        if manifest.get('sqlite'):
+            data['sql_store'] = os.path.join(folder, manifest['sqlite'])
+        data['dataset_id'] = manifest['folder']
+        return data
+    except Exception:
+        # Corrupt or half-deleted snapshot - caller rebuilds from the CSVs
+        return None
+
+
+def write_snapshot(data, signatures, transaction_rows, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Store every DataFrame of the data dict as Arrow IPC (and NumPy arrays as .npy), keyed on the source signatures
+    taken *before* the sources were parsed. transaction_rows is the number of raw CSV
+    rows ingested, so appended rows can continue where this snapshot stopped.
+    The manifest is swapped in last, so readers never see a half-written snapshot.
+    Returns the manifest. The folder of the snapshot it replaces is deleted - only that
+    one, never a folder no manifest named yet - and processes still mapping it keep their
+    pages until they let go (POSIX unlink semantics). Call it under snapshot_lock().
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    folder = uuid.uuid4().hex
+    folder_path = os.path.join(snapshot_dir, folder)
+    os.makedirs(folder_path)
+
+    frames = []
+    arrays = []
+    sqlite_file = None
+    try:
+        for name, value in data.items():
+            if isinstance(value, pd.DataFrame):
+                _write_arrow(value, os.path.join(folder_path, f'{name}.arrow'))
+                frames.append(name)
+            elif isinstance(value, np.ndarray):
+                np.save(os.path.join(folder_path, f'{name}.npy'), value)
+                arrays.append(name)
+
+        if QUERY_BACKEND == 'sqlite':
+            sqlite_file = SQLITE_FILE
+            write_sqlite_store(data, os.path.join(folder_path, sqlite_file))
+    except BaseException:
+        shutil.rmtree(folder_path, ignore_errors=True)
+        raise
+
+    replaced = _stored_folder(snapshot_dir)
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'sources': signatures,
+        'transaction_rows': transaction_rows,
+        'folder': folder,
+        'frames': frames,
+        'arrays': arrays,
+        'sqlite': sqlite_file,
+    }
+    _write_manifest(snapshot_dir, manifest)
+    if sqlite_file:
+        # The caller keeps serving the dict it just stored, so point it at the store too
+        data['sql_store'] = os.path.join(folder_path, sqlite_file)
+
+    # Drop the replaced snapshot's folder
+    if replaced and replaced != folder and os.path.basename(replaced) == replaced:
+        shutil.rmtree(os.path.join(snapshot_dir, replaced), ignore_errors=True)
+    return manifest
+
+
+# --- Parsing ---
+
+class _BoundedReader(io.RawIOBase):
+    """Read-only view of the first `size` bytes of an open binary file."""
+
+    def __init__(self, f, size):
+        self._f = f
+        self._remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._remaining <= 0:
+            return 0
+        n = self._f.readinto(memoryview(buffer)[:self._remaining]) or 0
+        self._remaining -= n
+        return n
+
+
+def _dashboard_column(column):
+    return column in TRANSACTION_COLUMNS
+
+
+def read_csv_prefix(path, size):
+    """
+    Parse the first `size` bytes of a CSV file. Rows appended after the file's signature
+    was taken are left for the next incremental load instead of being ingested twice.
+    """
+    with open(path, 'rb') as f:
+        return pd.read_csv(io.BufferedReader(_BoundedReader(f, size), CHUNK_SIZE))
+
+
+def iter_transaction_chunks(path, size, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Parse the first `size` bytes of the transaction file in chunks of raw rows, keeping
+    only the dashboard's columns. Row labels continue across chunks like a full parse.
+    """
+    with open(path, 'rb') as f:
+        with pd.read_csv(
+            io.BufferedReader(_BoundedReader(f, size), CHUNK_SIZE), usecols=_dashboard_column, chunksize=chunk_rows
+        ) as reader:
+            yield from reader
+
+
+def read_transaction_tail(path, manifest):
+    """
+    Check whether the transaction file is the snapshot's file plus appended rows.
+    Returns (new_raw_rows, new_signature, total_raw_rows), or None if the file was
+    rewritten, truncated or the snapshot is missing.
+    """
+    if manifest is None or manifest.get('transaction_rows') is None:
+        return None
+    recorded = manifest.get('sources', {}).get(path)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if recorded is None or stat.st_size < recorded['size']:
+        return None
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(0)
+        # The bytes already ingested must be untouched and end on a row boundary
+        last = _hash_prefix(f, recorded['size'], digest)
+        if last is None or digest.hexdigest() != recorded['sha256'] or not last.endswith(b'\n'):
+            return None
+        tail = f.read(stat.st_size - recorded['size'])
+
+    # Leave a partially written last row for the next load
+    tail = tail[:tail.rfind(b'\n') + 1]
+    digest.update(tail)
+    signature = {
+        'size': recorded['size'] + len(tail),
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': digest.hexdigest(),
+    }
+
+    ingested_rows = manifest['transaction_rows']
+    if tail:
+        new_rows = pd.read_csv(io.BytesIO(header + tail), usecols=_dashboard_column)
+        # Continue the row labels of a full parse, so derived frames match a full rebuild
+        new_rows.index = pd.RangeIndex(ingested_rows, ingested_rows + len(new_rows))
+    else:
+        new_rows = pd.read_csv(io.BytesIO(header), usecols=_dashboard_column)
+    return new_rows, signature, ingested_rows + len(new_rows)
+
+
+# --- Partitioned store ---
+
+def _partition_value(folder, key):
+    """Value of a hive 'key=value' folder name as an int, or None if it is not one"""
+    name, _, value = folder.partition('=')
+    return int(value) if name == key and value.isdigit() else None
+
+
+def partition_files(root=TRANSACTION_PARTITIONS, start_date=None, end_date=None):
+    """
+    Parquet files of a year=YYYY/month=MM partitioned store, oldest month first. With
+    start_date/end_date only the months overlapping [start_date, end_date] are listed
+    (pruned on the folder names - no file is opened). Empty list if there is no store.
+    """
+    if not os.path.isdir(root):
+        return []
+    first = None if start_date is None else (pd.Timestamp(start_date).year, pd.Timestamp(start_date).month)
+    last = None if end_date is None else (pd.Timestamp(end_date).year, pd.Timestamp(end_date).month)
+
+    files = []
+    for year_folder in os.listdir(root):
+        year = _partition_value(year_folder, 'year')
+        if year is None:
+            continue
+        for month_folder in os.listdir(os.path.join(root, year_folder)):
+            month = _partition_value(month_folder, 'month')
+            if month is None or (first is not None and (year, month) < first) or (last is not None and (year, month) > last):
+                continue
+            folder = os.path.join(root, year_folder, month_folder)
+            files.extend(((year, month), os.path.join(folder, name)) for name in os.listdir(folder) if name.endswith('.parquet'))
+    return [path for _, path in sorted(files)]
+
+
+def iter_partition_chunks(paths, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Raw transaction rows of the partition files in chunks of chunk_rows, dashboard columns only.
+    Rows of files written by write_partitions come back in the order of the original export,
+    labelled with their position in it - the rows a parse of the export gives - so rep order,
+    account owners, a city's first address and the seeded targets do not depend on the storage
+    layout. Files without PARTITION_ROW_COLUMN are read oldest month first, labels continuing.
+    """
+    tables = []
+    for path in paths:
+        columns = [name for name in pq.read_schema(path).names if _dashboard_column(name) or name == PARTITION_ROW_COLUMN]
+        tables.append(pq.read_table(path, columns=columns))
+    if not tables:
+        return
+    # The month files are held as Arrow columns (no Python objects); only one chunk is converted at a time
+    table = pa.concat_tables(tables, promote_options='default')
+    del tables
+
+    order = None
+    labels = np.arange(table.num_rows)
+    if PARTITION_ROW_COLUMN in table.column_names:
+        if table.column(PARTITION_ROW_COLUMN).null_count == 0:
+            labels = table.column(PARTITION_ROW_COLUMN).to_numpy()
+            order = np.argsort(labels, kind='stable')
+        table = table.drop_columns([PARTITION_ROW_COLUMN])
+
+    for start in range(0, table.num_rows, chunk_rows):
+        if order is None:
+            positions = np.arange(start, min(start + chunk_rows, table.num_rows))
+        else:
+            positions = order[start:start + chunk_rows]
+        chunk = table.take(positions).to_pandas()
+        chunk.index = pd.Index(labels[positions])
+        yield chunk
+
+
+def write_partitions(transactions_df, root=TRANSACTION_PARTITIONS):
+    """
+    Write raw transaction rows (e.g. a CSV export) as a year/month partitioned store, one file
+    per month. Each row's label (its position in the export) is kept in PARTITION_ROW_COLUMN.
+    """
+    dates = pd.to_datetime(transactions_df['TRAN_DT'], errors='coerce')
+    dated = dates.notna() # Rows without a usable date are dropped on load anyway
+    rows = transactions_df[dated].assign(**{PARTITION_ROW_COLUMN: transactions_df.index[dated]})
+    for (year, month), month_rows in rows.groupby([dates[dated].dt.year, dates[dated].dt.month]):
+        folder = os.path.join(root, f'year={year:04d}', f'month={month:02d}')
+        os.makedirs(folder, exist_ok=True)
+        month_rows.to_parquet(os.path.join(folder, 'part-00000.parquet'), index=False)
+
+
+# --- Derived frames ---
+
+def prepare_transactions(transactions_df):
+    """Clean raw transaction rows, apply the compact column types and add the time features used by the dashboard."""
+    # Convert Date column
+    transactions_df['TRAN_DT'] = pd.to_datetime(transactions_df['TRAN_DT'], errors='coerce')
+    transactions_df = transactions_df.dropna(subset=['TRAN_DT', 'LCTN_ID', 'REP NAME', 'TRAN_AM']) # Drop essential missing data
+
+    # Compact types: categorical codes for repeated strings, float32 coordinates
+    transactions_df = transactions_df.astype(
+        {column: 'category' for column in TRANSACTION_CATEGORIES if column in transactions_df.columns}
+    )
+    transactions_df = transactions_df.astype({'latitude': np.float32, 'longitude': np.float32})
+
+    # Amounts as integer cents - the float dollars column is replaced, dollars come back only for display
+    transactions_df['TRAN_AM'] = to_cents(transactions_df['TRAN_AM'])
+    transactions_df = transactions_df.rename(columns={'TRAN_AM': 'TRAN_AM_CENTS'})
+
+    # Add Time Features (never missing - rows without a date were dropped above)
+    transactions_df['Month'] = pd.Categorical.from_codes(transactions_df['TRAN_DT'].dt.month - 1, dtype=MONTH_DTYPE)
+    transactions_df['Quarter'] = transactions_df['TRAN_DT'].dt.quarter.astype(np.int8) # 1-4, shown as 'Q1'..'Q4'
+    transactions_df['Year'] = transactions_df['TRAN_DT'].dt.year.astype(np.int16)
+    # No TransactionVolume column - each row is one transaction, so volumes are row counts
+    return transactions_df
+
+
+def to_cents(dollars):
+    """Dollar amounts (floats) to int64 cents, rounded to the nearest cent"""
+    return np.round(np.asarray(dollars, dtype=np.float64) * CENTS_PER_DOLLAR).astype(np.int64)
+
+
+def to_dollars(cents):
+    """int64 cents (scalar, array or Series) back to float dollars, for display and target ratios"""
+    return cents / CENTS_PER_DOLLAR
+
+
+def concat_transactions(frames):
+    """pd.concat for prepared transactions that keeps the categorical columns categorical"""
+    frames = list(frames)
+    # concat falls back to object when categories differ, so every frame is recoded onto the union first
+    dtypes = {
+        column: pd.CategoricalDtype(
+            union_categoricals([frame[column] for frame in frames], sort_categories=True).categories
+        )
+        for column in TRANSACTION_CATEGORIES if column in frames[0].columns
+    }
+    return pd.concat([frame.astype(dtypes) for frame in frames])
+
+
+def fill_category(values, fill_value):
+    """fillna for a (possibly categorical) group key - adds fill_value as a category when it is needed"""
+    if not values.hasnans:
+        return values
+    if isinstance(values.dtype, pd.CategoricalDtype) and fill_value not in values.cat.categories:
+        # Sorted in, so groups come out in the order a groupby of the filled strings gives
+        values = values.cat.set_categories(values.cat.categories.union([fill_value]))
+    return values.fillna(fill_value)
+
+
+def derive_accounts(transactions_df):
+    """Unique locations/accounts, each assigned to the rep of its first transaction"""
+    accounts_df = transactions_df[[
+        'LCTN_ID', 'CHILD_LCTN_DBA_NM', 'REP NAME', 'CITY_NM', 'latitude', 'longitude', 'preprocessed_address' # Use 'preprocessed_address'
+    ]].drop_duplicates(subset=['LCTN_ID'])
+    # Back to plain strings - the account frame is small and gets filled/concatenated freely
+    accounts_df = accounts_df.astype({
+        column: object for column in ['CHILD_LCTN_DBA_NM', 'REP NAME', 'CITY_NM', 'preprocessed_address']
+        if isinstance(accounts_df[column].dtype, pd.CategoricalDtype)
+    })
+
+    # Rename for compatibility with existing functions
+    accounts_df = accounts_df.rename(columns={
+        'LCTN_ID': 'AccountID',
+        'CHILD_LCTN_DBA_NM': 'AccountName',
+        'REP NAME': 'RepID', # Using Rep Name as RepID here
+        'CITY_NM': 'CityName',
+        'preprocessed_address': 'full_address' # Map preprocessed to full_address
+        # latitude, longitude names are kept
+    })
+    # Fill any NaNs introduced if CHILD_LCTN_DBA_NM was sometimes missing
+    accounts_df['AccountName'] = accounts_df['AccountName'].fillna('Unknown Account')
+    accounts_df['full_address'] = accounts_df['full_address'].fillna('Address Unavailable')
+    return accounts_df
+
+
+def derive_sales_reps(transactions_df):
+    """Unique reps in order of their first transaction"""
+    sales_reps_df = transactions_df[['REP NAME']].drop_duplicates().astype(object)
+    sales_reps_df = sales_reps_df.rename(columns={'REP NAME': 'RepID'})
+    # Assuming RepName is the same as RepID (the name string)
+    sales_reps_df['RepName'] = sales_reps_df['RepID']
+    return sales_reps_df
+
+
+def generate_sales_targets(rep_ids):
+    """Placeholder targets - the seeded draws depend only on the rep order, so appending reps keeps existing targets"""
+    sales_targets_list = []
+    np.random.seed(42)
+    for rep_id in rep_ids:
+        bonus_threshold = np.random.randint(100000, 500000) # Placeholder target
+        eligibility_prob = 0.2 + (hash(rep_id) % 6) / 10.0
+        bonus_eligibility = np.random.choice([True, False], p=[eligibility_prob, 1-eligibility_prob])
+        sales_targets_list.append({
+            'RepID': rep_id, # RepID is the Rep Name string
+            'BonusThreshold': bonus_threshold,
+            'Bonus_Eligibility': bonus_eligibility
+        })
+    return pd.DataFrame(sales_targets_list)
+
+
+CITY_AGGREGATIONS = dict(
+    Total_Processing_Cents=('TRAN_AM_CENTS', 'sum'),
+    Total_Transactions=('TRAN_AM_CENTS', 'size'), # One row per transaction
+    latitude=('latitude', 'first'), # Take first available lat/lon/address per city
+    longitude=('longitude', 'first'),
+    full_address=('preprocessed_address', 'first') # Use preprocessed address
+)
+
+
+def aggregate_cities(transactions_df):
+    """Raw per-city totals (NaNs kept, so two aggregates can still be merged exactly)"""
+    city_totals = transactions_df.groupby(['CITY_NM'], observed=True).agg(**CITY_AGGREGATIONS).reset_index()
+    # One row per city - plain strings, so aggregates of different row ranges concat cleanly
+    return city_totals.astype({'CITY_NM': object, 'full_address': object})
+
+
+def merge_city_totals(city_totals, new_city_totals):
+    """Combine per-city totals of consecutive row ranges; 'first' keeps the older range's values"""
+    combined = pd.concat([city_totals, new_city_totals], ignore_index=True)
+    return combined.groupby('CITY_NM').agg(
+        Total_Processing_Cents=('Total_Processing_Cents', 'sum'), # Integer sums, so merging is exact
+        Total_Transactions=('Total_Transactions', 'sum'),
+        latitude=('latitude', 'first'),
+        longitude=('longitude', 'first'),
+        full_address=('full_address', 'first')
+    ).reset_index()
+
+
+def derive_territory_performance(city_totals):
+    """Clean per-city totals into the territory_performance frame used by the maps"""
+    # Rename CityName to 'city' for map function compatibility
+    territory_agg = city_totals.rename(columns={'CITY_NM': 'city', 'Total_Processing_Cents': 'Total_Processing'})
+
+    # Ensure required columns exist and handle NAs
+    required_terr_cols = ['city', 'Total_Processing', 'Total_Transactions', 'latitude', 'longitude', 'full_address']
+    for col in required_terr_cols:
+        if col not in territory_agg.columns:
+             territory_agg[col] = np.nan # Add missing columns if needed
+
+    territory_agg['city'] = territory_agg['city'].astype(str).fillna('Unknown')
+    territory_agg['full_address'] = territory_agg['full_address'].astype(str).fillna('Address Unavailable')
+    territory_agg['latitude'] = pd.to_numeric(territory_agg['latitude'], errors='coerce').fillna(0)
+    territory_agg['longitude'] = pd.to_numeric(territory_agg['longitude'], errors='coerce').fillna(0)
+    # The maps show dollars
+    territory_agg['Total_Processing'] = to_dollars(pd.to_numeric(territory_agg['Total_Processing'], errors='coerce').fillna(0))
+    territory_agg['Total_Transactions'] = pd.to_numeric(territory_agg['Total_Transactions'], errors='coerce').fillna(0)
+    return territory_agg
+
+
+# Estimated profit as a share of the processing amount (the profit map)
+ESTIMATED_PROFIT_RATE = 0.3
+
+
+def _money(dollars):
+    # '$1,234.56' per value - a plain loop over the floats, no per-row Series
+    return pd.Series([f"${value:,.2f}" for value in dollars.to_numpy()], index=dollars.index, dtype=object)
+
+
+def city_hover_text(cities):
+    """
+    Hover labels of the map bubbles, built column-wise from a territory_performance frame:
+    hover_total (rep map), hover_processing (processing map) and hover_profit (profit map)
+    """
+    head = '<b>' + cities['city'] + '</b><br>'
+    tail = '<br>Transactions: ' + cities['Total_Transactions'].astype('int64').astype(str) + '<br>Address: ' + cities['full_address']
+    processing = _money(cities['Total_Processing'])
+    return pd.DataFrame({
+        'hover_total': head + 'Total: ' + processing + tail,
+        'hover_processing': head + 'Total Processing: ' + processing + tail,
+        'hover_profit': head + 'Est. Profit: ' + _money(cities['Total_Processing'] * ESTIMATED_PROFIT_RATE) + tail,
+    }, index=cities.index)
+
+
+def transaction_owners(transactions_df, accounts_df):
+    """RepID owning each transaction row - the rep its account (LCTN_ID) is assigned to"""
+    return transactions_df['LCTN_ID'].map(accounts_df.set_index('AccountID')['RepID']).to_numpy()
+
+
+def build_rep_index(owners, rep_ids, first_position=0):
+    """
+    Group row positions by rep (CSR layout). Returns rep_rows, the positions ordered by
+    rep (ascending within each rep), and rep_offsets, a frame of each rep's
+    start/stop into rep_rows, indexed by RepID.
+    """
+    codes = pd.Categorical(owners, categories=rep_ids).codes
+    rep_rows = np.argsort(codes, kind='stable') + first_position
+    counts = np.bincount(codes[codes >= 0], minlength=len(rep_ids))
+    # Rows without a known rep (code -1) sort first; skip them
+    rep_rows = rep_rows[len(codes) - counts.sum():]
+    stops = np.cumsum(counts)
+    rep_offsets = pd.DataFrame({'start': stops - counts, 'stop': stops}, index=pd.Index(rep_ids, name='RepID'))
+    return rep_rows, rep_offsets
+
+
+def merge_rep_indexes(rep_rows, rep_offsets, new_rep_rows, new_rep_offsets):
+    """Append the rows of a second index (same rep order, later positions) to each rep's group"""
+    old = rep_offsets.reindex(new_rep_offsets.index, fill_value=0)
+    counts = (old['stop'] - old['start']).to_numpy() + (new_rep_offsets['stop'] - new_rep_offsets['start']).to_numpy()
+    stops = np.cumsum(counts)
+    merged = np.empty(stops[-1] if len(stops) else 0, dtype=rep_rows.dtype)
+
+    position = 0
+    for old_start, old_stop, new_start, new_stop in zip(old['start'], old['stop'], new_rep_offsets['start'], new_rep_offsets['stop']):
+        merged[position:position + old_stop - old_start] = rep_rows[old_start:old_stop]
+        position += old_stop - old_start
+        merged[position:position + new_stop - new_start] = new_rep_rows[new_start:new_stop]
+        position += new_stop - new_start
+
+    return merged, pd.DataFrame({'start': stops - counts, 'stop': stops}, index=new_rep_offsets.index)
+
+
+def index_rep_rows(data):
+    """(Re)build the rep index of a date-sorted transactions frame, plus each indexed row's date"""
+    data['rep_rows'], data['rep_offsets'] = build_rep_index(
+        transaction_owners(data['transactions'], data['accounts']), data['sales_reps']['RepID'].tolist()
+    )
+    data['rep_row_dates'] = data['transactions']['TRAN_DT'].to_numpy()[data['rep_rows']]
+
+
+def date_bounds(dates, start_date, end_date):
+    """Positions [lo, hi) of the sorted dates falling within [start_date, end_date], both ends inclusive"""
+    lo = np.searchsorted(dates, pd.Timestamp(start_date).to_datetime64(), side='left')
+    hi = np.searchsorted(dates, pd.Timestamp(end_date).to_datetime64(), side='right')
+    return lo, hi
+
+
+def _rep_bounds(data, rep_id):
+    if rep_id not in data['rep_offsets'].index:
+        return 0, 0
+    start, stop = data['rep_offsets'].loc[rep_id, ['start', 'stop']]
+    return start, stop
+
+
+def rep_transactions(data, rep_id):
+    """All transactions of a rep's accounts, sliced through the rep index instead of scanning the table"""
+    start, stop = _rep_bounds(data, rep_id)
+    return data['transactions'].iloc[data['rep_rows'][start:stop]]
+
+
+def window_bounds(data, start_date, end_date, rep_id=None):
+    """
+    Positions [lo, hi) of the window's rows - into the transactions for all reps, into
+    rep_rows for one rep. Two windows with the same bounds cover exactly the same rows.
+    """
+    if rep_id is None:
+        return date_bounds(data['transactions']['TRAN_DT'].to_numpy(), start_date, end_date)
+
+    start, stop = _rep_bounds(data, rep_id)
+    lo, hi = date_bounds(data['rep_row_dates'][start:stop], start_date, end_date)
+    return start + lo, start + hi
+
+
+def transactions_between(data, start_date, end_date, rep_id=None):
+    """
+    Transactions dated within [start_date, end_date] - all of them, or only the rep's.
+    The store is sorted by TRAN_DT (and so is each rep's group in the rep index), so the
+    window is found by binary search instead of masking the whole table.
+    """
+    lo, hi = window_bounds(data, start_date, end_date, rep_id)
+    if rep_id is None:
+        return data['transactions'].iloc[lo:hi]
+    return data['transactions'].iloc[data['rep_rows'][lo:hi]]
+
+
+def in_file_order(transactions_df):
+    """
+    Rows of a date-sorted view back in transaction-file order. Aggregations picking a
+    city's 'first' address/coordinates use this so they pick the same row as before.
+    """
+    return transactions_df.sort_index(kind='stable')
+
+
+# --- Daily prefix-sum cube ---
+
+def build_daily_cube(data):
+    """
+    Dense rep x day prefix sums of TRAN_AM_CENTS and transaction counts. Row i belongs to
+    rep_offsets.index[i], the extra last row to all transactions. Column j holds the
+    totals of the days before cube_days[j], so any window total is two lookups.
+    """
+    days = data['transactions']['TRAN_DT'].to_numpy().astype('datetime64[D]')
+    amounts = data['transactions']['TRAN_AM_CENTS'].to_numpy(dtype=np.int64)
+    n_reps = len(data['rep_offsets'])
+    if len(days):
+        # The store is date-sorted, so the first and last rows span the whole range
+        data['cube_days'] = np.arange(days[0], days[-1] + 1)
+    else:
+        data['cube_days'] = np.array([], dtype='datetime64[D]')
+    width = len(data['cube_days']) + 1
+
+    # Column of every transaction row (column 0 stays empty, it is the "before everything" total)
+    columns = (days - days[0]).astype(np.int64) + 1 if len(days) else np.zeros(0, dtype=np.int64)
+    # rep_rows is grouped by rep in rep_offsets order, so the owner of each entry is a repeat
+    rep_lengths = (data['rep_offsets']['stop'] - data['rep_offsets']['start']).to_numpy()
+    cells = np.repeat(np.arange(n_reps), rep_lengths) * width + columns[data['rep_rows']]
+
+    # Integer scatter-adds (bincount weights would go through float64)
+    amount = np.zeros((n_reps + 1, width), dtype=np.int64)
+    count = np.zeros((n_reps + 1, width), dtype=np.int64)
+    np.add.at(amount[:n_reps].reshape(-1), cells, amounts[data['rep_rows']])
+    count[:n_reps] = np.bincount(cells, minlength=n_reps * width).reshape(n_reps, width)
+    np.add.at(amount[n_reps], columns, amounts)
+    count[n_reps] = np.bincount(columns, minlength=width)
+
+    data['cube_amount'] = np.cumsum(amount, axis=1)
+    data['cube_count'] = np.cumsum(count, axis=1)
+
+
+def _cube_window(data, start_date, end_date):
+    """Cube columns (lo, hi) whose difference covers the days within [start_date, end_date] (None = unbounded)"""
+    days = data['cube_days']
+    lo = 0 if start_date is None else np.searchsorted(days, np.datetime64(pd.Timestamp(start_date).date()), side='left')
+    hi = len(days) if end_date is None else np.searchsorted(days, np.datetime64(pd.Timestamp(end_date).date()), side='right')
+    return lo, max(lo, hi)
+
+
+def _cube_row(data, rep_id):
+    """Cube row of a rep (None = all transactions, the last row); None if the rep has no row"""
+    if rep_id is None:
+        return len(data['rep_offsets'])
+    if rep_id in data['rep_offsets'].index:
+        return data['rep_offsets'].index.get_loc(rep_id)
+    return None
+
+
+def range_totals(data, start_date, end_date, rep_id=None):
+    """
+    (TRAN_AM_CENTS sum, transaction count) of the days within [start_date, end_date] - all
+    transactions, or only the rep's - read off the prefix-sum cube in O(1).
+    """
+    row = _cube_row(data, rep_id)
+    lo, hi = _cube_window(data, start_date, end_date)
+    if row is None or hi == lo:
+        return 0, 0
+    amount = data['cube_amount'][row, hi] - data['cube_amount'][row, lo]
+    count = data['cube_count'][row, hi] - data['cube_count'][row, lo]
+    return int(amount), int(count)
+
+
+def range_totals_by_rep(data, start_date=None, end_date=None):
+    """Every rep's window totals (all-time by default) in one vectorized read of the cube, as a frame indexed by RepID"""
+    lo, hi = _cube_window(data, start_date, end_date)
+    n_reps = len(data['rep_offsets'])
+    return pd.DataFrame({
+        'total_processed_cents': data['cube_amount'][:n_reps, hi] - data['cube_amount'][:n_reps, lo],
+        'total_volume': data['cube_count'][:n_reps, hi] - data['cube_count'][:n_reps, lo],
+    }, index=data['rep_offsets'].index)
+
+
+def _period_starts(days, resolution):
+    # First day of the day/week/month each day falls in
+    if resolution == 'day':
+        return days
+    if resolution == 'week':
+        # Weeks start on Monday; day 0 (1970-01-01) was a Thursday
+        return days - ((days.astype(np.int64) + 3) % 7).astype('timedelta64[D]')
+    if resolution == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"Unknown resolution: {resolution!r}")
+
+
+def period_totals(data, start_date, end_date, rep_id=None, resolution='day'):
+    """
+    TRAN_AM_CENTS and transaction count (TransactionVolume) per day, week (from Monday) or
+    month of the window - all transactions or the rep's - read off the prefix-sum cube
+    (one lookup per period) instead of grouping the transactions. Periods without
+    transactions are left out; TRAN_DT is the first day of the period.
+    """
+    row = _cube_row(data, rep_id)
+    lo, hi = _cube_window(data, start_date, end_date)
+    if row is None:
+        hi = lo
+
+    starts = _period_starts(data['cube_days'][lo:hi], resolution)
+    # Position of each period's first day; consecutive ones bound a period's cube columns
+    first = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])[:len(starts)]
+    edges = lo + np.r_[first, len(starts)]
+    amount = np.diff(data['cube_amount'][row, edges]) if len(starts) else np.zeros(0, dtype=np.int64)
+    count = np.diff(data['cube_count'][row, edges]) if len(starts) else np.zeros(0, dtype=np.int64)
+    keep = count > 0
+    return pd.DataFrame({
+        'TRAN_DT': starts[first][keep].astype(data['transactions']['TRAN_DT'].dtype),
+        'TRAN_AM_CENTS': amount[keep],
+        'TransactionVolume': count[keep],
+    })
+
+
+# --- City aggregates ---
+
+_city_cache = OrderedDict()
+_city_cache_lock = threading.Lock()
+
+
+def dataset_id(data):
+    """
+    Identity of a derived data dict: its snapshot folder when it is attached to one, else the
+    id its derivation drew. Every build or append yields a new one, whatever its content.
+    """
+    return data['dataset_id']
+
+
+def city_aggregate(data, start_date, end_date, rep_id=None):
+    """
+    Per-city totals of a window - all transactions or the rep's - in the cleaned
+    territory_performance layout (the same groupby and cleanup load_data() uses),
+    plus the maps' hover labels (city_hover_text). Results are cached per (dataset_id,
+    rep, rows covered), so every map and rerun showing that window shares one frame
+    and its labels. Treat it as read-only.
+    """
+    key = (dataset_id(data), rep_id) + tuple(int(bound) for bound in window_bounds(data, start_date, end_date, rep_id))
+    with _city_cache_lock:
+        if key in _city_cache:
+            _city_cache.move_to_end(key)
+            return _city_cache[key]
+
+    store = sql_store(data)
+    if store:
+        cities = derive_territory_performance(sql_city_totals(store, start_date, end_date, rep_id))
+    else:
+        # File order, so 'first' picks the same address/coordinates as the full-table aggregate
+        cities = derive_territory_performance(aggregate_cities(in_file_order(transactions_between(data, start_date, end_date, rep_id))))
+    cities = pd.concat([cities, city_hover_text(cities)], axis=1)
+
+    with _city_cache_lock:
+        _city_cache[key] = cities
+        while len(_city_cache) > CITY_CACHE_SIZE:
+            _city_cache.popitem(last=False)
+    return cities
+
+
+# --- Optional SQLite query store ---
+
+# Transaction columns copied into the store; RepID is the owning rep (the rep of the account), as in rep_offsets
+SQL_COLUMNS = [
+    'TRAN_DT', 'TRAN_AM_CENTS', 'LCTN_ID', 'CITY_NM', 'REP NAME', 'GRANDPARENT_CORP_DBA_NM',
+    'CHILD_LCTN_DBA_NM', 'latitude', 'longitude', 'preprocessed_address'
+]
+SQL_INDEXES = {
+    'idx_rep_date': '"RepID", "TRAN_DT"',
+    'idx_date': '"TRAN_DT"',
+    'idx_location': '"LCTN_ID"',
+    'idx_city': '"CITY_NM"',
+}
+
+
+def write_sqlite_store(data, path):
+    """
+    Write the data dict's transactions to a new SQLite file with the window/rep/account/city
+    indexes. file_row keeps the row labels, so 'first' picks follow file order; TRAN_DT is
+    stored as int64 nanoseconds and amounts as integer cents, so SQL sums are exact.
+    """
+    transactions = data['transactions']
+    rows = transactions[SQL_COLUMNS].astype({
+        column: object for column in SQL_COLUMNS if isinstance(transactions[column].dtype, pd.CategoricalDtype)
+    })
+    rows['TRAN_DT'] = transactions['TRAN_DT'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    rows['RepID'] = transaction_owners(transactions, data['accounts'])
+
+    with sqlite3.connect(path) as connection:
+        rows.to_sql('transactions', connection, index=True, index_label='file_row')
+        for name, columns in SQL_INDEXES.items():
+            connection.execute(f'CREATE INDEX {name} ON transactions ({columns})')
+    connection.close()
+
+
+def sql_store(data):
+    """Path of the data dict's SQLite store, or None (no store, or its snapshot was replaced meanwhile) - use pandas then"""
+    path = data.get('sql_store')
+    return path if path and os.path.exists(path) else None
+
+
+def _sql_query(path, sql, params=()):
+    # Opened read-only per query - any number of sessions and worker processes can share the file
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return pd.read_sql_query(sql, connection, params=params)
+    finally:
+        connection.close()
+
+
+def _sql_window(start_date, end_date, rep_id=None):
+    """WHERE clause and parameters of a window, both ends inclusive like window_bounds()"""
+    clause = '"TRAN_DT" BETWEEN ? AND ?'
+    params = [pd.Timestamp(start_date).value, pd.Timestamp(end_date).value]
+    if rep_id is not None:
+        clause = '"RepID" = ? AND ' + clause
+        params.insert(0, rep_id)
+    return clause, params
+
+
+def sql_range_totals(path, start_date, end_date, rep_id=None):
+    """range_totals() as one indexed SQL aggregate"""
+    clause, params = _sql_window(start_date, end_date, rep_id)
+    totals = _sql_query(
+        path, f'SELECT COALESCE(SUM("TRAN_AM_CENTS"), 0) AS cents, COUNT(*) AS volume FROM transactions WHERE {clause}', params
+    )
+    return int(totals['cents'].iloc[0]), int(totals['volume'].iloc[0])
+
+
+def sql_city_totals(path, start_date, end_date, rep_id=None):
+    """aggregate_cities() of a window in SQL - 'first' is the first non-null value in file order"""
+    clause, params = _sql_window(start_date, end_date, rep_id)
+    firsts = ', '.join(
+        f'FIRST_VALUE("{column}") OVER (PARTITION BY "CITY_NM" ORDER BY "{column}" IS NULL, file_row) AS "{name}"'
+        for column, name in [('latitude', 'latitude'), ('longitude', 'longitude'), ('preprocessed_address', 'full_address')]
+    )
+    cities = _sql_query(path, f'''
+        SELECT "CITY_NM", SUM("TRAN_AM_CENTS") AS "Total_Processing_Cents", COUNT(*) AS "Total_Transactions",
+               MAX("latitude") AS "latitude", MAX("longitude") AS "longitude", MAX("full_address") AS "full_address"
+        FROM (SELECT "CITY_NM", "TRAN_AM_CENTS", {firsts} FROM transactions WHERE "CITY_NM" IS NOT NULL AND {clause})
+        GROUP BY "CITY_NM" ORDER BY "CITY_NM"
+    ''', params)
+    # Same column types as the pandas aggregate (SQLite hands back float64 and all-NULL columns as object)
+    cities = cities.astype({'latitude': np.float32, 'longitude': np.float32, 'full_address': object})
+    # A city without any address is NaN there, not None (the cleanup turns it into the same text)
+    cities['full_address'] = cities['full_address'].where(cities['full_address'].notna(), np.nan)
+    return cities
+
+
+def sql_account_totals(path, start_date, end_date):
+    """FilterContext.account_totals in SQL"""
+    clause, params = _sql_window(start_date, end_date)
+    return _sql_query(path, f'''
+        SELECT "LCTN_ID",
+               COALESCE("CHILD_LCTN_DBA_NM", 'Unknown Account') AS "CHILD_LCTN_DBA_NM",
+               COALESCE("GRANDPARENT_CORP_DBA_NM", 'N/A') AS "GRANDPARENT_CORP_DBA_NM",
+               COALESCE("REP NAME", 'Unknown Rep') AS "REP NAME",
+               SUM("TRAN_AM_CENTS") AS "TRAN_AM_CENTS", COUNT(*) AS "TransactionVolume"
+        FROM transactions WHERE {clause}
+        GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+    ''', params)
+
+
+# --- Shared read-only dataset ---
+
+def _freeze_frame(frame):
+    # pandas has no public handle on a frame's column buffers, so the block arrays are reached directly
+    for values in frame._mgr.arrays:
+        values = getattr(values, '_ndarray', values) # Categorical codes / datetime64 data of extension blocks
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+
+
+def freeze_data(data):
+    """
+    Make a data dict safe to share between sessions: every NumPy buffer (arrays and frame
+    columns) is made non-writeable and the dict itself a read-only mapping. In-place edits
+    then raise instead of leaking into other sessions; derive new frames instead.
+    """
+    for value in data.values():
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        elif isinstance(value, pd.DataFrame):
+            _freeze_frame(value)
+    return MappingProxyType(data)
+
+
+# --- Paginated tables ---
+
+def query_table(table, sort_by=None, ascending=True, filters=()):
+    """
+    The rows of a table matching every (column, low, high) range filter (either bound None =
+    open), sorted by one column's values - numbers as numbers - or left in table order.
+    Pages are slices of the result, so the browser is only ever sent one of them.
+    """
+    mask = np.ones(len(table), dtype=bool)
+    for column, low, high in filters:
+        values = table[column].to_numpy()
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+    rows = table if mask.all() else table[mask]
+    if sort_by is not None:
+        rows = rows.sort_values(sort_by, ascending=ascending, kind='stable')
+    return rows
+
+
+# --- Per-rerun filter context ---
+
+class FilterContext:
+    """
+    The (rep, date window) selection of one dashboard rerun. Every widget reads its slice
+    or aggregate from here; each is computed on first access and then memoized, so widgets
+    sharing a slice no longer filter (or copy) the transactions again. Treat the returned
+    frames as read-only.
+    """
+
+    def __init__(self, data, start_date, end_date, rep_id=None):
+        self.data = data
+        self.start_date = pd.Timestamp(start_date)
+        self.end_date = pd.Timestamp(end_date)
+        self.rep_id = rep_id
+
+    @cached_property
+    def transactions(self):
+        """All transactions in the window (date-sorted view)"""
+        return transactions_between(self.data, self.start_date, self.end_date)
+
+    @cached_property
+    def rep_transactions(self):
+        """The rep's transactions in the window"""
+        return transactions_between(self.data, self.start_date, self.end_date, self.rep_id)
+
+    @cached_property
+    def sql_store(self):
+        """Path of the SQLite store to push aggregates down to (None = pandas)"""
+        return sql_store(self.data)
+
+    @cached_property
+    def totals(self):
+        """(TRAN_AM_CENTS sum, transaction count) of the window, from the prefix-sum cube"""
+        if self.sql_store:
+            return sql_range_totals(self.sql_store, self.start_date, self.end_date)
+        return range_totals(self.data, self.start_date, self.end_date)
+
+    @cached_property
+    def rep_totals(self):
+        """(TRAN_AM_CENTS sum, transaction count) of the rep in the window, from the prefix-sum cube"""
+        if self.sql_store:
+            return sql_range_totals(self.sql_store, self.start_date, self.end_date, self.rep_id)
+        return range_totals(self.data, self.start_date, self.end_date, self.rep_id)
+
+    @cached_property
+    def city_totals(self):
+        """Cleaned per-city totals of the window (see city_aggregate)"""
+        return city_aggregate(self.data, self.start_date, self.end_date)
+
+    @cached_property
+    def rep_city_totals(self):
+        """Cleaned per-city totals of the rep's window"""
+        return city_aggregate(self.data, self.start_date, self.end_date, self.rep_id)
+
+    @cached_property
+    def account_totals(self):
+        """
+        Window totals per account (LCTN_ID) with its child/grandparent names and rep name,
+        missing names filled in. Finer-grained groupings sum this instead of the transactions.
+        """
+        if self.sql_store:
+            return sql_account_totals(self.sql_store, self.start_date, self.end_date)
+        transactions = self.transactions
+        keys = [
+            transactions['LCTN_ID'],
+            fill_category(transactions['CHILD_LCTN_DBA_NM'], 'Unknown Account'),
+            fill_category(transactions['GRANDPARENT_CORP_DBA_NM'], 'N/A'),
+            fill_category(transactions['REP NAME'], 'Unknown Rep'),
+        ]
+        totals = transactions.groupby(keys, dropna=False, observed=True).agg(
+            TRAN_AM_CENTS=('TRAN_AM_CENTS', 'sum'),
+            TransactionVolume=('TRAN_AM_CENTS', 'size') # Row count
+        ).reset_index()
+        # One row per account - plain strings again, so callers can sort and format names as usual
+        return totals.astype({'CHILD_LCTN_DBA_NM': object, 'GRANDPARENT_CORP_DBA_NM': object, 'REP NAME': object})
+
+    @cached_property
+    def rep_account_months(self):
+        """
+        The rep's window totals (TRAN_AM_CENTS, TransactionVolume) per account - LCTN_ID with
+        its grandparent and rep name, missing names filled in - and Year/Quarter/Month
+        """
+        rep_transactions = self.rep_transactions
+        # Missing names filled in the group keys, not the frame; Year/Quarter/Month come from TRAN_DT, which is never missing
+        keys = [
+            rep_transactions['LCTN_ID'],
+            fill_category(rep_transactions['GRANDPARENT_CORP_DBA_NM'], 'N/A'),
+            fill_category(rep_transactions['REP NAME'], 'Unknown Rep'),
+            rep_transactions['Year'],
+            rep_transactions['Quarter'],
+            rep_transactions['Month']
+        ]
+        return rep_transactions.groupby(keys, observed=True).agg(
+            TRAN_AM_CENTS=('TRAN_AM_CENTS', 'sum'),
+            TransactionVolume=('TRAN_AM_CENTS', 'size') # One row per transaction
+        ).reset_index()
+
+    @cached_property
+    def rep_daily_totals(self):
+        """TRAN_AM_CENTS and transaction count (TransactionVolume) per day of the rep's window, off the cube"""
+        return period_totals(self.data, self.start_date, self.end_date, self.rep_id, 'day')
+
+    @cached_property
+    def rep_weekly_totals(self):
+        """rep_daily_totals per week (TRAN_DT = the Monday)"""
+        return period_totals(self.data, self.start_date, self.end_date, self.rep_id, 'week')
+
+    @cached_property
+    def rep_monthly_totals(self):
+        """rep_daily_totals per month (TRAN_DT = the 1st)"""
+        return period_totals(self.data, self.start_date, self.end_date, self.rep_id, 'month')
+
+    @cached_property
+    def rep_activity(self):
+        """The rep's performance_data rows in the window, with integer Month/Year"""
+        performance_data = self.data.get('performance_data')
+        if performance_data is None or performance_data.empty:
+            return pd.DataFrame()
+        activity = performance_data[performance_data['Sales Rep'] == self.rep_id]
+        dates = pd.to_datetime(activity['Date'], errors='coerce')
+        activity = activity[(dates >= self.start_date) & (dates <= self.end_date)]
+        months = pd.to_numeric(activity['Month'], errors='coerce')
+        years = pd.to_numeric(activity['Year'], errors='coerce')
+        keep = months.notna() & years.notna()
+        return activity[keep].assign(Month=months[keep].astype(int), Year=years[keep].astype(int))
+
+
+def derive_data(transactions_df):
+    """Build the dashboard's data dict from prepared transactions (everything except performance data)"""
+    # --- Derive Accounts, Sales Reps and city totals from Transactions (in file order, so first occurrences win) ---
+    return _complete_data(
+        # --- Keep the store sorted by date (stable, so same-day rows keep file order) ---
+        transactions_df.sort_values('TRAN_DT', kind='stable'),
+        derive_sales_reps(transactions_df), derive_accounts(transactions_df), aggregate_cities(transactions_df)
+    )
+
+
+def sort_parts_by_date(parts):
+    """
+    Prepared transaction chunks (in file order) as one date-sorted frame - what a stable
+    TRAN_DT sort of concat_transactions(parts) gives, built one column at a time. Each
+    chunk's copy of a column is dropped once the column is placed, so the table is held
+    about once, not once per concat/sort copy. Empties the chunks.
+    """
+    order = np.argsort(np.concatenate([part['TRAN_DT'].to_numpy() for part in parts]), kind='stable')
+    index = pd.Index(np.concatenate([part.index.to_numpy() for part in parts])).take(order)
+    columns = {}
+    for column in list(parts[0].columns):
+        pieces = [part.pop(column) for part in parts]
+        if column in TRANSACTION_CATEGORIES:
+            # Categories unified and sorted, as a single parse would have them
+            values = union_categoricals(pieces, sort_categories=True)
+        else:
+            values = pd.concat(pieces, ignore_index=True).array
+        del pieces
+        columns[column] = values.take(order)
+    # copy=False keeps one block per column instead of consolidating them into new 2-D copies
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def stream_derive_data(chunks):
+    """
+    derive_data() for raw transaction chunks arriving in file order. Each chunk is prepared
+    (compact dtypes, dashboard columns only) as soon as it is read, while reps, accounts and
+    city totals are folded in chunk by chunk (first occurrence wins, as in append_transactions).
+    Only one raw chunk is held at a time, but every compact chunk is kept until the end, so
+    memory still grows with the file: the whole compact table, plus one raw chunk, plus the
+    rep index and daily cube, which are built from the finished table. The compact chunks
+    are merged into the date-sorted store column by column (sort_parts_by_date).
+    Returns (data, raw_rows).
+    """
+    parts = []
+    sales_reps_df = accounts_df = city_totals = None
+    raw_rows = 0
+    for chunk in chunks:
+        raw_rows += len(chunk)
+        chunk = prepare_transactions(chunk)
+        parts.append(chunk)
+
+        new_reps = derive_sales_reps(chunk)
+        new_accounts = derive_accounts(chunk)
+        new_city_totals = aggregate_cities(chunk)
+        if sales_reps_df is None:
+            sales_reps_df, accounts_df, city_totals = new_reps, new_accounts, new_city_totals
+            continue
+        sales_reps_df = pd.concat([sales_reps_df, new_reps[~new_reps['RepID'].isin(sales_reps_df['RepID'])]])
+        accounts_df = pd.concat([accounts_df, new_accounts[~new_accounts['AccountID'].isin(accounts_df['AccountID'])]])
+        city_totals = merge_city_totals(city_totals, new_city_totals)
+
+    if sales_reps_df is None:
+        # Header-only file - derive the empty frames the usual way
+        return derive_data(prepare_transactions(pd.DataFrame(columns=TRANSACTION_COLUMNS))), 0
+    return _complete_data(sort_parts_by_date(parts), sales_reps_df, accounts_df, city_totals), raw_rows
+
+
+def _complete_data(transactions_df, sales_reps_df, accounts_df, city_totals):
+    """
+    The rest of the data dict, from the date-sorted transactions (stable, so same-day rows keep
+    file order) and the reps, accounts and raw city totals derived from them in file order
+    """
+    data = {
+        'dataset_id': uuid.uuid4().hex, # Until it is attached to the snapshot it gets stored as
+        'sales_reps': sales_reps_df,
+        'accounts': accounts_df,
+        'transactions': transactions_df,
+    }
+
+    # --- Assigned Accounts (Maps accounts to their designated rep) ---
+    # This is implicitly defined in accounts_df already
+    data['assigned_accounts'] = data['accounts'][['AccountID', 'RepID']].copy()
+
+    # --- Generate sales_targets (Keep placeholder or load real targets) ---
+    data['sales_targets'] = generate_sales_targets(data['sales_reps']['RepID'].tolist())
+
+    # --- Create territory_performance from REAL data ---
+    data['city_totals'] = city_totals
+    data['territory_performance'] = derive_territory_performance(data['city_totals'])
+
+    # --- Rep -> row positions index, so rep-scoped views never scan the whole table ---
+    index_rep_rows(data)
+
+    # --- Rep x day prefix sums, so window totals never scan at all ---
+    build_daily_cube(data)
+    return data
+
+
+def append_transactions(data, new_rows):
+    """
+    Merge raw rows appended to the transaction file into a data dict. Derived frames
+    are updated from the new rows only, so the cost follows the size of the delta.
+    """
+    new_transactions = prepare_transactions(new_rows)
+    data = dict(data)
+    if new_transactions.empty:
+        return data
+    data['dataset_id'] = uuid.uuid4().hex # A new version - nothing cached for the old one applies
+
+    transactions = data['transactions']
+    sorted_new = new_transactions.sort_values('TRAN_DT', kind='stable')
+    # A settlement feed normally appends newer days - then the new rows simply go after the existing ones
+    in_order = transactions.empty or sorted_new['TRAN_DT'].iloc[0] >= transactions['TRAN_DT'].iloc[-1]
+    first_position = len(transactions)
+    if in_order:
+        data['transactions'] = concat_transactions([transactions, sorted_new])
+    else:
+        data['transactions'] = concat_transactions([transactions, new_transactions]).sort_values('TRAN_DT', kind='stable')
+
+    # Only accounts and reps never seen before are added (the existing first occurrence wins)
+    new_accounts = derive_accounts(new_transactions)
+    new_accounts = new_accounts[~new_accounts['AccountID'].isin(data['accounts']['AccountID'])]
+    data['accounts'] = pd.concat([data['accounts'], new_accounts])
+    data['assigned_accounts'] = pd.concat([data['assigned_accounts'], new_accounts[['AccountID', 'RepID']]])
+
+    new_reps = derive_sales_reps(new_transactions)
+    new_reps = new_reps[~new_reps['RepID'].isin(data['sales_reps']['RepID'])]
+    if not new_reps.empty:
+        data['sales_reps'] = pd.concat([data['sales_reps'], new_reps])
+        targets = generate_sales_targets(data['sales_reps']['RepID'].tolist())
+        new_targets = targets[targets['RepID'].isin(new_reps['RepID'])]
+        data['sales_targets'] = pd.concat([data['sales_targets'], new_targets], ignore_index=True)
+
+    data['city_totals'] = merge_city_totals(data['city_totals'], aggregate_cities(new_transactions))
+    data['territory_performance'] = derive_territory_performance(data['city_totals'])
+
+    if not in_order:
+        # Back-dated rows moved existing positions - rebuild the index
+        index_rep_rows(data)
+        build_daily_cube(data)
+        return data
+
+    # New rows sit after all existing positions, so they go at the end of each rep's group
+    new_rep_rows, new_rep_offsets = build_rep_index(
+        transaction_owners(sorted_new, data['accounts']), data['sales_reps']['RepID'].tolist(), first_position
+    )
+    data['rep_rows'], data['rep_offsets'] = merge_rep_indexes(
+        data['rep_rows'], data['rep_offsets'], new_rep_rows, new_rep_offsets
+    )
+    data['rep_row_dates'] = data['transactions']['TRAN_DT'].to_numpy()[data['rep_rows']]
+    # The day axis may have grown, so the cube is rebuilt (one bincount pass, no grouping)
+    build_daily_cube(data)
+    return data
+
+
+# --- Dataset loading and background refresh ---
+
+logger = logging.getLogger(__name__)
+
+
+def load_performance_data(path=PERFORMANCE_FILE):
+    """Activity rows with a parsed Date and numeric Month/Year"""
+    performance_data = pd.read_csv(path).fillna(0)
+    performance_data['Date'] = pd.to_datetime(performance_data['Date'], errors='coerce')
+    performance_data = performance_data.dropna(subset=['Date'])
+    performance_data['Month'] = performance_data['Date'].dt.month # Keep numeric month
+    performance_data['Year'] = performance_data['Date'].dt.year
+    return performance_data
+
+
+def dataset_sources(transaction_partitions=None):
+    """Every file the dataset is built from"""
+    if transaction_partitions is None:
+        transaction_partitions = partition_files()
+    # A month-partitioned Parquet store, when present, replaces the CSV as the transaction source
+    return (transaction_partitions or [TRANSACTION_FILE]) + [PERFORMANCE_FILE]
+
+
+def load_dataset():
+    """
+    The frozen data dict for the current source files, plus (level, text) messages for the
+    UI: the snapshot if it is current, else the appended tail merged into it, else a full
+    streaming build - stored as the new snapshot and served memory-mapped. Raises
+    FileNotFoundError if there is no transaction source at all.
+    """
+    transaction_partitions = partition_files()
+    source_files = dataset_sources(transaction_partitions)
+
+    # --- Reuse the columnar snapshot if no source file changed since it was built ---
+    snapshot = read_snapshot(source_files)
+    if snapshot is not None:
+        return freeze_data(snapshot), []
+
+    # --- One builder at a time: the others wait, then attach to its snapshot ---
+    with snapshot_lock():
+        snapshot = read_snapshot(source_files)
+        if snapshot is not None:
+            return freeze_data(snapshot), []
+        return _build_dataset(transaction_partitions)
+
+
+def _build_dataset(transaction_partitions):
+    # The build behind load_dataset() - run under snapshot_lock(), as it replaces the stored snapshot
+    transaction_file = TRANSACTION_FILE
+    messages = []
+
+    # --- Incremental path: the settlement feed only appends rows, so parse just the new tail ---
+    manifest = read_manifest()
+    tail = read_transaction_tail(transaction_file, manifest) if not transaction_partitions else None
+    data = read_snapshot_frames(manifest) if tail is not None else None
+
+    if data is not None:
+        new_rows, transaction_signature, transaction_rows = tail
+        transaction_signatures = {transaction_file: transaction_signature}
+        data = append_transactions(data, new_rows)
+    elif transaction_partitions:
+        # --- Partitioned store: one chunk per month file, through the same streaming build ---
+        transaction_signatures = source_signatures(transaction_partitions)
+        data, transaction_rows = stream_derive_data(iter_partition_chunks(transaction_partitions))
+    else:
+        # --- Load Real Transaction Data ---
+        # The signature is taken before parsing and only the bytes it covers are parsed,
+        # so rows appended meanwhile are picked up by the next incremental load
+        transaction_signature = source_signature(transaction_file)
+        if transaction_signature is None:
+            raise FileNotFoundError(transaction_file)
+        transaction_signatures = {transaction_file: transaction_signature}
+        # Streamed in chunks of the dashboard's columns, each cleaned/compacted as it is read
+        chunks = iter_transaction_chunks(transaction_file, transaction_signature['size'])
+
+        # --- Basic Data Cleaning & Preparation, then derive accounts, reps, targets and territories ---
+        data, transaction_rows = stream_derive_data(chunks)
+
+    # --- Load Performance Data (Keep as is for now) ---
+    performance_signature = source_signature(PERFORMANCE_FILE)
+    try:
+        data['performance_data'] = load_performance_data()
+    except FileNotFoundError:
+        messages.append(('warning', "performance_data.csv not found. Activity charts will not be available."))
+        data['performance_data'] = pd.DataFrame() # Empty DataFrame
+    except Exception as e:
+        messages.append(('error', f"Error loading performance_data.csv: {e}"))
+        data['performance_data'] = pd.DataFrame()
+
+    # --- Store the derived data so the next start skips parsing ---
+    try:
+        manifest = write_snapshot(
+            data,
+            {**transaction_signatures, PERFORMANCE_FILE: performance_signature},
+            transaction_rows
+        )
+        # Serve the memory-mapped snapshot rather than the private copy just built, so this process
+        # shares its pages with every other server process attached to it
+        attached = read_snapshot_frames(manifest)
+        if attached is not None:
+            data = attached
+    except Exception as e:
+        # A missing snapshot only costs startup time, so keep serving the data
+        messages.append(('warning', f"Could not write data snapshot: {e}"))
+
+    return freeze_data(data), messages
+
+
+def load_users(path=USERS_FILE):
+    """Parsed users.yaml (the login accounts) - empty if the file does not exist"""
+    try:
+        with open(path) as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return {}
+
+
+def _stamp(path):
+    # Cheap change marker of a file - a changed stamp triggers a load, which then checks content hashes
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def data_source_stamps():
+    """Stamps of every file the dataset is built from"""
+    return {path: _stamp(path) for path in dataset_sources()}
+
+
+def default_window(data, today=None):
+    """(start, end) the dashboard opens with: the first transaction day through today"""
+    start = data['transactions']['TRAN_DT'].min().normalize()
+    return start, pd.Timestamp(today if today is not None else 'today').normalize()
+
+
+def warm_up(data):
+    """
+    Fill this process's city cache with the default window's per-city aggregates - all
+    reps' and each rep's (as many as the cache holds) - so no first visitor pays for the
+    groupbys. That cache is the only per-window result kept across reruns: totals and
+    daily series are cube lookups, the rest is per rerun. Returns the number of reps warmed.
+    """
+    start_date, end_date = default_window(data)
+    city_aggregate(data, start_date, end_date) # Every dashboard's all-reps maps
+    # Warming more reps than the cache holds would only evict the first ones again
+    rep_ids = data['rep_offsets'].index[:CITY_CACHE_SIZE - 1]
+    for rep_id in rep_ids:
+        city_aggregate(data, start_date, end_date, rep_id)
+    return len(rep_ids)
+
+
+def register_server(snapshot_dir=SNAPSHOT_DIR):
+    """
+    Register this process with the readiness probe: a marker in SERVERS_DIR saying it serves
+    nothing warm yet, next to a lock file it holds (flock) for as long as it runs, so the probe
+    can tell a process that is gone from one still warming up. Returns (marker path, open lock
+    file), or None if the directory is not writable.
+    """
+    folder = os.path.join(snapshot_dir, SERVERS_DIR)
+    token = uuid.uuid4().hex
+    try:
+        os.makedirs(folder, exist_ok=True)
+        lock = open(os.path.join(folder, token + '.lock'), 'w')
+    except OSError:
+        return None
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+    marker = os.path.join(folder, token + '.json')
+    _write_json(marker, {'pid': os.getpid(), 'version': None, 'dataset_id': None, 'warmed_at': None})
+    return marker, lock
+
+
+def mark_server_ready(marker, dataset):
+    """Record in the process's marker that it now serves `dataset` (a Dataset), warmed"""
+    _write_json(marker, {'pid': os.getpid(), 'version': dataset.version, 'dataset_id': dataset_id(dataset.data),
+                         'warmed_at': time.time()})
+
+
+def unregister_server(registration):
+    """Remove a marker made by register_server and release its lock"""
+    marker, lock = registration
+    for path in (marker, lock.name):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    lock.close()
+
+
+def _server_running(lock_path):
+    # A running server holds its lock; if it can be taken, the process is gone
+    if fcntl is None:
+        return True # No way to tell without flock - count the marker's process as running
+    try:
+        with open(lock_path, 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+    except FileNotFoundError:
+        pass
+    return False
+
+
+def is_ready(snapshot_dir=SNAPSHOT_DIR):
+    """
+    True once at least one server process (DataWatcher) runs on this snapshot directory and
+    every one of them serves a version it has warmed - the deploy's health check. Markers of
+    processes that are gone are removed.
+    """
+    folder = os.path.join(snapshot_dir, SERVERS_DIR)
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return False
+    running = 0
+    for name in names:
+        if not name.endswith('.lock'):
+            continue
+        lock_path = os.path.join(folder, name)
+        marker = lock_path[:-len('.lock')] + '.json'
+        if not _server_running(lock_path):
+            for path in (marker, lock_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            continue
+        try:
+            with open(marker) as f:
+                warmed = json.load(f).get('warmed_at') is not None
+        except (FileNotFoundError, ValueError):
+            warmed = False # Registering - its marker is not written yet
+        if not warmed:
+            return False
+        running += 1
+    return running > 0
+
+
+# One version of the dataset: the frozen data dict and the messages its load produced
+Dataset = namedtuple('Dataset', ['version', 'data', 'messages'])
+
+
+class DataWatcher:
+    """
+    Process-wide holder of the current Dataset and users. A daemon thread checks the source
+    files every `interval` seconds and, when one changed, loads the next version off the
+    request path (load_dataset: snapshot, appended tail or full rebuild) and swaps it in
+    with a single reference assignment. Readers take `current` once per rerun, so a rerun
+    in flight finishes on the version it started with. A failed load keeps the old version
+    and is retried, with a doubling wait while the sources stay unchanged.
+
+    `warm` is called with each new data dict before it is swapped in (warm_up by default).
+    Once started, the process is registered with the readiness probe (is_ready), and its
+    marker is updated after every warm-up and swap.
+    """
+
+    def __init__(self, interval=WATCH_INTERVAL, warm=warm_up):
+        self.interval = interval
+        self.warm = warm
+        self._registration = None
+        self._dataset = None
+        self._error = None
+        self._data_stamps = None # Stamps the current version was loaded from
+        self._failed_stamps = None # Stamps of the last failed load, retried at _retry_at
+        self._failures = 0
+        self._retry_at = 0.0
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._users_stamp = _stamp(USERS_FILE)
+        self.users = load_users()
+        self._thread = threading.Thread(target=self._run, name='sky-data-watcher', daemon=True)
+
+    def start(self):
+        """Start watching; the first version is loaded straight away in the background"""
+        self._registration = register_server()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._registration is not None:
+            unregister_server(self._registration)
+            self._registration = None
+
+    @property
+    def current(self):
+        """The current Dataset - waits for the first load; raises its error if there never was a good one"""
+        self._ready.wait()
+        if self._dataset is None:
+            raise self._error
+        return self._dataset
+
+    def _run(self):
+        while True:
+            self.refresh()
+            if self._stop.wait(self.interval):
+                return
+
+    def refresh(self):
+        """Load a new version if a source file changed since the current one (called by the watcher thread)"""
+        stamps = data_source_stamps()
+        # A failed load is retried once its wait is over, or straight away if a source changed since
+        if stamps != self._data_stamps and (stamps != self._failed_stamps or time.monotonic() >= self._retry_at):
+            try:
+                data, messages = load_dataset()
+                # Warm the caches before the swap, so the new version is served warm
+                self.warm(data)
+                version = self._dataset.version + 1 if self._dataset is not None else 1
+                self._dataset = Dataset(version, data, messages) # The swap - one reference assignment
+                self._error = None
+                # Stamps taken before the load, so a change made during the load triggers another one
+                self._data_stamps = stamps
+                self._failed_stamps = None
+                self._failures = 0
+                if self._registration is not None:
+                    # Served warm from here on - tell the readiness probe
+                    mark_server_ready(self._registration[0], self._dataset)
+            except Exception as e:
+                self._error = e
+                self._failed_stamps = stamps
+                self._failures += 1
+                delay = min(self.interval * 2 ** (self._failures - 1), WATCH_RETRY_MAX)
+                self._retry_at = time.monotonic() + delay
+                logger.exception('Loading the dashboard dataset failed; still serving version %s, retrying in %.0fs',
+                                 self._dataset.version if self._dataset is not None else None, delay)
+            self._ready.set()
+
+        users_stamp = _stamp(USERS_FILE)
+        if users_stamp != self._users_stamp:
+            self._users_stamp = users_stamp
+            try:
+                self.users = load_users()
+            except Exception:
+                logger.exception('Reloading %s failed; keeping the previous users', USERS_FILE)
@@ -0,0 +1,374 @@
+"""
+Plotly figures of the Sky Systemz dashboard, built as plain dicts.
+
+go.Figure / add_trace / update_layout run Plotly's validators on every property of every
+call, on every rerun. The builders here write the Plotly JSON directly instead - numeric
+columns as base64 typed arrays, the constant parts from module-level layout fragments and
+skeletons - and wrap it in an unvalidated go.Figure, which st.plotly_chart serializes
+as-is. Everything here is validated once (the fragments by hand, the map skeletons by
+Plotly when first built), so only the per-rerun data is new.
+"""
+import base64
+import copy
+
+import numpy as np
+import plotly.colors
+import plotly.graph_objects as go
+
+
+# --- Plain-dict plumbing ---
+
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+
+def typed_array(values):
+    """Numeric values as a Plotly typed array ({'dtype', 'bdata'}), the form the validators emit"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iub':
+        # plotly.js has no 64-bit integers: int32 when the values fit, float64 otherwise
+        fits = values.size == 0 or (values.min() >= INT32_MIN and values.max() <= INT32_MAX)
+        values = values.astype('<i4' if fits else '<f8')
+    elif values.dtype != np.float32:
+        values = values.astype('<f8')
+    return {'dtype': f'{values.dtype.kind}{values.dtype.itemsize}', 'bdata': base64.b64encode(np.ascontiguousarray(values).tobytes()).decode('ascii')}
+
+
+def figure(data, layout):
+    """Wrap plain trace and layout dicts in a go.Figure without running Plotly's validators"""
+    return go.Figure({'data': list(data), 'layout': layout}, _validate=False)
+
+
+TITLE_FONT = {'family': 'Roboto, sans-serif', 'size': 18, 'color': '#1e293b'}
+BODY_FONT = {'family': 'Roboto, sans-serif', 'color': '#334155'}
+
+
+def title(text, font=TITLE_FONT):
+    """Centered chart title"""
+    return {'text': text, 'font': dict(font), 'y': 0.95, 'x': 0.5, 'xanchor': 'center', 'yanchor': 'top'}
+
+
+# Constant layout parts of each chart; a builder deep-copies its fragment and fills in the rest
+LAYOUTS = {
+    'time_series': {
+        'margin': {'l': 0, 'r': 0, 't': 40, 'b': 0},
+        'height': 350,
+        'plot_bgcolor': 'rgba(0,0,0,0)',
+        'paper_bgcolor': 'rgba(0,0,0,0)',
+        'yaxis': {'gridcolor': 'rgba(0,0,0,0.05)', 'zerolinecolor': 'rgba(0,0,0,0.1)', 'title': {'font': {'color': '#64748b'}}},
+        'xaxis': {'gridcolor': 'rgba(0,0,0,0.05)', 'zerolinecolor': 'rgba(0,0,0,0.1)', 'title': {'text': 'Date', 'font': {'color': '#64748b'}}},
+        'hovermode': 'x unified',
+        'font': BODY_FONT,
+    },
+    'top_reps': {
+        'title': title('Top Representatives by Processing Amount'),
+        'margin': {'l': 0, 'r': 0, 't': 40, 'b': 0},
+        'height': 350,
+        'plot_bgcolor': 'rgba(0,0,0,0)',
+        'paper_bgcolor': 'rgba(0,0,0,0)',
+        'yaxis': {'gridcolor': 'rgba(0,0,0,0.05)'},
+        'xaxis': {'title': {'text': 'Processing Amount ($)'}, 'gridcolor': 'rgba(0,0,0,0.05)', 'separatethousands': True, 'tickprefix': '$'},
+        'showlegend': False,
+        'font': BODY_FONT,
+    },
+    'top_accounts': {
+        'title': title('Top 10 Accounts by Processing Amount', font={'size': 18, 'color': '#1e293b'}),
+        'yaxis': {'title': {'text': 'Processing Amount ($)'}, 'tickprefix': '$', 'separatethousands': True, 'gridcolor': 'rgba(0,0,0,0.05)'},
+        'xaxis': {'title': {'text': 'Account Name'}, 'tickangle': -45, 'gridcolor': 'rgba(0,0,0,0.05)'},
+        'height': 500,
+        'margin': {'l': 50, 'r': 20, 't': 80, 'b': 120},
+        'plot_bgcolor': 'white',
+        'bargap': 0.2,
+    },
+    'activity': {
+        'barmode': 'group',
+        'xaxis': {'title': {'text': 'Month'}},
+        'yaxis': {'title': {'text': 'Count'}},
+        'height': 400,
+        'showlegend': True,
+        'legend': {'orientation': 'h', 'yanchor': 'bottom', 'y': 1.02, 'xanchor': 'right', 'x': 1, 'font': {'size': 10}},
+        'margin': {'l': 40, 'r': 20, 't': 60, 'b': 40},
+    },
+}
+
+
+def layout(name, **props):
+    """A fresh copy of the named layout fragment with props set on top"""
+    fig_layout = copy.deepcopy(LAYOUTS[name])
+    fig_layout.update(props)
+    return fig_layout
+
+
+def empty_figure(text):
+    """Figure with only a title (charts with nothing to show)"""
+    return figure([], {'title': {'text': text}})
+
+
+# --- Line downsampling ---
+
+# A line chart sends at most this many points - about the pixel width of a full-width chart -
+# longer series are downsampled with LTTB (no visible detail is lost at that density)
+POINT_BUDGET = 1000
+# Lines with more points than this are drawn with WebGL (scattergl) instead of SVG
+WEBGL_THRESHOLD = 500
+
+
+def lttb(x, y, n_out):
+    """
+    Positions of the n_out points Largest-Triangle-Three-Buckets keeps of the series (x, y):
+    the first and last point, plus per bucket the point spanning the largest triangle with
+    the point kept before it and the mean of the next bucket. All positions if the series
+    is not longer than n_out.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n_out - 2 buckets over the inner points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    kept = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # The last bucket looks ahead at the final point
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[stop:next_stop].mean(), y[stop:next_stop].mean()
+        areas = np.abs((x[kept] - next_x) * (y[start:stop] - y[kept]) - (x[kept] - x[start:stop]) * (next_y - y[kept]))
+        kept = start + int(np.argmax(areas))
+        keep[i + 1] = kept
+    return keep
+
+
+# --- Charts ---
+
+def time_series_figure(dates, values, text, yaxis_title):
+    """
+    Filled line of a daily/weekly/monthly series (processing amount or transaction volume
+    over time) - downsampled to POINT_BUDGET points, and drawn with WebGL when long.
+    """
+    dates = np.asarray(dates)
+    values = np.asarray(values)
+    if len(values) > POINT_BUDGET:
+        keep = lttb(dates.astype('datetime64[ns]').astype(np.int64), values, POINT_BUDGET)
+        dates, values = dates[keep], values[keep]
+    trace = {
+        'type': 'scattergl' if len(values) > WEBGL_THRESHOLD else 'scatter',
+        'x': dates,
+        'y': typed_array(values),
+        'mode': 'lines',
+        'fill': 'tozeroy',
+        'line': {'color': '#2196F3', 'width': 2},
+        'fillcolor': 'rgba(33, 150, 243, 0.2)',
+    }
+    fig_layout = layout('time_series', title=title(text))
+    fig_layout['yaxis']['title']['text'] = yaxis_title
+    return figure([trace], fig_layout)
+
+
+def top_reps_figure(rep_names, amounts):
+    """Horizontal bars of the top reps' processing amounts"""
+    trace = {
+        'type': 'bar',
+        'y': list(rep_names),
+        'x': typed_array(amounts),
+        'name': 'Sum of ProcessingAmount', # Keep name for clarity if legend were shown
+        'orientation': 'h',
+        'marker': {'color': 'rgba(79, 70, 229, 0.9)'},
+        'hovertemplate': '%{y}: $%{x:,.2f}<extra></extra>',
+    }
+    return figure([trace], layout('top_reps'))
+
+
+def top_accounts_figure(account_names, amounts, text, hovertext):
+    """Bars of the top accounts' processing amounts, one palette color each"""
+    trace = {
+        'type': 'bar',
+        'x': list(account_names),
+        'y': typed_array(amounts),
+        'text': list(text),
+        'textposition': 'auto',
+        'textfont': {'size': 10},
+        'marker': {'color': plotly.colors.qualitative.Vivid[:len(text)]},
+        'hoverinfo': 'text',
+        'hovertext': list(hovertext),
+    }
+    return figure([trace], layout('top_accounts'))
+
+
+def activity_figure(labels, series):
+    """Grouped bars of monthly activity counts; series is a list of (display name, counts)"""
+    labels = list(labels)
+    data = []
+    for display_name, counts in series:
+        counts = np.asarray(counts)
+        data.append({
+            'type': 'bar',
+            'name': display_name,
+            'x': labels,
+            'y': typed_array(counts),
+            'text': typed_array(counts),
+            'textposition': 'outside',
+            'hovertext': [f"{display_name}: {val}" for val in counts],
+            'hoverinfo': 'text',
+        })
+    return figure(data, layout('activity'))
+
+
+# Segments of the bonus attainment scale: (top label, bottom label, start %, end %, color)
+BONUS_SEGMENTS = [
+    ("", "<30%", 0, 30, "#ef4444"),    # Red
+    ("40%", "15%", 30, 40, "#ff8000"),  # Dark Orange
+    ("50%", "20%", 40, 50, "#ffbf00"),  # Amber
+    ("60%", "25%", 50, 60, "#ffff00"),  # Yellow
+    ("70%", "30%", 60, 70, "#E3F2FD"),  # Lightest Blue
+    ("80%", "35%", 70, 80, "#BBDEFB"),  # Light Blue
+    ("90%", "40%", 80, 90, "#90CAF9"),  # Blue 100
+    ("100%", "45%", 90, 100, "#64B5F6"), # Blue 200
+    ("110%", "50%", 100, 110, "#42A5F5"), # Blue 300
+    ("120%", "55%", 110, 120, "#2196F3"), # Blue 400
+    ("130%", "60%", 120, 130, "#1E88E5"), # Blue 500
+    ("140%", "65%", 130, 140, "#1976D2"), # Blue 600
+    ("150%", "70%", 140, 150, "#1565C0"), # Blue 700
+    ("160%", "75%", 150, 160, "#0D47A1"), # Blue 800
+    ("170%", "80%", 160, 170, "#0277BD"), # Light Blue 800
+    ("180%", "85%", 170, 180, "#01579B"), # Light Blue 900
+    ("190%", "90%", 180, 190, "#006064"), # Cyan 900
+    ("200%", "95%", 190, 200, "#004D40")  # Teal 900
+]
+
+# The scale itself is the same for every rep - only the position marker moves
+BONUS_SCALE = {
+    'data': [
+        {
+            'type': 'bar',
+            'x': [end - start],
+            'y': [0],
+            'orientation': 'h',
+            'marker': {'color': color, 'line': {'width': 1, 'color': 'white'}},
+            'showlegend': False,
+            'hoverinfo': 'none',
+            'base': start,
+            'text': bottom_label,
+            'textposition': 'inside',
+            'insidetextanchor': 'middle',
+            'textfont': {'color': 'black', 'size': 10},
+        }
+        for _, bottom_label, start, end, color in BONUS_SEGMENTS
+    ],
+    'layout': {
+        'annotations': [
+            # Top row percentage labels
+            *({'x': (start + end) / 2, 'y': 0.6, 'text': top_label, 'showarrow': False, 'font': {'size': 10}}
+              for top_label, _, start, end, _ in BONUS_SEGMENTS),
+            # 100% label in the divider and CAP text at the end
+            {'x': 100, 'y': 0, 'text': '100%', 'showarrow': False, 'font': {'size': 10, 'color': 'white', 'family': 'Arial'}},
+            {'x': 198, 'y': 0, 'text': 'CAP', 'showarrow': False, 'font': {'size': 10, 'color': 'red', 'family': 'Arial'}},
+        ],
+        # Divider at 100%
+        'shapes': [{'type': 'line', 'x0': 100, 'y0': -0.3, 'x1': 100, 'y1': 0.3, 'line': {'color': 'black', 'width': 2}}],
+        'title': title('Sales Bonus % Attainment', font={'size': 14}),
+        'height': 110,
+        'margin': {'l': 20, 'r': 20, 't': 40, 'b': 10},
+        'xaxis': {'range': [0, 200], 'showgrid': False, 'zeroline': False, 'showticklabels': False},
+        'yaxis': {'range': [-0.5, 0.8], 'showgrid': False, 'zeroline': False, 'showticklabels': False},
+        'plot_bgcolor': 'rgba(0,0,0,0)',
+        'paper_bgcolor': 'rgba(0,0,0,0)',
+        'barmode': 'stack',
+        'hovermode': False,
+    },
+}
+
+
+def bonus_scale_figure(completion_percentage):
+    """The color-coded bonus attainment scale with a marker at the rep's completion percentage"""
+    fig = copy.deepcopy(BONUS_SCALE)
+    # Triangle marker pointing down to show position
+    fig['data'].append({
+        'type': 'scatter',
+        'x': [min(200, max(0, completion_percentage))],
+        'y': [0.3],
+        'mode': 'markers+text',
+        'marker': {'symbol': 'triangle-down', 'size': 15, 'color': 'black'},
+        'text': [f"{completion_percentage:.1f}%"],
+        'textposition': 'top center',
+        'textfont': {'color': 'black', 'size': 12},
+        'showlegend': False,
+    })
+    return figure(fig['data'], fig['layout'])
+
+
+# --- US territory map skeletons ---
+# The 50-state base map and geo layout never change, so each map variant is built (and validated by
+# Plotly) once per process and kept as a plain dict; a map call clones it and adds only its data trace
+US_STATES = ['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA',
+             'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD',
+             'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ',
+             'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC',
+             'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY']
+
+MAP_GEO = dict(scope='usa', projection_type='albers usa', showland=True, landcolor='rgb(250, 250, 250)', countrycolor='rgb(204, 204, 204)', bgcolor='rgba(0,0,0,0)')
+MAP_GEO_DETAILED = dict(MAP_GEO, showlakes=True, lakecolor='rgb(255, 255, 255)', showsubunits=True, subunitcolor='rgb(230, 230, 230)')
+
+# Map variant -> (title, geo layout); the *_empty variants are shown when the period has no transactions
+MAP_SKELETONS = {
+    'territory': ('Territory Performance (Selected Period)', dict(MAP_GEO_DETAILED, center=dict(lat=39.5, lon=-98.5), projection_scale=7.0)),
+    'territory_empty': ('Territory Performance (Selected Period)', MAP_GEO),
+    'processing': ('Processing Amount by Location (Selected Period)', MAP_GEO_DETAILED),
+    'processing_empty': ('Processing Amount by Location', MAP_GEO),
+    'profit': ('Estimated Profit by Location', MAP_GEO_DETAILED),
+    'profit_empty': ('Estimated Profit by Location', MAP_GEO),
+}
+
+_map_skeletons = {}
+
+
+def map_skeleton(name):
+    """The named map variant as a plain figure dict - built once per process, treat it as read-only"""
+    skeleton = _map_skeletons.get(name)
+    if skeleton is None:
+        text, geo = MAP_SKELETONS[name]
+        fig = go.Figure(go.Choropleth(
+            locationmode='USA-states',
+            locations=US_STATES,
+            z=[0]*50,
+            colorscale=[[0, 'rgba(240, 240, 240, 0.8)'], [1, 'rgba(240, 240, 240, 0.8)']],
+            showscale=False,
+            marker_line_color='white',
+            marker_line_width=0.5
+        ))
+        fig.update_layout(
+            title=title(text),
+            showlegend=False,
+            geo=geo,
+            margin=dict(l=0, r=0, t=40, b=0), height=450, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)'
+        )
+        skeleton = _map_skeletons[name] = fig.to_dict()
+    return skeleton
+
+
+def map_figure(name, *traces):
+    """A clone of the named map skeleton with the given plain-dict traces drawn over the base map"""
+    fig = copy.deepcopy(map_skeleton(name))
+    return figure(fig['data'] + list(traces), fig['layout'])
+
+
+def bubble_trace(cities, sizes, text, name, line_color):
+    """Scattergeo trace (plain dict) of the per-city bubbles of a territory map"""
+    return {
+        'type': 'scattergeo',
+        'locationmode': 'USA-states',
+        'lon': typed_array(cities['longitude']),
+        'lat': typed_array(cities['latitude']),
+        'text': list(text),
+        'mode': 'markers',
+        'marker': {
+            'size': typed_array(sizes),
+            'color': '#818cf8',
+            'opacity': 0.7,
+            'line': {'width': 1, 'color': line_color}
+        },
+        'name': name,
+        'hoverinfo': 'text'
+    }
@@ -0,0 +1,50 @@
+"""
+Preload entry point for the Sky Systemz dashboard - runs without Streamlit.
+
+    python sky_preload.py            # build/refresh the snapshot (transactions, rep index, daily cube)
+    python sky_preload.py --check    # readiness probe: exit 0 only once every server process has warmed up
+
+Run it as a deploy step before the servers start: they then attach to the stored
+snapshot instead of parsing the transactions on the first visit. Each server process
+still warms its own caches and prebuilds each rep's default dashboard figures before it
+serves a version, and records that in its marker under .data_cache/servers. --check
+passes once at least one server process is running and every running one has warmed,
+so the first request a health-checked server gets is served warm.
+"""
+import argparse
+import logging
+import sys
+import time
+
+import sky_data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preload and warm up the Sky Systemz dashboard data.")
+    parser.add_argument('--check', action='store_true',
+                        help="only report whether every running server process has warmed up (exit status 0 = ready)")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        ready = sky_data.is_ready()
+        print('ready' if ready else 'not ready')
+        return 0 if ready else 1
+
+    started = time.perf_counter()
+    try:
+        data, messages = sky_data.load_dataset()
+    except FileNotFoundError as e:
+        print(f"Transaction data not found: {e}", file=sys.stderr)
+        return 1
+    for level, message in messages:
+        print(f"{level}: {message}", file=sys.stderr)
+
+    # Only the snapshot outlives this process - the caches and figures are warmed by each server process
+    print(f"Preloaded {len(data['transactions']):,} transactions of {len(data['rep_offsets'])} reps "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -14,8 +14,9 @@ import folium
 from streamlit_folium import folium_static
 import streamlit.components.v1 as components
 import random
-import yaml
 
+import sky_data
+import sky_figures
 
 
 # Set page configuration
@@ -706,128 +707,45 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Function to load data
-@st.cache_data
+# One DataWatcher per server process: it loads the dataset in the background and swaps in a new version
+# whenever transaction_table.csv, performance_data.csv or users.yaml change, so no request waits on ingestion
+@st.cache_resource
+def data_watcher():
+    return sky_data.DataWatcher(warm=warm_up_dashboard).start()
+
+# Each rep's default-window Rep Dashboard figures, keyed (dataset id, rep, start, end, chart) - built by the
+# watcher before it serves a version and shared by every session opening that view (read-only:
+# st.plotly_chart serializes a copy)
+prebuilt_figures = {}
+
+def warm_up_dashboard(data):
+    """The watcher's warm-up: sky_data.warm_up, then prebuild every rep's default dashboard figures"""
+    global prebuilt_figures
+    sky_data.warm_up(data)
+    start_date, end_date = sky_data.default_window(data)
+    figures = {}
+    for rep_id in data['sales_reps']['RepID']:
+        ctx = sky_data.FilterContext(data, start_date, end_date, rep_id)
+        key = (sky_data.dataset_id(data), rep_id, ctx.start_date, ctx.end_date)
+        figures[key + ('map',)] = create_map_visualization(ctx)
+        figures[key + (('time_series', 'Day'),)] = create_time_series_chart(ctx, 'Day')
+        if not ctx.rep_activity.empty: # Reps without activity get a message, not a chart
+            for chart_type in ("discovery", "demo"):
+                chart = create_activity_performance_chart(ctx, chart_type=chart_type)
+                if chart is not None:
+                    figures[key + (('activity', chart_type),)] = chart
+    prebuilt_figures = figures # Swapped in whole, like the dataset
+
+def prebuilt_figure(ctx, chart, build):
+    """The chart's figure for the context: prebuilt when it is its rep's default window, else build()"""
+    figure = prebuilt_figures.get((sky_data.dataset_id(ctx.data), ctx.rep_id, ctx.start_date, ctx.end_date, chart))
+    return figure if figure is not None else build()
+
 def load_data():
+    """The current dataset version, shared by every session (frozen - build new frames rather than editing it)"""
+    transaction_file = sky_data.TRANSACTION_FILE
     try:
-        # --- Load Real Transaction Data ---
-        transaction_file = 'transaction_table.csv' # Assuming your file name
-        transactions_df = pd.read_csv(transaction_file)
-        #st.success(f"Loaded real transaction data from {transaction_file}")
-
-        # --- Basic Data Cleaning & Preparation ---
-        # Rename columns for consistency or use new names directly in functions
-        # For clarity, let's rename to match the old structure where needed,
-        # but ideally, update functions to use original names.
-        # Here, we'll update functions instead.
-
-        # Convert Date column
-        transactions_df['TRAN_DT'] = pd.to_datetime(transactions_df['TRAN_DT'], errors='coerce')
-        transactions_df = transactions_df.dropna(subset=['TRAN_DT', 'LCTN_ID', 'REP NAME', 'TRAN_AM']) # Drop essential missing data
-
-        # Add Time Features
-        transactions_df['Month'] = transactions_df['TRAN_DT'].dt.month_name()
-        transactions_df['Quarter'] = 'Q' + transactions_df['TRAN_DT'].dt.quarter.astype(str)
-        transactions_df['Year'] = transactions_df['TRAN_DT'].dt.year
-        
-        # Add TransactionVolume (assuming each row is one transaction)
-        transactions_df['TransactionVolume'] = 1
-
-        # --- Derive Accounts Data from Transactions ---
-        # Get unique locations/accounts
-        accounts_df = transactions_df[[
-            'LCTN_ID', 'CHILD_LCTN_DBA_NM', 'REP NAME', 'CITY_NM', 'latitude', 'longitude', 'preprocessed_address' # Use 'preprocessed_address'
-        ]].drop_duplicates(subset=['LCTN_ID']).copy()
-        
-        # Rename for compatibility with existing functions (will update functions later)
-        accounts_df = accounts_df.rename(columns={
-            'LCTN_ID': 'AccountID',
-            'CHILD_LCTN_DBA_NM': 'AccountName',
-            'REP NAME': 'RepID', # Using Rep Name as RepID here
-            'CITY_NM': 'CityName',
-            'preprocessed_address': 'full_address' # Map preprocessed to full_address
-            # latitude, longitude names are kept
-        })
-        # Fill any NaNs introduced if CHILD_LCTN_DBA_NM was sometimes missing
-        accounts_df['AccountName'] = accounts_df['AccountName'].fillna('Unknown Account')
-        accounts_df['full_address'] = accounts_df['full_address'].fillna('Address Unavailable')
-
-        # --- Derive Sales Reps Data from Transactions ---
-        sales_reps_df = transactions_df[['REP NAME']].drop_duplicates().copy()
-        sales_reps_df = sales_reps_df.rename(columns={'REP NAME': 'RepID'})
-        # Assuming RepName is the same as RepID (the name string)
-        sales_reps_df['RepName'] = sales_reps_df['RepID']
-
-        # --- Create Data Dictionary ---
-        data = {'sales_reps': sales_reps_df, 'accounts': accounts_df, 'transactions': transactions_df}
-
-        # --- Assigned Accounts (Maps accounts to their designated rep) ---
-        # This is implicitly defined in accounts_df already
-        data['assigned_accounts'] = data['accounts'][['AccountID', 'RepID']].copy()
-
-        # --- Generate sales_targets (Keep placeholder or load real targets) ---
-        # Using placeholder for now, replace if you have real target data
-        rep_ids = data['sales_reps']['RepID'].tolist()
-        sales_targets_list = []
-        np.random.seed(42)
-        for rep_id in rep_ids:
-            bonus_threshold = np.random.randint(100000, 500000) # Placeholder target
-            eligibility_prob = 0.2 + (hash(rep_id) % 6) / 10.0
-            bonus_eligibility = np.random.choice([True, False], p=[eligibility_prob, 1-eligibility_prob])
-            sales_targets_list.append({
-                'RepID': rep_id, # RepID is the Rep Name string
-                'BonusThreshold': bonus_threshold,
-                'Bonus_Eligibility': bonus_eligibility
-            })
-        data['sales_targets'] = pd.DataFrame(sales_targets_list)
-        
-        # --- Create territory_performance from REAL data ---
-        # Use the original transaction_table columns for aggregation
-        territory_agg = transactions_df.groupby(['CITY_NM']).agg(
-            Total_Processing=('TRAN_AM', 'sum'),
-            Total_Transactions=('TransactionVolume', 'sum'),
-            latitude=('latitude', 'first'), # Take first available lat/lon/address per city
-            longitude=('longitude', 'first'),
-            full_address=('preprocessed_address', 'first') # Use preprocessed address
-        ).reset_index()
-        
-        # Rename CityName to 'city' for map function compatibility
-        territory_agg = territory_agg.rename(columns={'CITY_NM': 'city'})
-        
-        # Ensure required columns exist and handle NAs
-        required_terr_cols = ['city', 'Total_Processing', 'Total_Transactions', 'latitude', 'longitude', 'full_address']
-        for col in required_terr_cols:
-            if col not in territory_agg.columns:
-                 territory_agg[col] = np.nan # Add missing columns if needed
-
-        territory_agg['city'] = territory_agg['city'].astype(str).fillna('Unknown')
-        territory_agg['full_address'] = territory_agg['full_address'].astype(str).fillna('Address Unavailable')
-        territory_agg['latitude'] = pd.to_numeric(territory_agg['latitude'], errors='coerce').fillna(0)
-        territory_agg['longitude'] = pd.to_numeric(territory_agg['longitude'], errors='coerce').fillna(0)
-        territory_agg['Total_Processing'] = pd.to_numeric(territory_agg['Total_Processing'], errors='coerce').fillna(0)
-        territory_agg['Total_Transactions'] = pd.to_numeric(territory_agg['Total_Transactions'], errors='coerce').fillna(0)
-
-        data['territory_performance'] = territory_agg
-
-        # REMOVED: enhance_territory_data call as enhancement is done above
-
-        # --- Load Performance Data (Keep as is for now) ---
-        try:
-            performance_data = pd.read_csv("performance_data.csv").fillna(0)
-            performance_data['Date'] = pd.to_datetime(performance_data['Date'], errors='coerce')
-            performance_data = performance_data.dropna(subset=['Date'])
-            performance_data['Month'] = performance_data['Date'].dt.month # Keep numeric month
-            performance_data['Year'] = performance_data['Date'].dt.year
-            data['performance_data'] = performance_data
-        except FileNotFoundError:
-            st.warning("performance_data.csv not found. Activity charts will not be available.")
-            data['performance_data'] = pd.DataFrame() # Empty DataFrame
-        except Exception as e:
-            st.error(f"Error loading performance_data.csv: {e}")
-            data['performance_data'] = pd.DataFrame()
-
-        
-        return data
-
+        dataset = data_watcher().current
     except FileNotFoundError:
         st.error(f"Error: '{transaction_file}' not found. Please ensure the transaction data file exists.")
         return None
@@ -837,6 +755,10 @@ def load_data():
         st.error(traceback.format_exc())
         return None
 
+    for level, message in dataset.messages:
+        getattr(st, level)(message)
+    return dataset.data
+
 def enhance_territory_data(data):
     # This function might still be useful for future enhancements or checks
     # For now, the core logic is integrated into load_data
@@ -863,24 +785,15 @@ def enhance_territory_data(data):
 
     return data
 
-def calculate_rep_metrics(data, rep_id, start_date, end_date):
-    """Calculate metrics for a specific sales rep"""
-    # Get rep's accounts (AccountID comes from the accounts_df where LCTN_ID was renamed)
-    rep_accounts = data['accounts'][data['accounts']['RepID'] == rep_id]['AccountID'].tolist()
-    
-    # Filter transactions using LCTN_ID and TRAN_DT from the original transactions_df
-    filtered_transactions = data['transactions'][
-        (data['transactions']['LCTN_ID'].isin(rep_accounts)) & # Use LCTN_ID here
-        (data['transactions']['TRAN_DT'] >= start_date) &      # Use TRAN_DT here
-        (data['transactions']['TRAN_DT'] <= end_date)
-    ]
-    
-    # Calculate metrics using TRAN_AM and TransactionVolume
-    total_processed = filtered_transactions['TRAN_AM'].sum() # Use TRAN_AM here
-    total_volume = filtered_transactions['TransactionVolume'].sum() # Use TransactionVolume here
+def calculate_rep_metrics(ctx):
+    """Calculate metrics for the context's sales rep"""
+    data = ctx.data
+    # Sum TRAN_AM and transaction counts over the date range from the rep x day prefix sums (no transaction scan)
+    total_cents, total_volume = ctx.rep_totals
+    total_processed = sky_data.to_dollars(total_cents)
     
     # Get YTD goal from sales_targets (RepID here is the REP NAME string)
-    target_info = data['sales_targets'][data['sales_targets']['RepID'] == rep_id]
+    target_info = data['sales_targets'][data['sales_targets']['RepID'] == ctx.rep_id]
     ytd_goal = target_info['BonusThreshold'].iloc[0] if not target_info.empty else 0
     
     # Calculate completion percentage (as a percentage, not a decimal)
@@ -901,146 +814,49 @@ def calculate_rep_metrics(data, rep_id, start_date, end_date):
         'bonus_eligibility': bonus_eligibility_status # Use the derived status
     }
 
-def create_time_series_chart(data, rep_id, start_date, end_date):
-    # Get rep's accounts (AccountID from accounts_df)
-    rep_accounts = data['accounts'][data['accounts']['RepID'] == rep_id]['AccountID'].tolist()
-    
-    # Filter transactions using LCTN_ID and TRAN_DT
-    rep_transactions = data['transactions'][
-        (data['transactions']['LCTN_ID'].isin(rep_accounts)) &  # Use LCTN_ID instead of AccountID
-        (data['transactions']['TRAN_DT'] >= start_date) &      # Use TRAN_DT instead of TransactionDate
-        (data['transactions']['TRAN_DT'] <= end_date)
-    ]
-    
-    # Group by TRAN_DT and sum TRAN_AM
-    daily_amounts = rep_transactions.groupby('TRAN_DT')['TRAN_AM'].sum().reset_index() # Use TRAN_DT, TRAN_AM
-    
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=daily_amounts['TRAN_DT'], # Use TRAN_DT
-        y=daily_amounts['TRAN_AM'], # Use TRAN_AM
-        mode='lines',
-        fill='tozeroy',
-        line=dict(color='#2196F3', width=2),
-        fillcolor='rgba(33, 150, 243, 0.2)'
-    ))
-    fig.update_layout(
-        title={
-            'text': 'Processing Amount Over Time',
-            'font': {
-                'family': 'Roboto, sans-serif',
-                'size': 18,
-                'color': '#1e293b'
-            },
-            'y': 0.95,
-            'x': 0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'
-        },
-        xaxis_title='Date',
-        yaxis_title='Processing Amount ($)',
-        margin=dict(l=0, r=0, t=40, b=0),
-        height=350,
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        yaxis=dict(
-            gridcolor='rgba(0,0,0,0.05)', 
-            zerolinecolor='rgba(0,0,0,0.1)',
-            title_font={'color': '#64748b'}
-        ),
-        xaxis=dict(
-            gridcolor='rgba(0,0,0,0.05)', 
-            zerolinecolor='rgba(0,0,0,0.1)',
-            title_font={'color': '#64748b'}
-        ),
-        hovermode='x unified',
-        font={'family': 'Roboto, sans-serif', 'color': '#334155'}
-    )
-    return fig
+def calculate_all_rep_metrics(ctx):
+    """Metrics of every sales rep at once - calculate_rep_metrics as one vectorized pass, indexed by RepID"""
+    data = ctx.data
+    rep_ids = pd.Index(data['sales_reps']['RepID'].unique(), name='RepID')
 
-def create_map_visualization(data, rep_id, start_date, end_date):
-    """Create a map visualization showing territory performance for a specific rep and date range"""
-    # Get rep's accounts (AccountID from accounts_df)
-    rep_accounts = data['accounts'][data['accounts']['RepID'] == rep_id]['AccountID'].tolist()
+    # All reps' window totals from the prefix sums, joined to their targets (first target row per rep)
+    rep_metrics = sky_data.range_totals_by_rep(data, ctx.start_date, ctx.end_date).reindex(rep_ids, fill_value=0)
+    rep_metrics.insert(0, 'total_processed', sky_data.to_dollars(rep_metrics.pop('total_processed_cents')))
+    targets = data['sales_targets'].drop_duplicates('RepID').set_index('RepID')['BonusThreshold']
+    rep_metrics['ytd_goal'] = targets.reindex(rep_ids).fillna(0)
 
-    # Filter transactions for the rep AND the date range
-    filtered_transactions = data['transactions'][
-        (data['transactions']['LCTN_ID'].isin(rep_accounts)) &
-        (data['transactions']['TRAN_DT'] >= start_date) &
-        (data['transactions']['TRAN_DT'] <= end_date)
-    ].copy()
+    # Same completion percentage and eligibility rule as calculate_rep_metrics
+    ytd_goal = rep_metrics['ytd_goal'].where(rep_metrics['ytd_goal'] > 0)
+    rep_metrics['completion_percentage'] = (rep_metrics['total_processed'] / ytd_goal * 100).round(2).fillna(0)
+    rep_metrics['bonus_eligibility'] = rep_metrics['completion_percentage'] >= 100
+    return rep_metrics
+
+# Resolutions of the time series charts -> the FilterContext series they plot (read off the daily cube)
+SERIES_RESOLUTIONS = {'Day': 'rep_daily_totals', 'Week': 'rep_weekly_totals', 'Month': 'rep_monthly_totals'}
+
+def create_time_series_chart(ctx, resolution='Day'):
+    # Rep's TRAN_AM per TRAN_DT (day, week or month) in the date range (shared with the volume chart)
+    daily_amounts = getattr(ctx, SERIES_RESOLUTIONS[resolution])
+
+    return sky_figures.time_series_figure(
+        daily_amounts['TRAN_DT'], # Use TRAN_DT
+        sky_data.to_dollars(daily_amounts['TRAN_AM_CENTS']), # Cents -> dollars
+        'Processing Amount Over Time',
+        'Processing Amount ($)'
+    )
 
+def create_map_visualization(ctx):
+    """Create a map visualization showing territory performance for the context's rep and date range"""
     # If no transactions in the period for this rep, return an empty map
-    if filtered_transactions.empty:
+    if ctx.rep_transactions.empty:
         # st.info(f"No transaction data for rep {rep_id} in the selected period.") # Optional info message
-        fig = go.Figure() # Start with base map structure even if empty
-        fig.add_trace(go.Choropleth(
-            locationmode='USA-states',
-            locations=['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA',
-                       'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD',
-                       'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ',
-                       'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC',
-                       'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY'],
-            z=[0]*50,
-            colorscale=[[0, 'rgba(240, 240, 240, 0.8)'], [1, 'rgba(240, 240, 240, 0.8)']],
-            showscale=False,
-            marker_line_color='white',
-            marker_line_width=0.5
-        ))
-        fig.update_layout( # Apply basic layout
-            title={
-                'text': 'Territory Performance (Selected Period)',
-                'font': {'family': 'Roboto, sans-serif', 'size': 18, 'color': '#1e293b'},
-                'y': 0.95, 'x': 0.5, 'xanchor': 'center', 'yanchor': 'top'
-            },
-            showlegend=False,
-            geo=dict(scope='usa', projection_type='albers usa', showland=True, landcolor='rgb(250, 250, 250)', countrycolor='rgb(204, 204, 204)', bgcolor='rgba(0,0,0,0)'),
-            margin=dict(l=0, r=0, t=40, b=0), height=450, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)'
-        )
-        return fig # Return the empty-looking map
-
-    # Aggregate the filtered transactions by City
-    rep_territory = filtered_transactions.groupby('CITY_NM').agg(
-        Total_Processing=('TRAN_AM', 'sum'),
-        Total_Transactions=('TransactionVolume', 'sum'),
-        latitude=('latitude', 'first'),
-        longitude=('longitude', 'first'),
-        full_address=('preprocessed_address', 'first')
-    ).reset_index()
+        return sky_figures.map_figure('territory_empty') # Return the empty-looking map
 
-    # Rename city column for consistency
-    rep_territory = rep_territory.rename(columns={'CITY_NM': 'city'})
-
-    # Ensure required columns exist and handle NAs (similar to load_data logic)
-    required_map_cols = ['city', 'Total_Processing', 'Total_Transactions', 'latitude', 'longitude', 'full_address']
-    for col in required_map_cols:
-        if col not in rep_territory.columns:
-            rep_territory[col] = np.nan
-
-    rep_territory['city'] = rep_territory['city'].astype(str).fillna('Unknown')
-    rep_territory['full_address'] = rep_territory['full_address'].astype(str).fillna('Address Unavailable')
-    rep_territory['latitude'] = pd.to_numeric(rep_territory['latitude'], errors='coerce').fillna(0)
-    rep_territory['longitude'] = pd.to_numeric(rep_territory['longitude'], errors='coerce').fillna(0)
-    rep_territory['Total_Processing'] = pd.to_numeric(rep_territory['Total_Processing'], errors='coerce').fillna(0)
-    rep_territory['Total_Transactions'] = pd.to_numeric(rep_territory['Total_Transactions'], errors='coerce').fillna(0)
-
-    # --- Create Base Map ---
-    fig = go.Figure()
-    fig.add_trace(go.Choropleth(
-        locationmode='USA-states',
-        locations=['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA',
-                   'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD',
-                   'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ',
-                   'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC',
-                   'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY'],
-        z=[0]*50,
-        colorscale=[[0, 'rgba(240, 240, 240, 0.8)'], [1, 'rgba(240, 240, 240, 0.8)']],
-        showscale=False,
-        marker_line_color='white',
-        marker_line_width=0.5
-    ))
+    # The rep's per-city aggregate of the period, already cleaned (cached - the Compensation tab draws this map too)
+    rep_territory = ctx.rep_city_totals
 
     # --- Add Bubbles using dynamically aggregated data ---
+    traces = []
     if not rep_territory.empty:
         # Filter out entries with 0 lat/lon before plotting
         rep_territory_plot = rep_territory[
@@ -1054,77 +870,22 @@ def create_map_visualization(data, rep_id, start_date, end_date):
             # Calculate sizes based on the filtered data
             sizes = min_size + (rep_territory_plot['Total_Processing'] / max_amount) * (max_size - min_size)
 
-            fig.add_trace(go.Scattergeo(
-                locationmode='USA-states',
-                lon=rep_territory_plot['longitude'],
-                lat=rep_territory_plot['latitude'],
-                # Include full address in hover text
-                text=rep_territory_plot.apply(
-                    lambda row: f"<b>{row['city']}</b><br>Total: ${row['Total_Processing']:,.2f}<br>Transactions: {row['Total_Transactions']}<br>Address: {row['full_address']}",
-                    axis=1
-                ),
-                mode='markers',
-                marker=dict(
-                    size=sizes,
-                    color='#818cf8',
-                    opacity=0.7,
-                    line=dict(width=1, color='white')
-                ),
+            traces.append(sky_figures.bubble_trace(
+                rep_territory_plot,
+                sizes,
+                # Hover text with the full address (built and cached with the city aggregate)
+                rep_territory_plot['hover_total'],
                 name='Territory Performance',
-                hoverinfo='text'
+                line_color='white'
             ))
 
-    # Update the geo layout properties
-    fig.update_layout(
-        title={
-            'text': 'Territory Performance (Selected Period)', # Updated title
-            'font': {
-                'family': 'Roboto, sans-serif',
-                'size': 18, # Adjusted size slightly
-                'color': '#1e293b'
-            },
-            'y': 0.95,
-            'x': 0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'
-        },
-        showlegend=False,
-        geo=dict(
-            scope='usa',
-            projection_type='albers usa',
-            showland=True,
-            landcolor='rgb(250, 250, 250)',
-            countrycolor='rgb(204, 204, 204)',
-            showlakes=True,
-            lakecolor='rgb(255, 255, 255)',
-            showsubunits=True,
-            subunitcolor='rgb(230, 230, 230)',
-            center=dict(lat=39.5, lon=-98.5),
-            projection_scale=7.0,
-            bgcolor='rgba(0,0,0,0)' # Added transparent background
-        ),
-        margin=dict(l=0, r=0, t=40, b=0),
-        height=450,
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)'
-    )
-
-    return fig
-
-def create_transaction_table(data, rep_id, start_date, end_date):
-    """Create transaction details table for a specific rep, using Grandparent as Account Name"""
-    # Get rep's accounts - we still need this to filter transactions by rep
-    rep_accounts = data['accounts'][data['accounts']['RepID'] == rep_id]['AccountID'].tolist()
-
-    # Filter transactions using LCTN_ID (to get rep's transactions) and TRAN_DT
-    rep_transactions = data['transactions'][
-        (data['transactions']['LCTN_ID'].isin(rep_accounts)) & # Use LCTN_ID instead of AccountID
-        (data['transactions']['TRAN_DT'] >= start_date) &      # Use TRAN_DT instead of TransactionDate
-        (data['transactions']['TRAN_DT'] <= end_date)
-    ].copy() # Add .copy()
+    # Base map and geo layout come from the prebuilt skeleton
+    return sky_figures.map_figure('territory', *traces)
 
+def create_transaction_table(ctx):
+    """Create transaction details table for the context's rep, using Grandparent as Account Name (amounts stay numeric)"""
     # If no transactions, return empty dataframe
-    if rep_transactions.empty:
+    if ctx.rep_transactions.empty:
         return pd.DataFrame(columns=[
             'AccountID', 'AccountName', 'RepName', 'Year', 'Quarter', 'Month',
             'Sum of ProcessingAmount', 'Count of Transactions'
@@ -1132,34 +893,10 @@ def create_transaction_table(data, rep_id, start_date, end_date):
 
     # REMOVED: Merge with accounts details - we'll get names directly
 
-    # Ensure needed columns exist and fill NA
-    required_cols = ['LCTN_ID', 'GRANDPARENT_CORP_DBA_NM', 'REP NAME', 'Year', 'Quarter', 'Month', 'TRAN_AM', 'TransactionVolume']
-    for col in required_cols:
-         if col not in rep_transactions.columns:
-             # Use appropriate fill for missing columns
-             fill_value = 'N/A' if col == 'GRANDPARENT_CORP_DBA_NM' else ('Unknown Rep' if col == 'REP NAME' else ('Unknown' if col in ['Year', 'Quarter', 'Month'] else 0))
-             rep_transactions[col] = fill_value
-         else:
-             # Fill missing values specifically for these columns
-             if col == 'REP NAME':
-                 rep_transactions[col] = rep_transactions[col].fillna('Unknown Rep')
-             elif col == 'GRANDPARENT_CORP_DBA_NM':
-                 rep_transactions[col] = rep_transactions[col].fillna('N/A')
-             # Keep existing logic for other columns like Year, Quarter, Month if they have it
-             elif col in ['TRAN_AM', 'TransactionVolume']:
-                 rep_transactions[col] = rep_transactions[col].fillna(0)
-             # Add handling for time columns if needed, though they are added earlier
-             elif col in ['Year', 'Quarter', 'Month']:
-                 rep_transactions[col] = rep_transactions[col].fillna('Unknown')
-
-
-    # Group by required fields, using GRANDPARENT name
-    grouped_transactions = rep_transactions.groupby(
-        ['LCTN_ID', 'GRANDPARENT_CORP_DBA_NM', 'REP NAME', 'Year', 'Quarter', 'Month'] # Group by Grandparent
-    ).agg(
-        TRAN_AM=('TRAN_AM', 'sum'),           # Use named agg
-        TransactionVolume=('TransactionVolume', 'sum')
-    ).reset_index()
+    # Rep's totals per account (GRANDPARENT name), Year, Quarter and Month - the context's shared aggregate
+    grouped_transactions = ctx.rep_account_months.copy()
+    grouped_transactions['TRAN_AM'] = sky_data.to_dollars(grouped_transactions.pop('TRAN_AM_CENTS'))
+    grouped_transactions['Quarter'] = 'Q' + grouped_transactions['Quarter'].astype(str)
 
     # Rename for display
     grouped_transactions = grouped_transactions.rename(columns={
@@ -1170,73 +907,22 @@ def create_transaction_table(data, rep_id, start_date, end_date):
         'TransactionVolume': 'Count of Transactions'
     })
 
-    # Format currency
-    grouped_transactions['Sum of ProcessingAmount'] = grouped_transactions['Sum of ProcessingAmount'].apply(
-        lambda x: f"${x:,.2f}"
-    )
+    # Currency is formatted by the table display (TABLE_COLUMN_CONFIG), so the amounts sort as numbers
 
     # Select and order columns
     final_cols = ['AccountID', 'AccountName', 'RepName', 'Year', 'Quarter', 'Month', 'Sum of ProcessingAmount', 'Count of Transactions']
     return grouped_transactions[final_cols]
 
-def create_volume_time_series_chart(data, rep_id, start_date, end_date):
-    # Get rep's accounts
-    rep_accounts = data['accounts'][data['accounts']['RepID'] == rep_id]['AccountID'].tolist()
-    
-    # Filter transactions using LCTN_ID and TRAN_DT
-    rep_transactions = data['transactions'][
-        (data['transactions']['LCTN_ID'].isin(rep_accounts)) &  # Use LCTN_ID instead of AccountID
-        (data['transactions']['TRAN_DT'] >= start_date) &      # Use TRAN_DT instead of TransactionDate
-        (data['transactions']['TRAN_DT'] <= end_date)
-    ]
-    
-    # Group by TRAN_DT and sum TransactionVolume
-    daily_volumes = rep_transactions.groupby('TRAN_DT')['TransactionVolume'].sum().reset_index()
-    
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=daily_volumes['TRAN_DT'],  # Use TRAN_DT instead of TransactionDate
-        y=daily_volumes['TransactionVolume'],
-        mode='lines',
-        fill='tozeroy',
-        line=dict(color='#2196F3', width=2),
-        fillcolor='rgba(33, 150, 243, 0.2)'
-    ))
-    
-    # Rest of the function stays the same
-    fig.update_layout(
-        title={
-            'text': 'Transaction Volume Over Time',
-            'font': {
-                'family': 'Roboto, sans-serif',
-                'size': 18,
-                'color': '#1e293b'
-            },
-            'y': 0.95,
-            'x': 0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'
-        },
-        xaxis_title='Date',
-        yaxis_title='Transaction Volume',
-        margin=dict(l=0, r=0, t=40, b=0),
-        height=350,
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        yaxis=dict(
-            gridcolor='rgba(0,0,0,0.05)', 
-            zerolinecolor='rgba(0,0,0,0.1)',
-            title_font={'color': '#64748b'}
-        ),
-        xaxis=dict(
-            gridcolor='rgba(0,0,0,0.05)', 
-            zerolinecolor='rgba(0,0,0,0.1)',
-            title_font={'color': '#64748b'}
-        ),
-        hovermode='x unified',
-        font={'family': 'Roboto, sans-serif', 'color': '#334155'}
+def create_volume_time_series_chart(ctx, resolution='Day'):
+    # Rep's transaction count per TRAN_DT (day, week or month) in the date range (shared with the amount chart)
+    daily_volumes = getattr(ctx, SERIES_RESOLUTIONS[resolution])
+
+    return sky_figures.time_series_figure(
+        daily_volumes['TRAN_DT'], # Use TRAN_DT instead of TransactionDate
+        daily_volumes['TransactionVolume'],
+        'Transaction Volume Over Time',
+        'Transaction Volume'
     )
-    return fig
 
 def create_compensation_model(data, rep_id):
     """Create an enhanced compensation model display with split tables and visualizations"""
@@ -1538,16 +1224,13 @@ def create_compensation_model(data, rep_id):
     
     return html
 
-def create_revenue_comparison(data, start_date, end_date): # Renamed function
+def create_revenue_comparison(ctx): # Renamed function
     """Create a bar chart comparing revenue for top sales reps within a date range"""
-    # Filter transactions by date first
-    transactions = data['transactions'][
-        (data['transactions']['TRAN_DT'] >= start_date) &
-        (data['transactions']['TRAN_DT'] <= end_date)
-    ].copy()
+    # Transactions of the date range (a view - the merge below builds a new frame)
+    transactions = ctx.transactions
 
     # Get accounts data
-    accounts = data['accounts'].copy() # Should have AccountID (renamed LCTN_ID), RepID (name)
+    accounts = ctx.data['accounts'] # Should have AccountID (renamed LCTN_ID), RepID (name)
 
     # --- Ensure the merge uses correct keys ---
     # Join transactions (left) with accounts (right)
@@ -1564,9 +1247,10 @@ def create_revenue_comparison(data, start_date, end_date): # Renamed function
 
     # Group by RepID (the name string) and calculate sums using TRAN_AM
     rep_performance = transactions_with_rep.groupby('RepID').agg({ # Group by RepID (name)
-        'TRAN_AM': 'sum',           # Use TRAN_AM
+        'TRAN_AM_CENTS': 'sum',           # Use TRAN_AM (integer cents)
         # 'TransactionVolume': 'sum' # Volume not needed for this chart
     }).reset_index()
+    rep_performance['TRAN_AM'] = sky_data.to_dollars(rep_performance.pop('TRAN_AM_CENTS'))
 
     # Rename RepID to RepName for display and TRAN_AM to ProcessingAmount
     rep_performance = rep_performance.rename(columns={'RepID': 'RepName', 'TRAN_AM': 'ProcessingAmount'})
@@ -1576,118 +1260,27 @@ def create_revenue_comparison(data, start_date, end_date): # Renamed function
     # Sort by ProcessingAmount and take top 5
     rep_performance = rep_performance.sort_values('ProcessingAmount', ascending=False).head(5)
 
-    # Create the figure
-    fig = go.Figure()
-
-    # Add ProcessingAmount bars
-    fig.add_trace(go.Bar(
-        y=rep_performance['RepName'],
-        x=rep_performance['ProcessingAmount'],
-        name='Sum of ProcessingAmount', # Keep name for clarity if legend were shown
-        orientation='h',
-        marker=dict(color='rgba(79, 70, 229, 0.9)'), # Use the darker color now
-        hovertemplate='%{y}: $%{x:,.2f}<extra></extra>'
-    ))
+    # Horizontal ProcessingAmount bars (REMOVED: EstimatedProfit bars trace)
+    return sky_figures.top_reps_figure(rep_performance['RepName'], rep_performance['ProcessingAmount'])
 
-    # REMOVED: EstimatedProfit bars trace
-
-    # Update layout
-    fig.update_layout(
-        title={
-            'text': 'Top Representatives by Processing Amount', # Updated title
-            'font': {
-                'family': 'Roboto, sans-serif',
-                'size': 18,
-                'color': '#1e293b'
-            },
-            'y': 0.95,
-            'x': 0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'
-        },
-        xaxis_title='Processing Amount ($)',
-        yaxis_title=None, # Remove y-axis title if desired
-        # barmode='group', # No longer grouped
-        margin=dict(l=0, r=0, t=40, b=0),
-        height=350,
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        yaxis=dict(gridcolor='rgba(0,0,0,0.05)'),
-        xaxis=dict(gridcolor='rgba(0,0,0,0.05)', separatethousands=True, tickprefix='$'), # Format x-axis
-        # legend=dict( # Legend not really needed for single bar type
-        #     orientation='h',
-        #     yanchor='bottom',
-        #     y=1.02,
-        #     xanchor='right',
-        #     x=1,
-        #     font={'size': 12, 'color': '#64748b'}
-        # ),
-        showlegend=False, # Hide legend
-        font={'family': 'Roboto, sans-serif', 'color': '#334155'}
-    )
-
-    return fig
-
-def create_processing_by_location_map(data, start_date, end_date): # Renamed function
+def create_processing_by_location_map(ctx): # Renamed function
     """Create a map showing processing amount by location (City) and total transactions for the selected period"""
-    # Filter transactions by date first
-    filtered_transactions = data['transactions'][
-        (data['transactions']['TRAN_DT'] >= start_date) &
-        (data['transactions']['TRAN_DT'] <= end_date)
-    ].copy()
-
     # If no transactions in the period, return an empty map
-    if filtered_transactions.empty:
-        fig = go.Figure() # Start with base map structure even if empty
-        fig.add_trace(go.Choropleth(
-            locationmode='USA-states', locations=['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY'], z=[0]*50, colorscale=[[0, 'rgba(240, 240, 240, 0.8)'], [1, 'rgba(240, 240, 240, 0.8)']], showscale=False, marker_line_color='white', marker_line_width=0.5
-        ))
-        fig.update_layout( # Apply basic layout
-            title={'text': 'Processing Amount by Location', 'font': {'family': 'Roboto, sans-serif', 'size': 18, 'color': '#1e293b'}, 'y': 0.95, 'x': 0.5, 'xanchor': 'center', 'yanchor': 'top'},
-            showlegend=False, geo=dict(scope='usa', projection_type='albers usa', showland=True, landcolor='rgb(250, 250, 250)', countrycolor='rgb(204, 204, 204)', bgcolor='rgba(0,0,0,0)'),
-            margin=dict(l=0, r=0, t=40, b=0), height=450, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)'
-        )
-        return fig
-
-    # Aggregate filtered transactions by City
-    territory_data = filtered_transactions.groupby('CITY_NM').agg(
-        Total_Processing=('TRAN_AM', 'sum'),
-        Total_Transactions=('TransactionVolume', 'sum'),
-        latitude=('latitude', 'first'),
-        longitude=('longitude', 'first'),
-        full_address=('preprocessed_address', 'first')
-    ).reset_index()
-
-    # Rename city column
-    territory_data = territory_data.rename(columns={'CITY_NM': 'city'})
+    if ctx.transactions.empty:
+        return sky_figures.map_figure('processing_empty')
 
-    # Data Cleaning and Preparation (similar to load_data)
-    required_map_cols = ['city', 'Total_Processing', 'Total_Transactions', 'latitude', 'longitude', 'full_address']
-    for col in required_map_cols:
-        if col not in territory_data.columns: territory_data[col] = np.nan
-    territory_data['city'] = territory_data['city'].astype(str).fillna('Unknown')
-    territory_data['full_address'] = territory_data['full_address'].astype(str).fillna('Address Unavailable')
-    territory_data['latitude'] = pd.to_numeric(territory_data['latitude'], errors='coerce')
-    territory_data['longitude'] = pd.to_numeric(territory_data['longitude'], errors='coerce')
-    territory_data['Total_Processing'] = pd.to_numeric(territory_data['Total_Processing'], errors='coerce').fillna(0)
-    territory_data['Total_Transactions'] = pd.to_numeric(territory_data['Total_Transactions'], errors='coerce').fillna(0)
+    # Per-city aggregate of the period, already cleaned (the profit map is a projection of the same cached frame)
+    territory_data = ctx.city_totals
 
     # REMOVED: Estimated Profit calculation
 
-    # Create the figure
-    fig = go.Figure()
-
-    # Add base map
-    fig.add_trace(go.Choropleth(
-        locationmode='USA-states', locations=['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY'], z=[0]*50, colorscale=[[0, 'rgba(240, 240, 240, 0.8)'], [1, 'rgba(240, 240, 240, 0.8)']], showscale=False, marker_line_color='white', marker_line_width=0.5
-    ))
-
     # Add bubbles for each city
     territory_data_plot = territory_data[
         territory_data['latitude'].notna() & territory_data['longitude'].notna() &
         (territory_data['latitude'] != 0) & (territory_data['longitude'] != 0)
     ].copy()
 
+    traces = []
     if not territory_data_plot.empty:
         # Calculate bubble size based on Total_Processing
         max_processing = territory_data_plot['Total_Processing'].max() if territory_data_plot['Total_Processing'].max() > 0 else 1
@@ -1695,123 +1288,28 @@ def create_processing_by_location_map(data, start_date, end_date): # Renamed fun
         max_size = 50
         territory_data_plot['size'] = min_size + (territory_data_plot['Total_Processing'] / max_processing) * (max_size - min_size)
 
-        fig.add_trace(go.Scattergeo(
-            locationmode='USA-states',
-            lon=territory_data_plot['longitude'],
-            lat=territory_data_plot['latitude'],
-            # Update hover text to show Total Processing
-            text=territory_data_plot.apply(
-                lambda row: f"<b>{row['city']}</b><br>Total Processing: ${row['Total_Processing']:,.2f}<br>Transactions: {int(row['Total_Transactions'])}<br>Address: {row['full_address']}",
-                axis=1
-            ),
-            mode='markers',
-            marker=dict(
-                size=territory_data_plot['size'], # Use calculated size based on processing
-                color='#818cf8',
-                opacity=0.7,
-                line=dict(width=1, color='rgba(255, 255, 255, 0.5)')
-            ),
+        traces.append(sky_figures.bubble_trace(
+            territory_data_plot,
+            territory_data_plot['size'], # Use calculated size based on processing
+            # Hover text showing Total Processing (cached with the city aggregate)
+            territory_data_plot['hover_processing'],
             name='Processing by Location', # Updated name
-            hoverinfo='text'
+            line_color='rgba(255, 255, 255, 0.5)'
         ))
 
-    # Update the geo layout properties
-    fig.update_layout(
-        title={
-            'text': 'Processing Amount by Location (Selected Period)', # Updated title
-            'font': {'family': 'Roboto, sans-serif', 'size': 18, 'color': '#1e293b'},
-            'y': 0.95, 'x': 0.5, 'xanchor': 'center', 'yanchor': 'top'
-        },
-        showlegend=False,
-        geo=dict(
-            scope='usa', projection_type='albers usa', showland=True, landcolor='rgb(250, 250, 250)', countrycolor='rgb(204, 204, 204)', showlakes=True, lakecolor='rgb(255, 255, 255)', showsubunits=True, subunitcolor='rgb(230, 230, 230)', bgcolor='rgba(0,0,0,0)'
-        ),
-        margin=dict(l=0, r=0, t=40, b=0), height=450, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)'
-    )
-    return fig
+    # Base map and geo layout come from the prebuilt skeleton
+    return sky_figures.map_figure('processing', *traces)
 
-def create_profit_by_location_map(data, start_date, end_date): # Added date parameters
+def create_profit_by_location_map(ctx): # Takes the rerun's FilterContext
     """Create a map showing profit by location (City) and total transactions for the selected period"""
-    # Filter transactions by date first
-    filtered_transactions = data['transactions'][
-        (data['transactions']['TRAN_DT'] >= start_date) &
-        (data['transactions']['TRAN_DT'] <= end_date)
-    ].copy()
-
     # If no transactions in the period, return an empty map
-    if filtered_transactions.empty:
+    if ctx.transactions.empty:
         # st.info("No transaction data in the selected period.") # Optional info message
-        fig = go.Figure() # Start with base map structure even if empty
-        fig.add_trace(go.Choropleth(
-            locationmode='USA-states',
-            locations=['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA',
-                       'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD',
-                       'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ',
-                       'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC',
-                       'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY'],
-            z=[0]*50,
-            colorscale=[[0, 'rgba(240, 240, 240, 0.8)'], [1, 'rgba(240, 240, 240, 0.8)']],
-            showscale=False,
-            marker_line_color='white',
-            marker_line_width=0.5
-        ))
-        fig.update_layout( # Apply basic layout
-            title={
-                'text': 'Estimated Profit by Location',
-                'font': {'family': 'Roboto, sans-serif', 'size': 18, 'color': '#1e293b'}, # Adjusted size
-                'y': 0.95, 'x': 0.5, 'xanchor': 'center', 'yanchor': 'top'
-            },
-            showlegend=False,
-            geo=dict(scope='usa', projection_type='albers usa', showland=True, landcolor='rgb(250, 250, 250)', countrycolor='rgb(204, 204, 204)', bgcolor='rgba(0,0,0,0)'),
-            margin=dict(l=0, r=0, t=40, b=0), height=450, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)'
-        )
-        return fig # Return the empty-looking map
-
-    # Aggregate filtered transactions by City
-    territory_data = filtered_transactions.groupby('CITY_NM').agg(
-        Total_Processing=('TRAN_AM', 'sum'),
-        Total_Transactions=('TransactionVolume', 'sum'),
-        latitude=('latitude', 'first'),
-        longitude=('longitude', 'first'),
-        full_address=('preprocessed_address', 'first')
-    ).reset_index()
+        return sky_figures.map_figure('profit_empty') # Return the empty-looking map
 
-    # Rename city column
-    territory_data = territory_data.rename(columns={'CITY_NM': 'city'})
-
-    # Data Cleaning and Preparation (similar to load_data)
-    required_map_cols = ['city', 'Total_Processing', 'Total_Transactions', 'latitude', 'longitude', 'full_address']
-    for col in required_map_cols:
-        if col not in territory_data.columns:
-            territory_data[col] = np.nan
-
-    territory_data['city'] = territory_data['city'].astype(str).fillna('Unknown')
-    territory_data['full_address'] = territory_data['full_address'].astype(str).fillna('Address Unavailable')
-    territory_data['latitude'] = pd.to_numeric(territory_data['latitude'], errors='coerce') # Keep as NaN initially
-    territory_data['longitude'] = pd.to_numeric(territory_data['longitude'], errors='coerce') # Keep as NaN initially
-    territory_data['Total_Processing'] = pd.to_numeric(territory_data['Total_Processing'], errors='coerce').fillna(0)
-    territory_data['Total_Transactions'] = pd.to_numeric(territory_data['Total_Transactions'], errors='coerce').fillna(0)
-
-    # Calculate estimated profit
-    territory_data['EstimatedProfit'] = territory_data['Total_Processing'] * 0.3
-
-    # Create the figure
-    fig = go.Figure()
-
-    # Add base map
-    fig.add_trace(go.Choropleth(
-        locationmode='USA-states',
-        locations=['AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA',
-                   'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD',
-                   'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ',
-                   'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC',
-                   'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY'],
-        z=[0]*50,
-        colorscale=[[0, 'rgba(240, 240, 240, 0.8)'], [1, 'rgba(240, 240, 240, 0.8)']],
-        showscale=False,
-        marker_line_color='white',
-        marker_line_width=0.5
-    ))
+    # Per-city aggregate of the period, already cleaned (shared with the processing map)
+    # Calculate estimated profit - assign returns a new frame, so the cached one stays untouched
+    territory_data = ctx.city_totals.assign(EstimatedProfit=ctx.city_totals['Total_Processing'] * sky_data.ESTIMATED_PROFIT_RATE)
 
     # Add bubbles for each city
     # Filter out entries with invalid lat/lon AFTER aggregation
@@ -1822,6 +1320,7 @@ def create_profit_by_location_map(data, start_date, end_date): # Added date para
         (territory_data['longitude'] != 0)
     ].copy()
 
+    traces = []
     if not territory_data_plot.empty:
         max_profit = territory_data_plot['EstimatedProfit'].max() if territory_data_plot['EstimatedProfit'].max() > 0 else 1
         min_size = 15
@@ -1829,99 +1328,35 @@ def create_profit_by_location_map(data, start_date, end_date): # Added date para
         # Use EstimatedProfit for bubble size
         territory_data_plot['size'] = min_size + (territory_data_plot['EstimatedProfit'] / max_profit) * (max_size - min_size)
 
-        fig.add_trace(go.Scattergeo(
-            locationmode='USA-states',
-            lon=territory_data_plot['longitude'],
-            lat=territory_data_plot['latitude'],
-            # Use columns from territory_data_plot
-            text=territory_data_plot.apply(
-                lambda row: f"<b>{row['city']}</b><br>Est. Profit: ${row['EstimatedProfit']:,.2f}<br>Transactions: {int(row['Total_Transactions'])}<br>Address: {row['full_address']}",
-                axis=1
-            ),
-            mode='markers',
-            marker=dict(
-                size=territory_data_plot['size'], # Use calculated size
-                color='#818cf8', # Bubble color
-                opacity=0.7,
-                line=dict(width=1, color='rgba(255, 255, 255, 0.5)')
-            ),
+        traces.append(sky_figures.bubble_trace(
+            territory_data_plot,
+            territory_data_plot['size'], # Use calculated size
+            # Hover text showing the estimated profit (cached with the city aggregate)
+            territory_data_plot['hover_profit'],
             name='Profit by Location',
-            hoverinfo='text'
+            line_color='rgba(255, 255, 255, 0.5)'
         ))
 
-    # Update the geo layout properties
-    fig.update_layout(
-        title={
-            'text': 'Estimated Profit by Location',
-            'font': {
-                'family': 'Roboto, sans-serif',
-                'size': 18, # Adjusted size
-                'color': '#1e293b'
-            },
-            'y': 0.95,
-            'x': 0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'
-        },
-        showlegend=False,
-        geo=dict(
-            scope='usa',
-            projection_type='albers usa',
-            showland=True,
-            landcolor='rgb(250, 250, 250)', # Light gray land
-            countrycolor='rgb(204, 204, 204)', # Gray country borders
-            showlakes=True, # Show lakes
-            lakecolor='rgb(255, 255, 255)', # White lakes
-            showsubunits=True, # Show state lines
-            subunitcolor='rgb(230, 230, 230)', # Light gray state lines
-            bgcolor='rgba(0,0,0,0)' # Transparent background for the geo plot area
-        ),
-        margin=dict(l=0, r=0, t=40, b=0),
-        height=450,
-        paper_bgcolor='rgba(0,0,0,0)', # Transparent background for the whole chart area
-        plot_bgcolor='rgba(0,0,0,0)' # Transparent background for the plot area itself
-    )
-    return fig
+    # Base map and geo layout come from the prebuilt skeleton
+    return sky_figures.map_figure('profit', *traces)
 
-def create_processing_by_account_chart(data, start_date, end_date):
+def create_processing_by_account_chart(ctx):
     """Create a bar chart showing the distribution of processing amount by account name for the selected period"""
-    # Filter transactions first
-    transactions = data['transactions'][
-        (data['transactions']['TRAN_DT'] >= start_date) &
-        (data['transactions']['TRAN_DT'] <= end_date)
-    ].copy()
-
     # If no transactions, return empty figure
-    if transactions.empty:
-        fig = go.Figure()
-        fig.update_layout(title='Top 10 Accounts by Processing Amount')
-        return fig
-
-    # Ensure needed columns exist and fill NAs
-    required_cols = ['LCTN_ID', 'CHILD_LCTN_DBA_NM', 'GRANDPARENT_CORP_DBA_NM', 'REP NAME', 'TRAN_AM', 'TransactionVolume']
-    for col in required_cols:
-        if col not in transactions.columns:
-            transactions[col] = np.nan # Add missing cols
-
-    transactions['CHILD_LCTN_DBA_NM'] = transactions['CHILD_LCTN_DBA_NM'].fillna('Unknown Account')
-    transactions['GRANDPARENT_CORP_DBA_NM'] = transactions['GRANDPARENT_CORP_DBA_NM'].fillna('N/A')
-    transactions['REP NAME'] = transactions['REP NAME'].fillna('Unknown Rep')
-    transactions['TRAN_AM'] = transactions['TRAN_AM'].fillna(0)
-
-    # Aggregate total processing amount by LCTN_ID, including hierarchy and rep name
-    account_totals = transactions.groupby(
-        ['LCTN_ID', 'CHILD_LCTN_DBA_NM', 'GRANDPARENT_CORP_DBA_NM', 'REP NAME']
-    ).agg(
-        ProcessingAmount=('TRAN_AM', 'sum')
-    ).reset_index()
+    if ctx.transactions.empty:
+        return sky_figures.empty_figure('Top 10 Accounts by Processing Amount')
+
+    # Total processing amount by LCTN_ID, including hierarchy and rep name (NAs already filled in the shared aggregate)
+    account_totals = ctx.account_totals[ctx.account_totals['LCTN_ID'].notna()][
+        ['LCTN_ID', 'CHILD_LCTN_DBA_NM', 'GRANDPARENT_CORP_DBA_NM', 'REP NAME', 'TRAN_AM_CENTS']
+    ].rename(columns={'TRAN_AM_CENTS': 'ProcessingAmount'})
+    account_totals['ProcessingAmount'] = sky_data.to_dollars(account_totals['ProcessingAmount'])
 
     # REMOVED: Merges with accounts and sales_reps tables as names are now grouped directly
 
     # Handle cases where grouping might result in empty dataframe (though unlikely if transactions wasn't empty)
     if account_totals.empty:
-        fig = go.Figure()
-        fig.update_layout(title='Top 10 Accounts by Processing Amount')
-        return fig
+        return sky_figures.empty_figure('Top 10 Accounts by Processing Amount')
 
     # Sort by processing amount (descending)
     account_totals = account_totals.sort_values('ProcessingAmount', ascending=False)
@@ -1940,106 +1375,43 @@ def create_processing_by_account_chart(data, start_date, end_date):
         'REP NAME': 'RepName'
     })
 
-    # Create the bar chart
-    fig = go.Figure()
-
-    # Generate a colorful palette
-    colors = px.colors.qualitative.Vivid # Using a different Plotly Express palette
-
-    # Add the bar trace
-    fig.add_trace(go.Bar(
-        x=top_accounts['AccountName'], # Use Child Name for x-axis
-        y=top_accounts['ProcessingAmount'],
+    # Bar chart, one color of the Vivid palette per account
+    return sky_figures.top_accounts_figure(
+        top_accounts['AccountName'], # Use Child Name for x-axis
+        top_accounts['ProcessingAmount'],
         # Text on bars: Amount, Percentage, Rep Name (matching image)
-        text=[f"${amt:,.2f}<br>({pct:.1f}%)<br>{rep}" for amt, pct, rep in
-              zip(top_accounts['ProcessingAmount'],
-                  top_accounts['Percentage'],
-                  top_accounts['RepName'])],
-        textposition='auto', # Changed to auto; might need adjustment based on bar height
-        textfont=dict(size=10), # Smaller font for text on bars
-        marker_color=colors[:len(top_accounts)], # Use the new color palette
-        hoverinfo='text',
+        [f"${amt:,.2f}<br>({pct:.1f}%)<br>{rep}" for amt, pct, rep in
+         zip(top_accounts['ProcessingAmount'],
+             top_accounts['Percentage'],
+             top_accounts['RepName'])],
         # Hover Text: Include Grandparent Name
-        hovertext=[f"Account: {name}<br>Grandparent: {gp}<br>Amount: ${amt:,.2f}<br>Percentage: {pct:.1f}%<br>Rep: {rep}"
-                   for name, gp, amt, pct, rep in
-                   zip(top_accounts['AccountName'],
-                       top_accounts['GrandparentName'],
-                       top_accounts['ProcessingAmount'],
-                       top_accounts['Percentage'],
-                       top_accounts['RepName'])]
-    ))
-
-    # Update layout
-    fig.update_layout(
-        title={
-            'text': 'Top 10 Accounts by Processing Amount',
-            'y': 0.95,
-            'x': 0.5,
-            'xanchor': 'center',
-            'yanchor': 'top',
-            'font': {'size': 18, 'color': '#1e293b'} # Consistent font
-        },
-        yaxis_title="Processing Amount ($)",
-        xaxis_title="Account Name",
-        xaxis_tickangle=-45,
-        height=500,
-        margin=dict(l=50, r=20, t=80, b=120), # Adjusted margins slightly
-        plot_bgcolor='white',
-        bargap=0.2 # Add some gap between bars
-    )
-
-    # Add value formatting to y-axis
-    fig.update_yaxes(
-        tickprefix="$",
-        separatethousands=True,
-        gridcolor='rgba(0,0,0,0.05)' # Add light gridlines
-    )
-    fig.update_xaxes(
-        gridcolor='rgba(0,0,0,0.05)' # Add light gridlines
+        [f"Account: {name}<br>Grandparent: {gp}<br>Amount: ${amt:,.2f}<br>Percentage: {pct:.1f}%<br>Rep: {rep}"
+         for name, gp, amt, pct, rep in
+         zip(top_accounts['AccountName'],
+             top_accounts['GrandparentName'],
+             top_accounts['ProcessingAmount'],
+             top_accounts['Percentage'],
+             top_accounts['RepName'])]
     )
 
-
-    return fig
-
-def create_management_transaction_table(data, start_date, end_date):
-    """Create a detailed transaction table for management view for the selected period, showing Grandparent as Account Name"""
-    # Filter transactions first
-    transactions = data['transactions'][
-        (data['transactions']['TRAN_DT'] >= start_date) &
-        (data['transactions']['TRAN_DT'] <= end_date)
-    ].copy() # Has LCTN_ID and hierarchy columns
-
+def create_management_transaction_table(ctx):
+    """Create a detailed transaction table for management view for the selected period, showing Grandparent as Account Name (amounts stay numeric)"""
     # If no transactions in the period, return an empty DataFrame with expected columns
-    if transactions.empty:
+    if ctx.transactions.empty:
         return pd.DataFrame(columns=[
             'RepName', 'AccountName', # Only Grandparent Name displayed as AccountName
             'Sum of ProcessingAmount', 'Count of TransactionVolume'
         ])
 
-    # Ensure the necessary columns exist and handle potential missing values
-    required_cols = ['REP NAME', 'GRANDPARENT_CORP_DBA_NM', 'TRAN_AM', 'TransactionVolume']
-    for col in required_cols:
-        if col not in transactions.columns:
-             # Use appropriate fill for missing columns
-             fill_value = 'N/A' if col == 'GRANDPARENT_CORP_DBA_NM' else ('Unknown Rep' if col == 'REP NAME' else 0)
-             transactions[col] = fill_value
-        else:
-             # Fill missing values specifically for these columns
-             if col == 'REP NAME':
-                 transactions[col] = transactions[col].fillna('Unknown Rep')
-             elif col == 'GRANDPARENT_CORP_DBA_NM':
-                 transactions[col] = transactions[col].fillna('N/A')
-             elif col == 'TRAN_AM' or col == 'TransactionVolume':
-                 transactions[col] = transactions[col].fillna(0)
-
-
     # Group by RepName and the GRANDPARENT_CORP_DBA_NM (Grandparent Name)
-    grouped = transactions.groupby(
+    # Re-grouped from the shared per-account aggregate (NAs already filled) instead of the transactions
+    grouped = ctx.account_totals.groupby(
         ['REP NAME', 'GRANDPARENT_CORP_DBA_NM'] # Group by Rep and Grandparent only
     ).agg(
-        TRAN_AM=('TRAN_AM', 'sum'),           # Use named aggregation
+        TRAN_AM_CENTS=('TRAN_AM_CENTS', 'sum'),           # Use named aggregation
         TransactionVolume=('TransactionVolume', 'sum')
     ).reset_index()
+    grouped['TRAN_AM'] = sky_data.to_dollars(grouped.pop('TRAN_AM_CENTS'))
 
     # Rename columns for display
     grouped = grouped.rename(columns={
@@ -2050,11 +1422,7 @@ def create_management_transaction_table(data, start_date, end_date):
         'TransactionVolume': 'Count of TransactionVolume'
     })
 
-    # Format currency columns
-    grouped['Sum of ProcessingAmount'] = grouped['Sum of ProcessingAmount'].apply(
-        lambda x: f"${x:,.2f}"
-    )
-
+    # Currency is formatted by the table display (TABLE_COLUMN_CONFIG), so the amounts sort as numbers
     # Sort by rep name and processing amount
     grouped = grouped.sort_values(['RepName', 'Sum of ProcessingAmount'], ascending=[True, False])
 
@@ -2064,17 +1432,12 @@ def create_management_transaction_table(data, start_date, end_date):
         'Sum of ProcessingAmount', 'Count of TransactionVolume'
     ]]
 
-def calculate_management_metrics(data, start_date, end_date):
+def calculate_management_metrics(ctx):
     """Calculate overall metrics for management dashboard"""
-    # Filter transactions using TRAN_DT
-    filtered_transactions = data['transactions'][
-        (data['transactions']['TRAN_DT'] >= start_date) & # Use TRAN_DT instead of TransactionDate
-        (data['transactions']['TRAN_DT'] <= end_date)
-    ].copy() # Add .copy()
-
-    # Calculate totals using TRAN_AM and TransactionVolume
-    total_processing = filtered_transactions['TRAN_AM'].sum() # Use TRAN_AM
-    total_volume = filtered_transactions['TransactionVolume'].sum() # Use TransactionVolume
+    data = ctx.data
+    # Totals of TRAN_AM and transaction counts over the date range, from the all-reps row of the prefix sums
+    total_cents, total_volume = ctx.totals
+    total_processing = sky_data.to_dollars(total_cents)
 
     # Get total YTD goal from all reps (RepID is name)
     total_ytd_goal = data['sales_targets']['BonusThreshold'].sum()
@@ -2082,21 +1445,17 @@ def calculate_management_metrics(data, start_date, end_date):
     # Calculate overall completion percentage - multiply by 100 to show as percentage
     completion_percentage = round((total_processing / total_ytd_goal) * 100, 2) if total_ytd_goal > 0 else 0
 
-    # Count reps eligible for bonus based on actual performance vs targets
-    eligible_count = 0
-    if 'sales_reps' in data and not data['sales_reps'].empty:
-        for rep_id in data['sales_reps']['RepID'].unique():
-             # Use calculate_rep_metrics which is already updated
-             rep_metrics = calculate_rep_metrics(data, rep_id, start_date, end_date)
-             if rep_metrics['bonus_eligibility']:
-                 eligible_count += 1
+    # Count reps eligible for bonus based on actual performance vs targets (all reps in one batch)
+    rep_metrics = calculate_all_rep_metrics(ctx)
+    eligible_count = int(rep_metrics['bonus_eligibility'].sum())
 
     return {
         'total_processing': total_processing,
         'total_volume': total_volume,
         'total_ytd_goal': total_ytd_goal,
         'completion_percentage': completion_percentage,
-        'bonus_eligible_count': eligible_count # Use calculated count based on updated rep metrics
+        'bonus_eligible_count': eligible_count, # Use calculated count based on updated rep metrics
+        'rep_metrics': rep_metrics # Per-rep metrics frame, for widgets that need more than the count
     }
 
 def show_login_page():
@@ -2234,7 +1593,7 @@ def show_login_page():
         
 
         # Load users from YAML file
-        yaml_data = yaml.safe_load(open('users.yaml'))
+        yaml_data = data_watcher().users # Reloaded by the watcher when users.yaml changes
         usernames = [user['username'] for user in yaml_data.get('users', [])]
         passwords = [user['password'] for user in yaml_data.get('users', [])]
         roles = [user['role'] for user in yaml_data.get('users', [])]
@@ -2288,8 +1647,8 @@ def show_dashboard():
     st.sidebar.header("Filters")
     
     # Date filters - Use min date from data but allow selection up to current day
-    min_date = data['transactions']['TRAN_DT'].min().date()
-    today = datetime.now().date()
+    # (the same default window warm_up_dashboard precomputes)
+    min_date, today = (bound.date() for bound in sky_data.default_window(data))
     
     col1, col2 = st.sidebar.columns(2)
     with col1:
@@ -2355,15 +1714,20 @@ def show_dashboard():
     
     start_date = pd.to_datetime(start_date)
     end_date = pd.to_datetime(end_date)
+
+    # One filter context per rerun: every widget below shares its (lazily computed) slices and aggregates
+    ctx = sky_data.FilterContext(data, start_date, end_date, rep_id)
     
     # Using tabs to separate Dashboard views
-    selected_tab = st.tabs(tabs)
+    # Lazy tabs: switching tabs reruns the script and only the open tab's body is computed
+    # (keyed per role, since the two roles have different tab lists)
+    selected_tab = st.tabs(tabs, key=f"dashboard_tabs_{st.session_state.get('user_role')}", on_change="rerun")
     
     # Management Overview Tab (only visible to management users)
-    if st.session_state.get('user_role') == "Management" and selected_tab[0]:
+    if st.session_state.get('user_role') == "Management" and selected_tab[0].open:
         with selected_tab[0]:
             # Calculate management metrics
-            mgmt_metrics = calculate_management_metrics(data, start_date, end_date)
+            mgmt_metrics = calculate_management_metrics(ctx)
             
             # Format values
             formatted_volume = str(int(mgmt_metrics["total_volume"]))
@@ -2397,7 +1761,7 @@ def show_dashboard():
             st.markdown("## Team Activity Performance Summary")
             
             # Get the summary tables, passing the date filters
-            summary_df, metrics_df, top_performers = create_activity_summary_table(data, start_date, end_date)
+            summary_df, metrics_df, top_performers = create_activity_summary_table(ctx)
             
             # Format summary table
             formatted_summary = summary_df.copy()
@@ -2458,15 +1822,15 @@ def show_dashboard():
             
             with col1:
                 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                # Pass dates to the function
-                revenue_chart = create_revenue_comparison(data, start_date, end_date)
+                # Pass the filter context (dates and rep)
+                revenue_chart = create_revenue_comparison(ctx)
                 st.plotly_chart(revenue_chart, use_container_width=True, key="mgmt_revenue_comp")
                 st.markdown('</div>', unsafe_allow_html=True)
                 
             with col2:
                 st.markdown('<div class="chart-container">', unsafe_allow_html=True)
                 # Call the renamed function, passing dates
-                processing_location_map = create_processing_by_location_map(data, start_date, end_date) # Pass dates
+                processing_location_map = create_processing_by_location_map(ctx)
                 st.plotly_chart(processing_location_map, use_container_width=True, key="mgmt_processing_location_map")
                 st.markdown('</div>', unsafe_allow_html=True)
             
@@ -2480,29 +1844,25 @@ def show_dashboard():
             
             # RESTORE: Processing by Account chart (as bar chart now)
             st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-            # Pass dates to the function
-            processing_by_account_chart = create_processing_by_account_chart(data, start_date, end_date)
+            # Pass the filter context (dates and rep)
+            processing_by_account_chart = create_processing_by_account_chart(ctx)
             st.plotly_chart(processing_by_account_chart, use_container_width=True, key="mgmt_account_chart")
             st.markdown('</div>', unsafe_allow_html=True)
             
             # RESTORE: Transaction table
-            st.markdown('<div class="data-table">', unsafe_allow_html=True)
-            st.subheader("Transaction Details by Sales Representative and Account")
-            # Pass dates to the function
-            transaction_table = create_management_transaction_table(data, start_date, end_date)
-            st.dataframe(transaction_table, use_container_width=True)
-            st.markdown('</div>', unsafe_allow_html=True)
+            # Paginated, as a fragment: paging, sorting and filtering only rerun that block (see show_management_transactions)
+            show_management_transactions(ctx)
     
     # Rep Dashboard Tab
     rep_tab_index = 0 if st.session_state.get('user_role') != "Management" else 1
-    if selected_tab[rep_tab_index]:
+    if selected_tab[rep_tab_index].open:
         with selected_tab[rep_tab_index]:
             # For management view, we need to ensure rep_id is selected
             if st.session_state.get('user_role') == "Management" and not rep_id:
                 st.warning("Please select a Sales Rep from the sidebar to view their dashboard.")
                 return
             
-            metrics = calculate_rep_metrics(data, rep_id, start_date, end_date)
+            metrics = calculate_rep_metrics(ctx)
             
             # Format metric values - keep it simple
             vol_value = str(int(metrics["total_volume"]))
@@ -2535,379 +1895,449 @@ def show_dashboard():
             # Rest of the dashboard content
             st.markdown('<div class="chart-container">', unsafe_allow_html=True)
             st.subheader("Territory Performance")
-            # Pass dates to the function
-            map_chart = create_map_visualization(data, rep_id, start_date, end_date) # Pass dates
+            # Pass the filter context (dates and rep)
+            map_chart = prebuilt_figure(ctx, 'map', lambda: create_map_visualization(ctx))
             st.plotly_chart(map_chart, use_container_width=True, key="rep_map_chart")  # Added unique key
             st.markdown('</div>', unsafe_allow_html=True)
             
             # Continue with other charts (with unique keys)
-            st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-            # Remove column division - use full width
-            st.subheader("Processing Amount Over Time")
-            time_series_chart = create_time_series_chart(data, rep_id, start_date, end_date)
-            st.plotly_chart(time_series_chart, use_container_width=True, key="rep_time_series")  # Added unique key
+            # Processing amount over time runs as a fragment (see show_time_series)
+            show_time_series(ctx)
             # Remove the Transaction Volume chart entirely
-            st.markdown('</div>', unsafe_allow_html=True)
-            
-            st.markdown('<div class="data-table">', unsafe_allow_html=True)
-            st.subheader("Transaction Details")
-            
-            # Get the transaction table data first
-            transaction_table = create_transaction_table(data, rep_id, start_date, end_date)
-            
-            # Add AccountName filter
-            if not transaction_table.empty:
-                # Get unique AccountNames from the transaction table
-                account_names = sorted(transaction_table['AccountName'].unique().tolist())
-                
-                # Add an "All Accounts" option at the beginning
-                account_filter_options = ["All Accounts"] + account_names
-                
-                # Create the filter dropdown
-                selected_account = st.selectbox(
-                    "Filter by Account:", 
-                    account_filter_options,
-                    key="account_filter"
-                )
-                
-                # Apply the filter if a specific account is selected
-                if selected_account != "All Accounts":
-                    transaction_table = transaction_table[transaction_table['AccountName'] == selected_account]
-                
-                # Sort the table by Year, Quarter, and Month in descending order (newest first)
-                if 'Year' in transaction_table.columns and 'Quarter' in transaction_table.columns and 'Month' in transaction_table.columns:
-                    # Convert Month names to numbers for proper sorting
-                    month_order = {
-                        'January': 1, 'February': 2, 'March': 3, 'April': 4, 'May': 5, 'June': 6,
-                        'July': 7, 'August': 8, 'September': 9, 'October': 10, 'November': 11, 'December': 12
-                    }
-                    
-                    # Create temporary numeric month column for sorting
-                    if transaction_table['Month'].dtype == 'object':  # If Month is stored as text
-                        transaction_table['MonthNum'] = transaction_table['Month'].map(month_order)
-                        transaction_table = transaction_table.sort_values(
-                            by=['Year', 'Quarter', 'MonthNum'], 
-                            ascending=[True, True, True]
-                        )
-                        # Remove temporary column
-                        transaction_table = transaction_table.drop('MonthNum', axis=1)
-                    else:  # If Month is already numeric
-                        transaction_table = transaction_table.sort_values(
-                            by=['Year', 'Quarter', 'Month'], 
-                            ascending=[True, True, True]
-                        )
-            
-            # Display the filtered table
-            st.dataframe(transaction_table, use_container_width=True)
-            st.markdown('</div>', unsafe_allow_html=True)
             
-            # Add activity performance chart
-            st.markdown("## My Activity & Performance Metrics")
-            col1, col2 = st.columns(2)
-            
-            # Determine if this is a management view
-            is_management_view = st.session_state.get('user_role') == "Management"
+            # Transaction details run as a fragment: changing the account filter only reruns that block
+            show_transaction_details(ctx)
             
-            with col1:
-                st.subheader("Discovery & Follow-up Activities")
-                discovery_chart = create_activity_performance_chart(
-                    data.get('performance_data'), 
-                    rep_id=rep_id, 
-                    start_date=start_date, # Pass start_date
-                    end_date=end_date,     # Pass end_date
-                    is_management=is_management_view,
-                    chart_type="discovery"
-                )
-                # Check if chart data exists
-                if discovery_chart is not None:
-                    st.plotly_chart(discovery_chart, use_container_width=True)
-                else:
-                    st.info("No discovery/follow-up activity data available for this representative in the selected period.")
-            
-            with col2:
-                st.subheader("Demo & Conversion Activities")
-                demo_chart = create_activity_performance_chart(
-                    data.get('performance_data'), 
-                    rep_id=rep_id, 
-                    start_date=start_date, # Pass start_date
-                    end_date=end_date,     # Pass end_date
-                    is_management=is_management_view,
-                    chart_type="demo"
-                )
-                # Check if chart data exists
-                if demo_chart is not None:
-                    st.plotly_chart(demo_chart, use_container_width=True)
-                else:
-                    st.info("No demo/conversion activity data available for this representative in the selected period.")
+            # Activity charts run as a fragment (see show_activity_charts)
+            show_activity_charts(ctx)
     
     # Compensation Model Tab
     comp_tab_index = 1 if st.session_state.get('user_role') != "Management" else 2
-    if selected_tab[comp_tab_index]:
+    if selected_tab[comp_tab_index].open:
         with selected_tab[comp_tab_index]:
-            # Get rep details
-            rep_details = data['sales_reps'][data['sales_reps']['RepID'] == rep_id].iloc[0]
-            rep_name = rep_details['RepName']
-            
-            # Get target info
-            target_info = data['sales_targets'][data['sales_targets']['RepID'] == rep_id]
-            if not target_info.empty:
-                bonus_threshold = target_info.iloc[0]['BonusThreshold']
-                bonus_eligibility = target_info.iloc[0]['Bonus_Eligibility']
-            else:
-                bonus_threshold = 0
-                bonus_eligibility = False
-            
-            # Add the bonus attainment scale at the top of the tab
-            st.markdown("### Bonus Attainment")
-            # Make sure this function is defined above
-            bonus_scale = create_bonus_attainment_scale(data, rep_id)
-            st.plotly_chart(bonus_scale, use_container_width=True, key="comp_bonus_scale")
-            
-            # Display summary cards
-            st.subheader(f"Compensation Model: {rep_name}")
-            st.markdown(f"**Annual Bonus Threshold:** ${bonus_threshold:,.2f}")
-            
-            # Generate monthly targets and actuals for visualization
-            # Get rep accounts (AccountID comes from the accounts dataframe)
-            rep_accounts = data['accounts'][data['accounts']['RepID'] == rep_id]['AccountID'].tolist()
+            # Rendered as a fragment (see show_compensation_model)
+            show_compensation_model(ctx)
+    
+    # Add the Rep Details section back to the sidebar
+    st.sidebar.markdown("---")
 
-            # ---- FIX THIS LINE (around 2293) ----
-            # Filter the main transactions dataframe using LCTN_ID
-            rep_transactions = data['transactions'][
-                data['transactions']['LCTN_ID'].isin(rep_accounts) # Ensure this uses LCTN_ID
-            ].copy() # Add .copy()
+@st.fragment
+def show_time_series(ctx):
+    """Rep Dashboard processing amount over time with its resolution picker - a fragment, so switching resolution only reruns this block"""
+    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+    # Remove column division - use full width
+    st.subheader("Processing Amount Over Time")
+    resolution = st.radio(
+        "Resolution",
+        list(SERIES_RESOLUTIONS),
+        horizontal=True,
+        key="rep_time_series_resolution"
+    )
+    time_series_chart = prebuilt_figure(ctx, ('time_series', resolution), lambda: create_time_series_chart(ctx, resolution))
+    st.plotly_chart(time_series_chart, use_container_width=True, key="rep_time_series")  # Added unique key
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@st.fragment
+def show_transaction_details(ctx):
+    """Rep Dashboard transaction details with the account filter - a fragment, so the filter only reruns this block"""
+    st.markdown('<div class="data-table">', unsafe_allow_html=True)
+    st.subheader("Transaction Details")
+
+    # Get the transaction table data first
+    transaction_table = create_transaction_table(ctx)
+
+    # Add AccountName filter
+    if not transaction_table.empty:
+        # Get unique AccountNames from the transaction table
+        account_names = sorted(transaction_table['AccountName'].unique().tolist())
+
+        # Add an "All Accounts" option at the beginning
+        account_filter_options = ["All Accounts"] + account_names
+
+        # Create the filter dropdown
+        selected_account = st.selectbox(
+            "Filter by Account:", 
+            account_filter_options,
+            key="account_filter"
+        )
 
-            # Ensure TRAN_DT is datetime
-            rep_transactions['TRAN_DT'] = pd.to_datetime(rep_transactions['TRAN_DT']) # Use TRAN_DT
+        # Apply the filter if a specific account is selected
+        if selected_account != "All Accounts":
+            transaction_table = transaction_table[transaction_table['AccountName'] == selected_account]
 
-            # Set up monthly data
-            months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun']
-            
-            # Calculate monthly targets (equal distribution)
-            monthly_targets = [bonus_threshold/12 for _ in range(6)]  # Monthly targets
-            cumulative_targets = [sum(monthly_targets[:i+1]) for i in range(6)]  # Cumulative
-            
-            # Calculate actual processing by month
-            monthly_actuals = []
-            for month in range(1, 7):  # Jan-Jun
-                # Ensure TRAN_DT is datetime before accessing .dt
-                # This conversion should have happened when rep_transactions was created, but double-check
-                if not pd.api.types.is_datetime64_any_dtype(rep_transactions['TRAN_DT']):
-                     rep_transactions['TRAN_DT'] = pd.to_datetime(rep_transactions['TRAN_DT'], errors='coerce')
-
-                month_data = rep_transactions[
-                    rep_transactions['TRAN_DT'].dt.month == month # Use TRAN_DT
-                ]
-                monthly_actuals.append(month_data['TRAN_AM'].sum()) # Use TRAN_AM
-
-            # Calculate cumulative actuals
-            cumulative_actuals = [sum(monthly_actuals[:i+1]) for i in range(6)]
-            
-            # Ensure cumulative_actuals has 6 values, padding with last value if needed
-            if len(cumulative_actuals) < 6:
-                 last_val = cumulative_actuals[-1] if cumulative_actuals else 0
-                 cumulative_actuals.extend([last_val] * (6 - len(cumulative_actuals)))
+        # Sort the table by Year, Quarter, and Month in descending order (newest first)
+        if 'Year' in transaction_table.columns and 'Quarter' in transaction_table.columns and 'Month' in transaction_table.columns:
+            # Convert Month names to numbers for proper sorting
+            month_order = {
+                'January': 1, 'February': 2, 'March': 3, 'April': 4, 'May': 5, 'June': 6,
+                'July': 7, 'August': 8, 'September': 9, 'October': 10, 'November': 11, 'December': 12
+            }
 
-            col1, col2 = st.columns([1, 2])
-            with col1:
-                st.markdown("### Performance Summary")
-                # Now cumulative_targets and cumulative_actuals are defined
-                ytd_completion = (cumulative_actuals[5]/cumulative_targets[5])*100 if cumulative_targets[5] > 0 else 0
-                
-                metrics_data = [
-                    {"label": "YTD Target", "value": f"${cumulative_targets[5]:,.2f}"},
-                    {"label": "YTD Actual", "value": f"${cumulative_actuals[5]:,.2f}"},
-                    {"label": "YTD Completion", "value": f"{ytd_completion:.1f}%", 
-                     "color": "green" if ytd_completion >= 100 else "red"},
-                    {"label": "Bonus Eligibility", "value": "Eligible" if bonus_eligibility else "Not Eligible",
-                     "color": "green" if bonus_eligibility else "red"}
-                ]
-                
-                for metric in metrics_data:
-                    col_label, col_value = st.columns([1, 1])
-                    with col_label:
-                        st.markdown(f"**{metric['label']}:**")
-                    with col_value:
-                        if "color" in metric:
-                            st.markdown(f"<span style='color: {metric['color']}'>{metric['value']}</span>", unsafe_allow_html=True)
-                        else:
-                            st.markdown(metric['value'])
-            
-            with col2:
-                # Continue with YTD Commission Summary
-                # Calculate commissions
-                base_commission_rate = 1.5  # 1.5% base
-                bonus_commission_rate = 2.5  # 2.5% when hitting targets
-                
-                monthly_base_commissions = [amount * (base_commission_rate/100) for amount in monthly_actuals]
-                monthly_bonus_commissions = []
-                
-                for i, (actual, target) in enumerate(zip(cumulative_actuals, cumulative_targets)):
-                    if actual >= target:
-                        # Only apply bonus to the amount exceeding target for the month
-                        if i == 0:
-                            bonus_amount = actual - target
-                        else:
-                            # Calculate incremental amount exceeding target
-                            prev_excess = max(0, cumulative_actuals[i-1] - cumulative_targets[i-1])
-                            current_excess = max(0, actual - target)
-                            bonus_amount = current_excess - prev_excess
-                        
-                        bonus_commission = bonus_amount * (bonus_commission_rate/100)
-                    else:
-                        bonus_commission = 0
-                    
-                    monthly_bonus_commissions.append(bonus_commission)
-                
-                total_commissions = [base + bonus for base, bonus in zip(monthly_base_commissions, monthly_bonus_commissions)]
-                
-                st.markdown("### YTD Commission Summary")
-                commission_data = [
-                    {"label": "Base Commission", "value": f"${sum(monthly_base_commissions):,.2f}"},
-                    {"label": "Bonus Commission", "value": f"${sum(monthly_bonus_commissions):,.2f}"},
-                    {"label": "Total Commission", "value": f"${sum(total_commissions):,.2f}", "highlight": True}
-                ]
-                
-                for metric in commission_data:
-                    col_label, col_value = st.columns([1, 1])
-                    with col_label:
-                        st.markdown(f"**{metric['label']}:**")
-                    with col_value:
-                        if metric.get("highlight"):
-                            st.markdown(f"<span style='color: #4f46e5; font-weight: bold; font-size: 1.1em'>{metric['value']}</span>", unsafe_allow_html=True)
-                        else:
-                            st.markdown(metric['value'])
-            
-            # REMOVE the Performance & Compensation Over Time section
-            # DO NOT include create_rep_progress_compensation_chart here
-            
-            # Restore the original Performance Trends Charts
-            st.markdown("## Performance Trends")
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Target vs Actual Chart
-                fig_target_actual = go.Figure()
-                fig_target_actual.add_trace(go.Scatter(
-                    x=months,
-                    y=monthly_targets,
-                    mode='lines+markers',
-                    name='Monthly Target',
-                    line=dict(color='rgba(239, 68, 68, 0.8)', width=2),
-                    marker=dict(size=8)
-                ))
-                
-                fig_target_actual.add_trace(go.Scatter(
-                    x=months,
-                    y=monthly_actuals,
-                    mode='lines+markers',
-                    name='Monthly Actual',
-                    line=dict(color='rgba(59, 130, 246, 0.9)', width=3),
-                    marker=dict(size=10),
-                    fill='tozeroy',
-                    fillcolor='rgba(59, 130, 246, 0.1)'
-                ))
-                
-                # Calculate monthly completion percentage
-                for i, (actual, target) in enumerate(zip(monthly_actuals, monthly_targets)):
-                    percentage = (actual / target * 100) if target > 0 else 0
-                    fig_target_actual.add_annotation(
-                        x=months[i],
-                        y=actual,
-                        text=f"{percentage:.1f}%",
-                        showarrow=False,
-                        yshift=10,
-                        font=dict(size=10)
-                    )
-                
-                fig_target_actual.update_layout(
-                    title="Monthly Target vs Actual",
-                    height=300,
-                    margin=dict(l=40, r=40, t=40, b=40),
-                    legend=dict(orientation="h", y=1.1),
-                    yaxis=dict(title="Amount ($)"),
-                    hovermode="x unified"
+            # Create temporary numeric month column for sorting
+            if transaction_table['Month'].dtype == 'object':  # If Month is stored as text (an ordered categorical sorts directly)
+                transaction_table['MonthNum'] = transaction_table['Month'].map(month_order)
+                transaction_table = transaction_table.sort_values(
+                    by=['Year', 'Quarter', 'MonthNum'], 
+                    ascending=[True, True, True]
                 )
-                
-                st.plotly_chart(fig_target_actual, use_container_width=True, key="comp_target_actual")
-                
-            with col2:
-                # Commission Rates Chart
-                fig_commission = go.Figure()
-                
-                fig_commission.add_trace(go.Bar(
-                    x=months,
-                    y=monthly_base_commissions,
-                    name='Base Commission',
-                    marker_color='rgba(59, 130, 246, 0.7)'
-                ))
-                
-                fig_commission.add_trace(go.Bar(
-                    x=months,
-                    y=monthly_bonus_commissions,
-                    name='Bonus Commission',
-                    marker_color='rgba(34, 197, 94, 0.8)'
-                ))
-                
-                # Add total values as text
-                for i, (base, bonus) in enumerate(zip(monthly_base_commissions, monthly_bonus_commissions)):
-                    total = base + bonus
-                    fig_commission.add_annotation(
-                        x=months[i],
-                        y=total,
-                        text=f"${total:.2f}",
-                        showarrow=False,
-                        yshift=10,
-                        font=dict(size=10)
-                    )
-                
-                fig_commission.update_layout(
-                    title="Monthly Commission Breakdown",
-                    height=300,
-                    margin=dict(l=40, r=40, t=40, b=40),
-                    legend=dict(orientation="h", y=1.1),
-                    yaxis=dict(title="Commission ($)"),
-                    barmode='stack',
-                    hovermode="x unified"
+                # Remove temporary column
+                transaction_table = transaction_table.drop('MonthNum', axis=1)
+            else:  # If Month is already numeric
+                transaction_table = transaction_table.sort_values(
+                    by=['Year', 'Quarter', 'Month'], 
+                    ascending=[True, True, True]
                 )
-                
-                st.plotly_chart(fig_commission, use_container_width=True, key="comp_rates_chart")
-            
-            # Add map visualization if needed
-            st.markdown("## Territory Performance")
-            map_chart = create_map_visualization(data, rep_id, start_date, end_date)
-            st.plotly_chart(map_chart, use_container_width=True, key="comp_map_chart")
-            
-            # Add Monthly Performance Tables
-            first_half_df, second_half_df = create_monthly_performance_tables(data, rep_id)
-            
-            # Format the dataframes for display
-            formatted_first_half = first_half_df.copy()
-            formatted_second_half = second_half_df.copy()
-            
-            # Format currency columns
-            currency_cols = ['Target', 'Actual', 'Base Commission', 'Bonus Commission', 'Total']
-            for df in [formatted_first_half, formatted_second_half]:
-                for col in currency_cols:
-                    df[col] = df[col].apply(lambda x: f"${x:.2f}")
-                
-                # Format percentage columns
-                df['Completion %'] = df['Completion %'].apply(lambda x: f"{x:.1f}%")
-                df['Base Rate'] = df['Base Rate'].apply(lambda x: f"{x:.2f}%")
-                df['Bonus Rate'] = df['Bonus Rate'].apply(lambda x: f"{x:.2f}%")
-            
-            # Display first half table
-            st.markdown("## Monthly Performance (First Half)")
-            st.markdown("January - June 2024")
-            st.dataframe(formatted_first_half, use_container_width=True, hide_index=True)
-            
-            # Display second half table
-            st.markdown("## Monthly Performance (Second Half)")
-            st.markdown("July - December 2024")
-            st.dataframe(formatted_second_half, use_container_width=True, hide_index=True)
-    
-    # Add the Rep Details section back to the sidebar
-    st.sidebar.markdown("---")
+
+    # Display the filtered table one page at a time
+    show_paginated_table(transaction_table, key="rep_transactions")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@st.fragment
+def show_management_transactions(ctx):
+    """Management transaction table - a fragment, so paging, sorting and filtering only rerun this block"""
+    st.markdown('<div class="data-table">', unsafe_allow_html=True)
+    st.subheader("Transaction Details by Sales Representative and Account")
+    # Pass the filter context (dates and rep)
+    transaction_table = create_management_transaction_table(ctx)
+    show_paginated_table(transaction_table, key="mgmt_transactions")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+# Display formats of the numeric table columns (the values themselves stay numbers)
+TABLE_COLUMN_CONFIG = {
+    'Sum of ProcessingAmount': st.column_config.NumberColumn(format='dollar'),
+}
+
+def show_paginated_table(table, key):
+    """
+    Show a table one page (sky_data.TABLE_PAGE_SIZE rows) at a time. Sorting and the range
+    filter on its numeric columns run here on the server - numbers sort as numbers - and
+    only the visible page is sent to the browser, however many rows the table has.
+    """
+    numeric_columns = [column for column in table.columns if pd.api.types.is_numeric_dtype(table[column])]
+
+    col1, col2, col3, col4, col5 = st.columns([2, 1, 2, 1, 1])
+    with col1:
+        sort_by = st.selectbox("Sort by", ["Default order"] + numeric_columns, key=f"{key}_sort")
+    with col2:
+        descending = st.toggle("Descending", value=True, key=f"{key}_descending")
+    with col3:
+        filter_column = st.selectbox("Filter on", numeric_columns, key=f"{key}_filter_column")
+    with col4:
+        low = st.number_input("Min", value=None, key=f"{key}_min")
+    with col5:
+        high = st.number_input("Max", value=None, key=f"{key}_max")
+
+    rows = sky_data.query_table(
+        table,
+        sort_by=None if sort_by == "Default order" else sort_by,
+        ascending=not descending,
+        filters=[(filter_column, low, high)] if filter_column else []
+    )
+
+    page_size = sky_data.TABLE_PAGE_SIZE
+    page_count = max(1, -(-len(rows) // page_size))
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, key=f"{key}_page")
+    first = (min(page, page_count) - 1) * page_size
+    st.dataframe(rows.iloc[first:first + page_size], use_container_width=True, hide_index=True, column_config=TABLE_COLUMN_CONFIG)
+    st.caption(f"Rows {min(first + 1, len(rows))}-{min(first + page_size, len(rows))} of {len(rows)}")
+
+@st.fragment
+def show_activity_charts(ctx):
+    """Rep activity charts - a fragment, rerunnable without rebuilding the rest of the page"""
+    # Add activity performance chart
+    st.markdown("## My Activity & Performance Metrics")
+    col1, col2 = st.columns(2)
+
+    # Determine if this is a management view
+    is_management_view = st.session_state.get('user_role') == "Management"
+
+    with col1:
+        st.subheader("Discovery & Follow-up Activities")
+        discovery_chart = prebuilt_figure(ctx, ('activity', "discovery"), lambda: create_activity_performance_chart(
+            ctx,
+            is_management=is_management_view,
+            chart_type="discovery"
+        ))
+        # Check if chart data exists
+        if discovery_chart is not None:
+            st.plotly_chart(discovery_chart, use_container_width=True)
+        else:
+            st.info("No discovery/follow-up activity data available for this representative in the selected period.")
+
+    with col2:
+        st.subheader("Demo & Conversion Activities")
+        demo_chart = prebuilt_figure(ctx, ('activity', "demo"), lambda: create_activity_performance_chart(
+            ctx,
+            is_management=is_management_view,
+            chart_type="demo"
+        ))
+        # Check if chart data exists
+        if demo_chart is not None:
+            st.plotly_chart(demo_chart, use_container_width=True)
+        else:
+            st.info("No demo/conversion activity data available for this representative in the selected period.")
+
+@st.fragment
+def show_compensation_model(ctx):
+    """Compensation Model tab body for the context's rep - a fragment, rerunnable on its own"""
+    data = ctx.data
+    rep_id = ctx.rep_id
+
+    # Get rep details
+    rep_details = data['sales_reps'][data['sales_reps']['RepID'] == rep_id].iloc[0]
+    rep_name = rep_details['RepName']
+
+    # Get target info
+    target_info = data['sales_targets'][data['sales_targets']['RepID'] == rep_id]
+    if not target_info.empty:
+        bonus_threshold = target_info.iloc[0]['BonusThreshold']
+        bonus_eligibility = target_info.iloc[0]['Bonus_Eligibility']
+    else:
+        bonus_threshold = 0
+        bonus_eligibility = False
+
+    # Add the bonus attainment scale at the top of the tab
+    st.markdown("### Bonus Attainment")
+    # Make sure this function is defined above
+    bonus_scale = create_bonus_attainment_scale(data, rep_id)
+    st.plotly_chart(bonus_scale, use_container_width=True, key="comp_bonus_scale")
+
+    # Display summary cards
+    st.subheader(f"Compensation Model: {rep_name}")
+    st.markdown(f"**Annual Bonus Threshold:** ${bonus_threshold:,.2f}")
+
+    # Generate monthly targets and actuals for visualization
+    # Get the rep's transactions through the rep index
+    rep_transactions = sky_data.rep_transactions(data, rep_id).copy() # Add .copy()
+
+    # Ensure TRAN_DT is datetime
+    rep_transactions['TRAN_DT'] = pd.to_datetime(rep_transactions['TRAN_DT']) # Use TRAN_DT
+
+    # Set up monthly data
+    months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun']
+
+    # Calculate monthly targets (equal distribution)
+    monthly_targets = [bonus_threshold/12 for _ in range(6)]  # Monthly targets
+    cumulative_targets = [sum(monthly_targets[:i+1]) for i in range(6)]  # Cumulative
+
+    # Calculate actual processing by month
+    monthly_actuals = []
+    for month in range(1, 7):  # Jan-Jun
+        # Ensure TRAN_DT is datetime before accessing .dt
+        # This conversion should have happened when rep_transactions was created, but double-check
+        if not pd.api.types.is_datetime64_any_dtype(rep_transactions['TRAN_DT']):
+             rep_transactions['TRAN_DT'] = pd.to_datetime(rep_transactions['TRAN_DT'], errors='coerce')
+
+        month_data = rep_transactions[
+            rep_transactions['TRAN_DT'].dt.month == month # Use TRAN_DT
+        ]
+        monthly_actuals.append(sky_data.to_dollars(month_data['TRAN_AM_CENTS'].sum())) # Use TRAN_AM (cents -> dollars)
+
+    # Calculate cumulative actuals
+    cumulative_actuals = [sum(monthly_actuals[:i+1]) for i in range(6)]
+
+    # Ensure cumulative_actuals has 6 values, padding with last value if needed
+    if len(cumulative_actuals) < 6:
+         last_val = cumulative_actuals[-1] if cumulative_actuals else 0
+         cumulative_actuals.extend([last_val] * (6 - len(cumulative_actuals)))
+
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        st.markdown("### Performance Summary")
+        # Now cumulative_targets and cumulative_actuals are defined
+        ytd_completion = (cumulative_actuals[5]/cumulative_targets[5])*100 if cumulative_targets[5] > 0 else 0
+
+        metrics_data = [
+            {"label": "YTD Target", "value": f"${cumulative_targets[5]:,.2f}"},
+            {"label": "YTD Actual", "value": f"${cumulative_actuals[5]:,.2f}"},
+            {"label": "YTD Completion", "value": f"{ytd_completion:.1f}%", 
+             "color": "green" if ytd_completion >= 100 else "red"},
+            {"label": "Bonus Eligibility", "value": "Eligible" if bonus_eligibility else "Not Eligible",
+             "color": "green" if bonus_eligibility else "red"}
+        ]
+
+        for metric in metrics_data:
+            col_label, col_value = st.columns([1, 1])
+            with col_label:
+                st.markdown(f"**{metric['label']}:**")
+            with col_value:
+                if "color" in metric:
+                    st.markdown(f"<span style='color: {metric['color']}'>{metric['value']}</span>", unsafe_allow_html=True)
+                else:
+                    st.markdown(metric['value'])
+
+    with col2:
+        # Continue with YTD Commission Summary
+        # Calculate commissions
+        base_commission_rate = 1.5  # 1.5% base
+        bonus_commission_rate = 2.5  # 2.5% when hitting targets
+
+        monthly_base_commissions = [amount * (base_commission_rate/100) for amount in monthly_actuals]
+        monthly_bonus_commissions = []
+
+        for i, (actual, target) in enumerate(zip(cumulative_actuals, cumulative_targets)):
+            if actual >= target:
+                # Only apply bonus to the amount exceeding target for the month
+                if i == 0:
+                    bonus_amount = actual - target
+                else:
+                    # Calculate incremental amount exceeding target
+                    prev_excess = max(0, cumulative_actuals[i-1] - cumulative_targets[i-1])
+                    current_excess = max(0, actual - target)
+                    bonus_amount = current_excess - prev_excess
+
+                bonus_commission = bonus_amount * (bonus_commission_rate/100)
+            else:
+                bonus_commission = 0
+
+            monthly_bonus_commissions.append(bonus_commission)
+
+        total_commissions = [base + bonus for base, bonus in zip(monthly_base_commissions, monthly_bonus_commissions)]
+
+        st.markdown("### YTD Commission Summary")
+        commission_data = [
+            {"label": "Base Commission", "value": f"${sum(monthly_base_commissions):,.2f}"},
+            {"label": "Bonus Commission", "value": f"${sum(monthly_bonus_commissions):,.2f}"},
+            {"label": "Total Commission", "value": f"${sum(total_commissions):,.2f}", "highlight": True}
+        ]
+
+        for metric in commission_data:
+            col_label, col_value = st.columns([1, 1])
+            with col_label:
+                st.markdown(f"**{metric['label']}:**")
+            with col_value:
+                if metric.get("highlight"):
+                    st.markdown(f"<span style='color: #4f46e5; font-weight: bold; font-size: 1.1em'>{metric['value']}</span>", unsafe_allow_html=True)
+                else:
+                    st.markdown(metric['value'])
+
+    # REMOVE the Performance & Compensation Over Time section
+    # DO NOT include create_rep_progress_compensation_chart here
+
+    # Restore the original Performance Trends Charts
+    st.markdown("## Performance Trends")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        # Target vs Actual Chart
+        fig_target_actual = go.Figure()
+        fig_target_actual.add_trace(go.Scatter(
+            x=months,
+            y=monthly_targets,
+            mode='lines+markers',
+            name='Monthly Target',
+            line=dict(color='rgba(239, 68, 68, 0.8)', width=2),
+            marker=dict(size=8)
+        ))
+
+        fig_target_actual.add_trace(go.Scatter(
+            x=months,
+            y=monthly_actuals,
+            mode='lines+markers',
+            name='Monthly Actual',
+            line=dict(color='rgba(59, 130, 246, 0.9)', width=3),
+            marker=dict(size=10),
+            fill='tozeroy',
+            fillcolor='rgba(59, 130, 246, 0.1)'
+        ))
+
+        # Calculate monthly completion percentage
+        for i, (actual, target) in enumerate(zip(monthly_actuals, monthly_targets)):
+            percentage = (actual / target * 100) if target > 0 else 0
+            fig_target_actual.add_annotation(
+                x=months[i],
+                y=actual,
+                text=f"{percentage:.1f}%",
+                showarrow=False,
+                yshift=10,
+                font=dict(size=10)
+            )
+
+        fig_target_actual.update_layout(
+            title="Monthly Target vs Actual",
+            height=300,
+            margin=dict(l=40, r=40, t=40, b=40),
+            legend=dict(orientation="h", y=1.1),
+            yaxis=dict(title="Amount ($)"),
+            hovermode="x unified"
+        )
+
+        st.plotly_chart(fig_target_actual, use_container_width=True, key="comp_target_actual")
+
+    with col2:
+        # Commission Rates Chart
+        fig_commission = go.Figure()
+
+        fig_commission.add_trace(go.Bar(
+            x=months,
+            y=monthly_base_commissions,
+            name='Base Commission',
+            marker_color='rgba(59, 130, 246, 0.7)'
+        ))
+
+        fig_commission.add_trace(go.Bar(
+            x=months,
+            y=monthly_bonus_commissions,
+            name='Bonus Commission',
+            marker_color='rgba(34, 197, 94, 0.8)'
+        ))
+
+        # Add total values as text
+        for i, (base, bonus) in enumerate(zip(monthly_base_commissions, monthly_bonus_commissions)):
+            total = base + bonus
+            fig_commission.add_annotation(
+                x=months[i],
+                y=total,
+                text=f"${total:.2f}",
+                showarrow=False,
+                yshift=10,
+                font=dict(size=10)
+            )
+
+        fig_commission.update_layout(
+            title="Monthly Commission Breakdown",
+            height=300,
+            margin=dict(l=40, r=40, t=40, b=40),
+            legend=dict(orientation="h", y=1.1),
+            yaxis=dict(title="Commission ($)"),
+            barmode='stack',
+            hovermode="x unified"
+        )
+
+        st.plotly_chart(fig_commission, use_container_width=True, key="comp_rates_chart")
+
+    # Add map visualization if needed
+    st.markdown("## Territory Performance")
+    map_chart = create_map_visualization(ctx)
+    st.plotly_chart(map_chart, use_container_width=True, key="comp_map_chart")
+
+    # Add Monthly Performance Tables
+    first_half_df, second_half_df = create_monthly_performance_tables(data, rep_id)
+
+    # Format the dataframes for display
+    formatted_first_half = first_half_df.copy()
+    formatted_second_half = second_half_df.copy()
+
+    # Format currency columns
+    currency_cols = ['Target', 'Actual', 'Base Commission', 'Bonus Commission', 'Total']
+    for df in [formatted_first_half, formatted_second_half]:
+        for col in currency_cols:
+            df[col] = df[col].apply(lambda x: f"${x:.2f}")
+
+        # Format percentage columns
+        df['Completion %'] = df['Completion %'].apply(lambda x: f"{x:.1f}%")
+        df['Base Rate'] = df['Base Rate'].apply(lambda x: f"{x:.2f}%")
+        df['Bonus Rate'] = df['Bonus Rate'].apply(lambda x: f"{x:.2f}%")
+
+    # Display first half table
+    st.markdown("## Monthly Performance (First Half)")
+    st.markdown("January - June 2024")
+    st.dataframe(formatted_first_half, use_container_width=True, hide_index=True)
+
+    # Display second half table
+    st.markdown("## Monthly Performance (Second Half)")
+    st.markdown("July - December 2024")
+    st.dataframe(formatted_second_half, use_container_width=True, hide_index=True)
 
 def create_bonus_attainment_scale(data, rep_id):
     """
@@ -2918,223 +2348,64 @@ def create_bonus_attainment_scale(data, rep_id):
     rep_info = data['sales_reps'][data['sales_reps']['RepID'] == rep_id].iloc[0]
     rep_name = rep_info['RepName']
     
-    # Get rep's accounts
-    rep_accounts = data['accounts'][data['accounts']['RepID'] == rep_id]['AccountID'].tolist()
-    
-    # Get transactions for this rep using LCTN_ID instead of AccountID
-    rep_transactions = data['transactions'][
-        data['transactions']['LCTN_ID'].isin(rep_accounts)  # Use LCTN_ID instead of AccountID
-    ]
+    # Get transactions for this rep through the rep index
+    rep_transactions = sky_data.rep_transactions(data, rep_id)
     
     # Get target info
     target_info = data['sales_targets'][data['sales_targets']['RepID'] == rep_id]
     if not target_info.empty:
         target = target_info.iloc[0]['BonusThreshold']
-        total_processed = rep_transactions['TRAN_AM'].sum()  # Use TRAN_AM instead of ProcessingAmount
+        total_processed = sky_data.to_dollars(rep_transactions['TRAN_AM_CENTS'].sum())  # Use TRAN_AM instead of ProcessingAmount
         completion_percentage = (total_processed / target * 100) if target > 0 else 0
     else:
         completion_percentage = 0
     
-    # Define segments for the scale - updated with blue theme
-    segments = [
-        ("", "<30%", 0, 30, "#ef4444"),    # Red
-        ("40%", "15%", 30, 40, "#ff8000"),  # Dark Orange
-        ("50%", "20%", 40, 50, "#ffbf00"),  # Amber
-        ("60%", "25%", 50, 60, "#ffff00"),  # Yellow
-        ("70%", "30%", 60, 70, "#E3F2FD"),  # Lightest Blue
-        ("80%", "35%", 70, 80, "#BBDEFB"),  # Light Blue
-        ("90%", "40%", 80, 90, "#90CAF9"),  # Blue 100
-        ("100%", "45%", 90, 100, "#64B5F6"), # Blue 200
-        ("110%", "50%", 100, 110, "#42A5F5"), # Blue 300
-        ("120%", "55%", 110, 120, "#2196F3"), # Blue 400
-        ("130%", "60%", 120, 130, "#1E88E5"), # Blue 500
-        ("140%", "65%", 130, 140, "#1976D2"), # Blue 600
-        ("150%", "70%", 140, 150, "#1565C0"), # Blue 700
-        ("160%", "75%", 150, 160, "#0D47A1"), # Blue 800
-        ("170%", "80%", 160, 170, "#0277BD"), # Light Blue 800
-        ("180%", "85%", 170, 180, "#01579B"), # Light Blue 900
-        ("190%", "90%", 180, 190, "#006064"), # Cyan 900
-        ("200%", "95%", 190, 200, "#004D40")  # Teal 900
-    ]
-    
-    # Create the figure with exact sizing to match your image
-    fig = go.Figure()
-    
-    # Add the colored segments
-    for top_label, bottom_label, start, end, color in segments:
-        fig.add_trace(go.Bar(
-            x=[end - start],
-            y=[0],
-            orientation='h',
-            marker=dict(
-                color=color,
-                line=dict(width=1, color='white')
-            ),
-            showlegend=False,
-            hoverinfo='none',
-            base=start,
-            text=bottom_label,
-            textposition="inside",
-            insidetextanchor="middle",
-            textfont=dict(color="black", size=10)
-        ))
-        
-        # Add top row percentage labels
-        fig.add_annotation(
-            x=(start + end) / 2,
-            y=0.6,
-            text=top_label,
-            showarrow=False,
-            font=dict(size=10)
-        )
-    
-    # Add special markers for key thresholds
-    fig.add_shape(
-        type="line",
-        x0=100, y0=-0.3,
-        x1=100, y1=0.3,
-        line=dict(color="black", width=2),
-    )
-    
-    # Add 100% label in the divider
-    fig.add_annotation(
-        x=100,
-        y=0,
-        text="100%",
-        showarrow=False,
-        font=dict(size=10, color="white", family="Arial")
-    )
-    
-    # Add CAP text at the end
-    fig.add_annotation(
-        x=198,
-        y=0,
-        text="CAP",
-        showarrow=False,
-        font=dict(size=10, color="red", family="Arial")
-    )
-    
-    # Add rep's position marker
-    marker_position = min(200, max(0, completion_percentage))
-    
-    # Add triangle marker pointing down to show position
-    fig.add_trace(go.Scatter(
-        x=[marker_position],
-        y=[0.3],
-        mode='markers+text',
-        marker=dict(
-            symbol='triangle-down',
-            size=15,
-            color='black',
-        ),
-        text=[f"{completion_percentage:.1f}%"],
-        textposition='top center',
-        textfont=dict(color='black', size=12),
-        showlegend=False
-    ))
-    
-    # Update layout to match your image
-    fig.update_layout(
-        title={
-            'text': f"Sales Bonus % Attainment",
-            'y': 0.95,
-            'x': 0.5,
-            'xanchor': 'center',
-            'yanchor': 'top',
-            'font': dict(size=14)
-        },
-        height=110,
-        margin=dict(l=20, r=20, t=40, b=10),
-        xaxis=dict(
-            range=[0, 200],
-            showgrid=False,
-            zeroline=False,
-            showticklabels=False
-        ),
-        yaxis=dict(
-            range=[-0.5, 0.8],
-            showgrid=False,
-            zeroline=False,
-            showticklabels=False
-        ),
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        barmode='stack',
-        hovermode=False
-    )
-    
-    return fig
+    # The color-coded scale (segments in sky_figures.BONUS_SEGMENTS) with the rep's position marker
+    return sky_figures.bonus_scale_figure(completion_percentage)
 
 def create_simple_bonus_chart(data, rep_id):
     """
     Create a horizontal bar chart showing bonus attainment for all sales reps
     """
-    # Get all reps data
-    all_reps_data = []
-    for _, rep in data['sales_reps'].iterrows():
-        rep_id_current = rep['RepID'] # This is the REP NAME string
-        rep_name = rep['RepName']
-        
-        # Get transactions using LCTN_ID
-        rep_accounts = data['accounts'][data['accounts']['RepID'] == rep_id_current]['AccountID'].tolist()
-        rep_transactions = data['transactions'][
-            data['transactions']['LCTN_ID'].isin(rep_accounts) # Use LCTN_ID instead of AccountID
-        ]
-        
-        # Get target info (RepID is name)
-        target_info = data['sales_targets'][data['sales_targets']['RepID'] == rep_id_current]
-        if not target_info.empty:
-            target = target_info.iloc[0]['BonusThreshold']
-            total_processed = rep_transactions['TRAN_AM'].sum() # Use TRAN_AM instead of ProcessingAmount
-            completion_percentage = (total_processed / target * 100) if target > 0 else 0
-        else:
-            target = 0
-            total_processed = 0
-            completion_percentage = 0
-            
-        all_reps_data.append({
-            'RepID': rep_id_current,
-            'RepName': rep_name,
-            'Completion': completion_percentage,
-            'IsCurrentRep': rep_id_current == rep_id # Compare names
-        })
-    
+    # All reps' all-time totals in one read of the prefix sums, joined to their targets (first row per rep)
+    reps = data['sales_reps'].drop_duplicates('RepID')
+    targets = data['sales_targets'].drop_duplicates('RepID').set_index('RepID')['BonusThreshold']
+    target = reps['RepID'].map(targets)
+    total_processed = sky_data.to_dollars(reps['RepID'].map(sky_data.range_totals_by_rep(data)['total_processed_cents']).fillna(0))
+    # Reps without a target (or a zero one) show 0%
+    completion = (total_processed / target.where(target > 0) * 100).fillna(0)
+
     # Sort by completion percentage
-    all_reps_data = sorted(all_reps_data, key=lambda x: x['Completion'])
-    
-    # Create the horizontal bar chart
-    fig = go.Figure()
-    
-    # Add bars for each rep
-    for rep_data in all_reps_data:
-        # Set color based on whether this is the current rep
-        bar_color = '#1E88E5' if rep_data['IsCurrentRep'] else '#94a3b8'
-        
-        # Set brighter colors for different levels of completion
-        if rep_data['Completion'] >= 100:
-            bar_color = '#22c55e' if rep_data['IsCurrentRep'] else '#4ade80'  # Green
-        elif rep_data['Completion'] >= 50:
-            bar_color = '#1E88E5' if rep_data['IsCurrentRep'] else '#42A5F5'  # Blue
-        elif rep_data['Completion'] >= 30:
-            bar_color = '#f59e0b' if rep_data['IsCurrentRep'] else '#fbbf24'  # Amber
-        else:
-            bar_color = '#ef4444' if rep_data['IsCurrentRep'] else '#f87171'  # Red
-        
-        fig.add_trace(
-            go.Bar(
-                y=[rep_data['RepName']],
-                x=[rep_data['Completion']],
-                orientation='h',
-                marker_color=bar_color,
-                text=[f"{rep_data['Completion']:.1f}%"],
-                textposition='outside',
-                hoverinfo='text',
-                hovertext=f"{rep_data['RepName']}: {rep_data['Completion']:.1f}%",
-                name=rep_data['RepName']
-            )
+    all_reps_data = pd.DataFrame({
+        'RepName': reps['RepName'].to_numpy(),
+        'Completion': completion.to_numpy(),
+        'IsCurrentRep': (reps['RepID'] == rep_id).to_numpy() # Compare names
+    }).sort_values('Completion', kind='stable')
+
+    # Set brighter colors for different levels of completion (darker shade for the current rep)
+    levels = [
+        all_reps_data['Completion'] >= 100,
+        all_reps_data['Completion'] >= 50,
+        all_reps_data['Completion'] >= 30,
+    ]
+    current_colors = np.select(levels, ['#22c55e', '#1E88E5', '#f59e0b'], '#ef4444')  # Green, Blue, Amber, Red
+    other_colors = np.select(levels, ['#4ade80', '#42A5F5', '#fbbf24'], '#f87171')
+    bar_colors = np.where(all_reps_data['IsCurrentRep'], current_colors, other_colors)
+    labels = all_reps_data['Completion'].map('{:.1f}%'.format)
+
+    # Create the horizontal bar chart - one trace for all reps, colored per bar
+    fig = go.Figure(
+        go.Bar(
+            y=all_reps_data['RepName'],
+            x=all_reps_data['Completion'],
+            orientation='h',
+            marker_color=bar_colors,
+            text=labels,
+            textposition='outside',
+            hoverinfo='text',
+            hovertext=all_reps_data['RepName'] + ': ' + labels
         )
-    
-    # Rest of the function remains the same
+    )
 
     # Add a vertical line at 100%
     fig.add_shape(
@@ -3178,15 +2449,15 @@ def create_simple_bonus_chart(data, rep_id):
         yaxis_title="Sales Representative",
         height=max(350, 50 * len(all_reps_data)),  # Dynamic height based on number of reps
         margin=dict(l=10, r=10, t=50, b=10),
-        xaxis=dict(range=[0, max(150, max(rep['Completion'] for rep in all_reps_data) * 1.1)]),
-        yaxis=dict(categoryorder='array', categoryarray=[rep['RepName'] for rep in all_reps_data]),
+        xaxis=dict(range=[0, max(150, all_reps_data['Completion'].max() * 1.1)]),
+        yaxis=dict(categoryorder='array', categoryarray=all_reps_data['RepName'].tolist()),
         showlegend=False,
         plot_bgcolor='white'
     )
     
     return fig
 
-def create_activity_performance_chart(performance_data, rep_id=None, start_date=None, end_date=None, is_management=False, chart_type="discovery"):
+def create_activity_performance_chart(ctx, is_management=False, chart_type="discovery"):
     """
     Create activity performance chart using actual performance data, 
     filtered by date range and grouped by Year-Month.
@@ -3227,6 +2498,10 @@ def create_activity_performance_chart(performance_data, rep_id=None, start_date=
             "Registration": "Reg."
         }
     
+    performance_data = ctx.data.get('performance_data')
+    rep_id = ctx.rep_id
+    start_date, end_date = ctx.start_date, ctx.end_date
+
     # Basic data validation
     if performance_data is None or performance_data.empty:
         # st.warning("No performance data available to plot.") # Keep warnings minimal
@@ -3245,48 +2520,20 @@ def create_activity_performance_chart(performance_data, rep_id=None, start_date=
         if rep_id not in performance_data['Sales Rep'].unique():
              st.info(f"No performance data found for Rep: {rep_id}")
              return None
-        filtered_data = performance_data[performance_data['Sales Rep'] == rep_id].copy()
     else:
         # This case should ideally not happen if a rep is always selected,
         # but handle it just in case. Could show all data or a message.
         st.warning("No Sales Rep selected for activity charts.")
-        # Option 1: Show all data (if desired for some default state)
-        # filtered_data = performance_data.copy()
-        # Option 2: Return None (no chart)
         return None
 
+    # The rep's activity in the date range with numeric Month/Year (shared by the discovery and demo charts)
+    filtered_data = ctx.rep_activity
     if filtered_data.empty:
-         st.info(f"No performance data found for Rep: {rep_id}")
-         return None
-             
-    # Filter by Date Range (use .loc to avoid SettingWithCopyWarning)
-    if start_date and end_date:
-        # Ensure start_date and end_date are Timestamps if not already
-        start_date = pd.to_datetime(start_date)
-        end_date = pd.to_datetime(end_date)
-        # Ensure 'Date' column in filtered_data is datetime
-        filtered_data['Date'] = pd.to_datetime(filtered_data['Date'], errors='coerce')
-        filtered_data = filtered_data.dropna(subset=['Date']) # Drop if Date conversion failed
-        
-        filtered_data = filtered_data.loc[
-            (filtered_data['Date'] >= start_date) & (filtered_data['Date'] <= end_date)
-        ].copy()
-        
-        if filtered_data.empty:
-            st.info(f"No activity recorded for Rep: {rep_id} between {start_date.strftime('%Y-%m-%d')} and {end_date.strftime('%Y-%m-%d')}.")
-            return None
+        st.info(f"No activity recorded for Rep: {rep_id} between {start_date.strftime('%Y-%m-%d')} and {end_date.strftime('%Y-%m-%d')}.")
+        return None
             
     # --- Aggregation --- 
     # Group data by Year and numeric Month, then sum metrics
-    # Ensure 'Month' and 'Year' are numeric for correct grouping/sorting
-    filtered_data['Month'] = pd.to_numeric(filtered_data['Month'], errors='coerce')
-    filtered_data['Year'] = pd.to_numeric(filtered_data['Year'], errors='coerce')
-    filtered_data = filtered_data.dropna(subset=['Month', 'Year']) # Drop rows where conversion failed
-    
-    # Convert month/year to integer after ensuring they are numeric and not NaN
-    filtered_data['Month'] = filtered_data['Month'].astype(int)
-    filtered_data['Year'] = filtered_data['Year'].astype(int)
-
     monthly_agg = filtered_data.groupby(['Year', 'Month'])[metrics_to_plot].sum().reset_index()
 
     # Sort numerically before creating labels
@@ -3306,57 +2553,23 @@ def create_activity_performance_chart(performance_data, rep_id=None, start_date=
     # Check if aggregation results in empty data or only zeros
     if monthly_agg.empty or monthly_agg[metrics_to_plot].sum().sum() == 0:
         # Refine message if date range was applied
-        date_msg = f" between {start_date.strftime('%Y-%m-%d')} and {end_date.strftime('%Y-%m-%d')}" if start_date and end_date else ""
+        date_msg = f" between {start_date.strftime('%Y-%m-%d')} and {end_date.strftime('%Y-%m-%d')}"
         st.info(f"No activity recorded for Rep: {rep_id}{date_msg}.")
         return None
 
     # --- Plotting --- 
-    fig = go.Figure()
-    
-    # Add bars for each metric using the new 'Year-Month-Label' as x-axis
-    for metric in metrics_to_plot:
-        display_name = metric_rename_map.get(metric, metric) 
-        fig.add_trace(
-            go.Bar(
-                name=display_name,
-                x=monthly_agg['Year-Month-Label'], # Use the new label for x-axis
-                y=monthly_agg[metric],
-                text=monthly_agg[metric],
-                textposition='outside', # Explicitly set text position to outside
-                hovertext=[f"{display_name}: {val}" for val in monthly_agg[metric]],
-                hoverinfo='text'
-            )
-        )
-    
-    # Update layout 
-    fig.update_layout(
-        #title=title,
-        barmode='group',
-        xaxis_title="Month", # Keep label simple as 'Month'
-        yaxis=dict(
-            title="Count"
-        ),
-        height=400,
-        showlegend=True,
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1,
-            font=dict(size=10)
-        ),
-        margin=dict(l=40, r=20, t=60, b=40) 
+    # Grouped bars, one per metric, on the 'Year-Month-Label' x-axis
+    return sky_figures.activity_figure(
+        monthly_agg['Year-Month-Label'],
+        [(metric_rename_map.get(metric, metric), monthly_agg[metric]) for metric in metrics_to_plot]
     )
-    
-    return fig
 
-def create_activity_summary_table(data, start_date, end_date):
+def create_activity_summary_table(ctx):
     """
     Create a summary table of activity metrics across all sales reps
     using actual performance data, showing totals, averages, and standard deviations.
     """
-    performance_data = data.get('performance_data')
+    performance_data = ctx.data.get('performance_data')
     
     # Check if performance_data exists and is valid
     if performance_data is None or performance_data.empty:
@@ -3447,14 +2660,8 @@ def create_monthly_performance_tables(data, rep_id):
     Create monthly performance tables showing target, actual, completion percentage,
     commission rates and amounts for the entire year (split into two halves)
     """
-    # Get rep accounts (AccountID is from the accounts df)
-    rep_accounts = data['accounts'][data['accounts']['RepID'] == rep_id]['AccountID'].tolist()
-
-    # Get rep transactions using LCTN_ID
-    # --- FIX THIS LINE (around 3067) ---
-    rep_transactions = data['transactions'][
-        data['transactions']['LCTN_ID'].isin(rep_accounts) # Use LCTN_ID instead of AccountID
-    ].copy() # Add copy()
+    # Get rep transactions through the rep index
+    rep_transactions = sky_data.rep_transactions(data, rep_id)
 
     # Convert to datetime (use TRAN_DT) - Ensure this happens if needed later
     # rep_transactions['TRAN_DT'] = pd.to_datetime(rep_transactions['TRAN_DT']) # Use TRAN_DT
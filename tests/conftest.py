@@ -0,0 +1,39 @@
+"""Shared helpers of the data engine tests - built from the sample transaction_table.csv, no Streamlit needed"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import sky_data
+
+
+def read_raw_transactions(path=os.path.join(REPO_DIR, sky_data.TRANSACTION_FILE)):
+    """Raw transaction rows as the loaders parse them (dashboard columns, file-order row labels)"""
+    return pd.read_csv(path, usecols=lambda column: column in sky_data.TRANSACTION_COLUMNS)
+
+
+def full_build(raw):
+    """The data dict a full rebuild derives from raw rows"""
+    return sky_data.derive_data(sky_data.prepare_transactions(raw.copy()))
+
+
+def assert_data_equal(actual, expected):
+    """Every frame and array of two data dicts is identical (values, dtypes, row labels, order)"""
+    assert set(actual) == set(expected)
+    for name, value in expected.items():
+        if name == 'dataset_id': # Identity of the build, not content
+            continue
+        if isinstance(value, pd.DataFrame):
+            pd.testing.assert_frame_equal(actual[name], value, check_exact=True, obj=name)
+        else:
+            np.testing.assert_array_equal(actual[name], value, err_msg=name, strict=True)
+
+
+@pytest.fixture(scope='session')
+def raw_transactions():
+    return read_raw_transactions()
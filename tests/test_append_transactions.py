@@ -0,0 +1,63 @@
+"""append_transactions must derive exactly what a full rebuild of the whole file derives"""
+import pandas as pd
+import pytest
+
+import sky_data
+from conftest import assert_data_equal, full_build
+
+
+def date_ordered(raw):
+    # A feed appending newer days only: the file is in date order
+    dates = pd.to_datetime(raw['TRAN_DT'], errors='coerce')
+    return raw.iloc[dates.argsort(kind='stable')].reset_index(drop=True)
+
+
+def with_new_rep(raw, cut):
+    # Some tail rows move to an account, and a rep, the head has never seen
+    raw = raw.copy()
+    tail = raw.index[cut::7]
+    raw.loc[tail, 'LCTN_ID'] = 999000000001
+    raw.loc[tail, 'REP NAME'] = 'Newcomer, N'
+    raw.loc[tail, 'CITY_NM'] = 'NEWTOWN'
+    return raw
+
+
+def append_check(raw, cut):
+    appended = sky_data.append_transactions(full_build(raw.iloc[:cut]), raw.iloc[cut:].copy())
+    assert_data_equal(appended, full_build(raw))
+    return appended
+
+
+@pytest.mark.parametrize('new_rep', [False, True], ids=['known-reps', 'new-rep'])
+def test_in_order_append(raw_transactions, new_rep):
+    raw = date_ordered(raw_transactions)
+    cut = 1200
+    if new_rep:
+        raw = with_new_rep(raw, cut)
+    assert pd.Timestamp(raw['TRAN_DT'].iloc[cut]) >= pd.Timestamp(raw['TRAN_DT'].iloc[cut - 1])
+    appended = append_check(raw, cut)
+    assert ('Newcomer, N' in appended['rep_offsets'].index) == new_rep
+
+
+@pytest.mark.parametrize('new_rep', [False, True], ids=['known-reps', 'new-rep'])
+def test_back_dated_append(raw_transactions, new_rep):
+    raw = raw_transactions # The sample file is not in date order
+    cut = 1000
+    if new_rep:
+        raw = with_new_rep(raw, cut)
+    dates = pd.to_datetime(raw['TRAN_DT'])
+    assert dates.iloc[cut:].min() < dates.iloc[:cut].max()
+    append_check(raw, cut)
+
+
+def test_consecutive_appends(raw_transactions):
+    raw = with_new_rep(date_ordered(raw_transactions), 1500)
+    data = full_build(raw.iloc[:900])
+    for start, stop in [(900, 1500), (1500, len(raw))]:
+        data = sky_data.append_transactions(data, raw.iloc[start:stop].copy())
+    assert_data_equal(data, full_build(raw))
+
+
+def test_empty_append(raw_transactions):
+    data = full_build(raw_transactions)
+    assert_data_equal(sky_data.append_transactions(data, raw_transactions.iloc[:0].copy()), full_build(raw_transactions))
@@ -0,0 +1,44 @@
+"""A month-partitioned store must load exactly like the export it was written from"""
+import os
+
+import pytest
+
+import sky_data
+from conftest import assert_data_equal, full_build
+
+
+@pytest.fixture(scope='module')
+def partition_root(tmp_path_factory, raw_transactions):
+    root = str(tmp_path_factory.mktemp('store') / sky_data.TRANSACTION_PARTITIONS)
+    sky_data.write_partitions(raw_transactions, root)
+    return root
+
+
+def listed_months(paths, root):
+    # 'year=2025/month=01/part-00000.parquet' -> '2025-01'
+    return ['-'.join(part.split('=')[1] for part in os.path.relpath(path, root).split(os.sep)[:2]) for path in paths]
+
+
+@pytest.mark.parametrize('chunk_rows', [97, sky_data.STREAM_CHUNK_ROWS])
+def test_partitioned_store_matches_export(partition_root, raw_transactions, chunk_rows):
+    paths = sky_data.partition_files(partition_root)
+    assert len(paths) > 1
+
+    data, raw_rows = sky_data.stream_derive_data(sky_data.iter_partition_chunks(paths, chunk_rows))
+    assert raw_rows == len(raw_transactions)
+    assert_data_equal(data, full_build(raw_transactions))
+
+
+@pytest.mark.parametrize('start_date, end_date, months', [
+    (None, None, ['2024-12', '2025-01', '2025-02', '2025-03', '2025-04']),
+    ('2024-12-31', '2025-01-01', ['2024-12', '2025-01']), # Across the year boundary
+    ('2024-11-15', '2025-02-01', ['2024-12', '2025-01', '2025-02']),
+    ('2025-03-15', '2025-04-02', ['2025-03', '2025-04']),
+    ('2025-02-01', '2025-02-28', ['2025-02']),
+    ('2025-03-01', None, ['2025-03', '2025-04']),
+    (None, '2024-12-01', ['2024-12']),
+    ('2025-05-01', '2025-06-30', []),
+])
+def test_partition_files_prunes_to_overlapping_months(partition_root, start_date, end_date, months):
+    paths = sky_data.partition_files(partition_root, start_date=start_date, end_date=end_date)
+    assert listed_months(paths, partition_root) == months
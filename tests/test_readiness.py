@@ -0,0 +1,46 @@
+"""The readiness probe passes once every running server process has warmed the version it serves"""
+import os
+
+import pytest
+
+import sky_data
+
+
+def served(snapshot_dir):
+    # A registered server process that has warmed and swapped in its first version
+    registration = sky_data.register_server(snapshot_dir)
+    sky_data.mark_server_ready(registration[0], sky_data.Dataset(1, {'dataset_id': 'a'}, []))
+    return registration
+
+
+def test_no_server_is_not_ready(tmp_path):
+    assert not sky_data.is_ready(str(tmp_path))
+
+
+def test_ready_once_every_server_warmed(tmp_path):
+    snapshot_dir = str(tmp_path)
+    first = sky_data.register_server(snapshot_dir)
+    assert not sky_data.is_ready(snapshot_dir)
+    sky_data.mark_server_ready(first[0], sky_data.Dataset(1, {'dataset_id': 'a'}, []))
+    assert sky_data.is_ready(snapshot_dir)
+
+    second = sky_data.register_server(snapshot_dir) # Still warming up
+    assert not sky_data.is_ready(snapshot_dir)
+    sky_data.unregister_server(second)
+    assert sky_data.is_ready(snapshot_dir)
+    sky_data.unregister_server(first)
+    assert not sky_data.is_ready(snapshot_dir)
+
+
+@pytest.mark.skipif(sky_data.fcntl is None, reason="needs flock to tell a dead process from a running one")
+def test_markers_of_dead_processes_are_dropped(tmp_path):
+    snapshot_dir = str(tmp_path)
+    marker, lock = served(snapshot_dir)
+    cold_marker, cold_lock = sky_data.register_server(snapshot_dir)
+    cold_lock.close() # The process warming up is gone: its lock is released, its files stay
+    assert sky_data.is_ready(snapshot_dir)
+    assert not os.path.exists(cold_marker) and not os.path.exists(cold_lock.name)
+
+    lock.close()
+    assert not sky_data.is_ready(snapshot_dir)
+    assert os.listdir(os.path.join(snapshot_dir, sky_data.SERVERS_DIR)) == []
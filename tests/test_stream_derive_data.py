@@ -0,0 +1,16 @@
+"""stream_derive_data must derive exactly what derive_data derives from the whole file at once"""
+import os
+
+import pytest
+
+import sky_data
+from conftest import REPO_DIR, assert_data_equal, full_build
+
+
+@pytest.mark.parametrize('chunk_rows', [97, 1000, sky_data.STREAM_CHUNK_ROWS])
+def test_streamed_build_matches_full_build(raw_transactions, chunk_rows):
+    path = os.path.join(REPO_DIR, sky_data.TRANSACTION_FILE)
+    chunks = sky_data.iter_transaction_chunks(path, os.path.getsize(path), chunk_rows=chunk_rows)
+    data, raw_rows = sky_data.stream_derive_data(chunks)
+    assert raw_rows == len(raw_transactions)
+    assert_data_equal(data, full_build(raw_transactions))